@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Load test: the BOQ engine over a synthetic in-memory quantity source.
+
+Runs outside Revit:  python benchmarks/bench_boq_engine.py [elements] [--profile]
+
+Feeds ``build_workbook`` the same ``QuantitySource`` interface Generate
+BOQ uses on a live model, backed by a synthetic snapshot (one million
+elements by default), and prints the time per phase. Then folds the
+BOQ sections again together with a by-level grouping of the walls and
+checks that the internal/external and by-level wall areas both add up
+to the areas in the source; exits non-zero otherwise. ``--profile`` prints the top functions by own time.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools.extension", "lib"))
+from costestimates.sources import SnapshotSource  # noqa: E402
+from costestimates.boqengine import build_workbook, section_groupings  # noqa: E402
+from costestimates.groupby import Grouping, LEVEL, TYPE_NAME, area, fold  # noqa: E402
+from bench_boq_snapshot import make_snapshot  # noqa: E402
+
+
+def run(n, profile=False):
+    t0 = time.time()
+    source = SnapshotSource(make_snapshot(n))
+    print("source   | {:7.1f} ms | {} elements".format((time.time() - t0) * 1000.0, len(source)))
+
+    path = os.path.join(tempfile.mkdtemp(), "boq.xlsx")
+    if profile:
+        import cProfile
+        import pstats
+        prof = cProfile.Profile()
+        prof.enable()
+    t0 = time.time()
+    skipped, timings = build_workbook(source, path)
+    print("workbook | {:7.1f} ms | {}".format((time.time() - t0) * 1000.0, timings.summary()))
+    if profile:
+        prof.disable()
+        pstats.Stats(prof).sort_stats("tottime").print_stats(12)
+
+    plan = section_groupings()
+    by_level = Grouping(["OST_Walls"], area(), keys=(LEVEL, TYPE_NAME))
+    t0 = time.time()
+    fold(source, list(plan.values()) + [by_level])
+    print("fold     | {:7.1f} ms | {} groupings, one pass".format((time.time() - t0) * 1000.0, len(plan) + 1))
+
+    direct = sum(a for a in (source.measures(i)[0] for i in source.instances("OST_Walls")) if a == a)
+    split = sum(plan["Walls"].qty)
+    levels = sum(by_level.qty)
+    return skipped == 0 and all(abs(x - direct) <= 1e-6 * max(1.0, direct) for x in (split, levels))
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != "--profile"]
+    ok = run(int(args[0]) if args else 1000000, "--profile" in sys.argv)
+    print("wall areas add up" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
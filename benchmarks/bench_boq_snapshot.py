@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Benchmark: headless BOQ snapshot write, read and workbook build.
+
+Runs outside Revit:  python benchmarks/bench_boq_snapshot.py [elements]
+
+Builds a synthetic snapshot, writes and reads it back, checks that every
+row survives the round trip (NaN measures included), then builds the
+workbook from it. Needs ``xlsxwriter``; exits non-zero on a mismatch.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools.extension", "lib"))
+from costestimates.boqsnapshot import BoqSnapshot, write_snapshot, read_snapshot  # noqa: E402
+from costestimates.sources import SnapshotSource  # noqa: E402
+from costestimates.boqengine import build_workbook  # noqa: E402
+
+CATEGORIES = ("OST_Walls", "OST_Floors", "OST_Stairs", "OST_Doors", "OST_Windows",
+              "OST_StructuralColumns", "OST_StructuralFraming", "OST_Conduit", "OST_PipeCurves")
+NAN = float("nan")
+
+
+def make_snapshot(n, n_types=200, seed=11):
+    rnd = random.Random(seed)
+    snap = BoqSnapshot("Benchmark", "Nowhere")
+    for eid in range(n):
+        cat = rnd.choice(CATEGORIES)
+        t = rnd.randrange(n_types)
+
+        def measure():
+            return NAN if rnd.random() < 0.3 else rnd.uniform(0.1, 80)
+        snap.add([eid, cat, t, rnd.randrange(5), "{} {}".format(cat[4:], t),
+                  rnd.choice(("Interior", "Exterior")), 10.0 + t, "", measure(), measure(), measure(),
+                  rnd.choice(("", "concrete", "steel"))])
+    snap.painting["Paint - White"] = {"qty": 1200.0, "rate": 4.5, "unit": "m²", "comment": ""}
+    snap.earthworks = {"cut": 310.0, "fill": 120.0, "pad_excavation": 0.0, "summary": ""}
+    return snap
+
+
+def same(a, b):
+    return a == b or (a != a and b != b)
+
+
+def run(n):
+    snap = make_snapshot(n)
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, "snapshot.jsonl.gz")
+
+    t0 = time.time()
+    write_snapshot(snap, path)
+    print("write    | {:7.1f} ms | {} rows, {:.0f} KiB".format(
+        (time.time() - t0) * 1000.0, len(snap), os.path.getsize(path) / 1024.0))
+
+    t0 = time.time()
+    back = read_snapshot(path)
+    print("read     | {:7.1f} ms".format((time.time() - t0) * 1000.0))
+
+    t0 = time.time()
+    skipped, timings = build_workbook(SnapshotSource(back), os.path.join(folder, "boq.xlsx"))
+    print("workbook | {:7.1f} ms | {}".format((time.time() - t0) * 1000.0, timings.summary()))
+
+    return (len(back) == len(snap) and skipped == 0
+            and all(same(x, y) for i in range(len(snap)) for x, y in zip(snap.row(i), back.row(i)))
+            and back.painting == snap.painting and back.earthworks == snap.earthworks)
+
+
+if __name__ == "__main__":
+    ok = run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
+    print("snapshot round-trips" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
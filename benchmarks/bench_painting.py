@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""Benchmark: painted wall areas, material-area backend vs face walk.
+
+Runs outside Revit:  python benchmarks/bench_painting.py [walls] [end-painted share]
+
+Revit is replaced by a small in-memory model (installed as ``pyrevit``
+and ``System`` before ``costestimates.painting`` is imported): walls with
+six faces each, some painted on one or both sides, some split into
+parts, a third not painted at all. Geometry is rebuilt on every
+``get_Geometry`` call, as Revit does, and the benchmark reports how many
+geometry requests and face reads each backend needed.
+
+The consistency check fails (exit code 1) when the two backends disagree
+on the m² of any material. Painting end faces (second argument, e.g.
+0.05) shows the one case where they legitimately do.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import types
+import random
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools.extension", "lib"))
+
+CALLS = Counter()
+
+
+class _Enum(object):
+    def __getattr__(self, name):
+        return name
+
+
+class ElementId(object):
+    def __init__(self, value):
+        self.IntegerValue = int(value)
+
+    def __eq__(self, other):
+        return isinstance(other, ElementId) and other.IntegerValue == self.IntegerValue
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return self.IntegerValue
+
+
+ElementId.InvalidElementId = ElementId(-1)
+
+
+class Face(object):
+    def __init__(self, material, area, side=None):
+        self.material = material
+        self._area = area
+        self.side = side
+
+    @property
+    def Area(self):
+        CALLS["face areas"] += 1
+        return self._area
+
+    @property
+    def Reference(self):
+        return self
+
+
+class Solid(object):
+    def __init__(self, faces):
+        self.Faces = faces
+
+
+class GeometryInstance(object):
+    pass
+
+
+class Options(object):
+    ComputeReferences = False
+    IncludeNonVisibleObjects = False
+
+
+class _Param(object):
+    HasValue = True
+
+    def __init__(self, value):
+        self.value = value
+
+    def AsDouble(self):
+        return self.value
+
+
+class Element(object):
+    def __init__(self, eid, faces=(), parts=(), type_id=1):
+        self.Id = ElementId(eid)
+        self.faces = list(faces)
+        self.parts = [ElementId(p) for p in parts]
+        self.type_id = ElementId(type_id)
+        self.Location = None
+
+    def GetTypeId(self):
+        return self.type_id
+
+    def get_Parameter(self, spec):
+        return _Param(10.0)
+
+    def get_Geometry(self, opt):
+        CALLS["geometry requests"] += 1
+        return [Solid([Face(f.material, f._area, f.side) for f in self.faces])]
+
+    def GetGeometryObjectFromReference(self, ref):
+        CALLS["geometry requests"] += 1
+        return ref
+
+    def GetMaterialIds(self, paint):
+        CALLS["material queries"] += 1
+        return [ElementId(m) for m in sorted(set(f.material for f in self.faces if f.material))]
+
+    def GetMaterialArea(self, mid, paint):
+        CALLS["material queries"] += 1
+        return sum(f._area for f in self.faces if f.material == mid.IntegerValue)
+
+
+class Material(object):
+    def __init__(self, eid, price):
+        self.Id = ElementId(eid)
+        self.Name = "Paint {}".format(eid)
+        self.price = price
+
+    def get_Parameter(self, spec):
+        return _Param(self.price)
+
+    def LookupParameter(self, name):
+        return _Param(self.price)
+
+
+class Document(object):
+    PathName = ""
+    Title = "bench_painting"
+
+    def __init__(self):
+        self.elements = {}
+
+    def add(self, el):
+        self.elements[el.Id.IntegerValue] = el
+        return el
+
+    def GetElement(self, eid):
+        return self.elements.get(eid.IntegerValue)
+
+    def IsPainted(self, host_id, ref):
+        return ref.material is not None
+
+    def GetPaintedMaterial(self, host_id, ref):
+        return ElementId(ref.material)
+
+
+class HostObjectUtils(object):
+    @staticmethod
+    def GetSideFaces(wall, side):
+        return [f for f in wall.faces if f.side == side]
+
+
+class PartUtils(object):
+    document = None
+
+    @staticmethod
+    def HasAssociatedParts(doc, eid):
+        return bool(doc.GetElement(eid).parts)
+
+    @staticmethod
+    def GetAssociatedParts(doc, eid, include_parts, include_children):
+        return doc.GetElement(eid).parts
+
+
+def install_fake_revit():
+    DB = types.ModuleType("DB")
+    for name, value in dict(
+        ElementId=ElementId, Face=Face, Solid=Solid, GeometryInstance=GeometryInstance, Options=Options,
+        HostObjectUtils=HostObjectUtils, PartUtils=PartUtils,
+        BuiltInCategory=_Enum(), BuiltInParameter=_Enum(), ShellLayerType=_Enum(),
+    ).items():
+        setattr(DB, name, value)
+    DB.SharedParameterElement = None
+    pyrevit = types.ModuleType("pyrevit")
+    pyrevit.DB = DB
+    system = types.ModuleType("System")
+    system.Guid = str
+    sys.modules.update({"pyrevit": pyrevit, "pyrevit.DB": DB, "System": system})
+
+
+def make_walls(doc, n_walls, end_share, n_paints=20, seed=3):
+    rnd = random.Random(seed)
+    paints = [doc.add(Material(900000 + i, rnd.uniform(20, 80))).Id.IntegerValue for i in range(n_paints)]
+    next_id = [1]
+
+    def new_id():
+        next_id[0] += 1
+        return next_id[0]
+
+    def wall_faces(length, height, painted):
+        inner = rnd.choice(paints) if painted else None
+        outer = rnd.choice(paints) if painted and rnd.random() < 0.5 else None
+        end = rnd.choice(paints) if painted and rnd.random() < end_share else None
+        return [
+            Face(inner, length * height, "Interior"), Face(outer, length * height, "Exterior"),
+            Face(end, 0.7 * height), Face(None, 0.7 * height),
+            Face(None, 0.7 * length), Face(None, 0.7 * length),
+        ]
+
+    walls = []
+    for _ in range(n_walls):
+        length, height = rnd.uniform(5, 40), rnd.uniform(8, 12)
+        roll = rnd.random()
+        if roll < 0.1:
+            parts = [doc.add(Element(new_id(), wall_faces(length / 2, height, True))).Id.IntegerValue
+                     for _ in range(2)]
+            walls.append(doc.add(Element(new_id(), wall_faces(length, height, False), parts)))
+        else:
+            walls.append(doc.add(Element(new_id(), wall_faces(length, height, roll < 0.7))))
+    return walls
+
+
+def timed(label, fn):
+    CALLS.clear()
+    t0 = time.time()
+    result = fn()
+    calls = ", ".join("{} {}".format(v, k) for k, v in sorted(CALLS.items()))
+    print("{:<24} | {:7.1f} ms | {}".format(label, (time.time() - t0) * 1000.0, calls))
+    return result
+
+
+def run(n_walls, end_share=0.0):
+    install_fake_revit()
+    from costestimates import painting
+
+    doc = Document()
+    walls = make_walls(doc, n_walls, end_share)
+    print("{} walls ({} elements incl. parts)".format(n_walls, len(doc.elements)))
+
+    for backend in painting.BACKENDS:
+        timed("backend {}".format(backend), lambda: painting.gather_wall_painting(doc, walls, backend=backend))
+    cache = painting.PaintAreaCache(max_entries=n_walls)
+    timed("material, cold cache", lambda: painting.gather_wall_painting(doc, walls, cache))
+    timed("material, warm cache", lambda: painting.gather_wall_painting(doc, walls, cache))
+
+    totals, mismatches = painting.compare_backends(doc, walls)
+    print("consistency: {} material(s), {:.1f} m² by material areas, {:.1f} m² by faces".format(
+        len(totals["material"]), sum(totals["material"].values()), sum(totals["faces"].values())))
+    for mid, a, b in mismatches:
+        print("  material {}: {:.2f} m² vs {:.2f} m²".format(mid, a, b))
+    return not mismatches
+
+
+if __name__ == "__main__":
+    ok = run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000,
+             float(sys.argv[2]) if len(sys.argv) > 2 else 0.0)
+    print("backends agree" if ok else "backends DISAGREE")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""Benchmark: Monte-Carlo price risk over a synthetic model.
+
+Runs outside Revit:  python benchmarks/bench_price_risk.py [samples]
+
+Every material gets a triangular range of -20% / +50% around its price;
+the model is 20,000 elements spread over 500 recipe types and 20 BOQ
+sections.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools.extension", "lib"))
+from costestimates.recipes import RecipeBook  # noqa: E402
+from costestimates.risk import PriceRisk  # noqa: E402
+from costestimates import recipematrix  # noqa: E402
+from bench_recipe_matrix import make_library  # noqa: E402
+
+
+def run(n_samples, n_types=500, n_materials=2000, n_elements=20000):
+    recipes, prices = make_library(n_types, n_materials)
+    ranges = dict((m, (p * 0.8, p, p * 1.5, None)) for m, p in prices.items())
+    rnd = random.Random(2)
+    types = sorted(recipes)
+    quantities = [(rnd.choice(types), "Section {}".format(rnd.randrange(20)), rnd.uniform(1, 100), 0.0)
+                  for _ in range(n_elements)]
+
+    book = RecipeBook(recipes, prices)
+    t0 = time.time()
+    result = PriceRisk(book, ranges).run(quantities, n=n_samples, seed=42)
+    print("{:>6} samples [{}] | {:6.2f}s | P50 {:,.0f} P90 {:,.0f}".format(
+        n_samples, recipematrix.BACKEND, time.time() - t0, result.total["p50"], result.total["p90"]))
+    print("  " + result.summary())
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Benchmark: parsing and caching a material_costs folder.
+
+Runs outside Revit:  python benchmarks/bench_pricebook.py [rows per file] [files]
+
+Writes a folder of price CSVs whose Rate cells use the formats found in
+supplier exports (currency prefixes, thousands separators, decimal
+commas, European ``1.234,56``, non-numeric cells), with some items
+repriced further down their file, then loads it cold and again from the
+cache image. It checks that every rate parses to the value it was written
+from and that the cached book merges like the uncached record stream,
+and exits non-zero otherwise.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools.extension", "lib"))
+from costestimates.pricebook import load_price_book, parse_rate, stream_price_folder  # noqa: E402
+
+# (cell text, parsed rate)
+SAMPLE_RATES = [
+    ("125", 125.0),
+    ("125.50", 125.5),
+    ("K 1,250.00", 1250.0),
+    ("12,500", 12500.0),
+    ("12,5", 12.5),
+    ("1.234,56", 1234.56),
+    ("K1.234.567,8", 1234567.8),
+    ("1 250,75", 1250.75),
+    (u"ZMW 3\u00a0400", 3400.0),
+    ("-", None),
+    ("n/a", None),
+]
+
+
+def write_folder(folder, rows, files, seed=3):
+    rnd = random.Random(seed)
+    expected = {}
+    for f in range(files):
+        lines = [u"Item,UoM,Rate"]
+        for r in range(rows):
+            # one row in ten reprices an item listed earlier in the file
+            name = u"Material {:02d}-{:06d}".format(f, rnd.randrange(r) if r and rnd.random() < 0.1 else r)
+            text, value = rnd.choice(SAMPLE_RATES)
+            lines.append(u'{},m²,"{}"'.format(name, text))
+            if value is not None:
+                expected[name] = value
+        with open(os.path.join(folder, "prices_{:02d}.csv".format(f)), "wb") as fh:
+            fh.write((u"\n".join(lines) + u"\n").encode("utf-8"))
+    return expected
+
+
+def run(rows, files):
+    ok = all(parse_rate(text) == value for text, value in SAMPLE_RATES)
+    folder = tempfile.mkdtemp(prefix="pricebook_bench_")
+    cache_dir = os.path.join(folder, "cache")
+    try:
+        prices = os.path.join(folder, "material_costs")
+        os.makedirs(prices)
+        expected = write_folder(prices, rows, files)
+        streamed = {}
+        for key, nm, u, rate, src in stream_price_folder(prices):
+            streamed[key] = {"name": nm, "unit": u, "rate": rate or 0.0, "src": src}
+        for label in ("cold", "cached"):
+            t0 = time.time()
+            book = load_price_book(prices, cache_dir=cache_dir)
+            got = book.prices_by_name()
+            print("{:6s} | {:7.1f} ms | {} rows, {}".format(
+                label, (time.time() - t0) * 1000.0, rows * files, book.stats.summary()))
+            ok = ok and got == expected and book.cost_map() == streamed
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return ok
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_files = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    if not run(n_rows, n_files):
+        print("rates did not parse as written")
+        sys.exit(1)
+    print("every rate parsed as written")
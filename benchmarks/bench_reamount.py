@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Benchmark: incremental Amount runs over a fake element store.
+
+Runs outside Revit:  python benchmarks/bench_reamount.py [elements]
+
+The store is a dict of element id -> [category, type id, measure,
+quantity, stored amount], priced from a per-type rate table. After a
+full run the benchmark moves a few doors (nothing to write), resizes a
+few walls, re-prices one type, edits some stored amounts by hand, adds
+and deletes elements, then runs again incrementally. It checks that
+exactly the expected elements are written, that the saved ledger
+round-trips, and that the ledger still holds after the moved doors are
+reported changed but not once an amount is edited or a row deleted, and
+exits non-zero otherwise.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools.extension", "lib"))
+from costestimates.ledger import AmountTracker, Ledger, ADDED, MODIFIED, DRIFTED  # noqa: E402
+
+DOORS, WALLS, FLOORS = -2000023, -2000011, -2000032
+MEASURE_OF = {DOORS: "count", WALLS: "area", FLOORS: "volume"}
+
+
+def make_store(n, n_types=300, seed=5):
+    rnd = random.Random(seed)
+    rates = dict((t, rnd.uniform(10, 900)) for t in range(n_types))
+    store = {}
+    for eid in range(100000, 100000 + n):
+        cat = rnd.choice((DOORS, WALLS, FLOORS))
+        qty = 1.0 if cat == DOORS else rnd.uniform(0.5, 80)
+        store[eid] = [cat, rnd.randrange(n_types), MEASURE_OF[cat], qty, None]
+    return store, rates
+
+
+def amount_run(store, rates, previous):
+    """Amount over the store; return (tracker, ids written)."""
+    tracker = AmountTracker(previous)
+    written = set()
+    for eid, el in store.items():
+        cat, type_id, measure, qty, current = el
+        rate = rates[type_id]
+        row = (eid, cat, type_id, measure, qty, rate)
+        status = tracker.check(*row, current=current)
+        if status is not None:
+            el[4] = qty * rate  # Parameter.Set
+            written.add(eid)
+        tracker.record(status, *row, current=current)
+    tracker.finish()
+    return tracker, written
+
+
+def run(n):
+    store, rates = make_store(n)
+    rnd = random.Random(7)
+
+    t0 = time.time()
+    full, written = amount_run(store, rates, None)
+    print("full run        | {:7.1f} ms | {} written".format((time.time() - t0) * 1000.0, len(written)))
+
+    path = os.path.join(tempfile.mkdtemp(), "ledger.pickle")
+    t0 = time.time()
+    full.ledger.save(path)
+    previous = Ledger.load(path)
+    print("ledger save+load| {:7.1f} ms | {} rows, {:.0f} KiB".format(
+        (time.time() - t0) * 1000.0, len(previous), os.path.getsize(path) / 1024.0))
+
+    ids = sorted(store)
+    doors = [i for i in ids if store[i][0] == DOORS]
+    walls = [i for i in ids if store[i][0] == WALLS]
+    moved = rnd.sample(doors, 3)  # location only: quantity unchanged
+    resized = rnd.sample(walls, 25)
+    for eid in resized:
+        store[eid][3] *= 1.1
+    repriced_type = store[ids[0]][1]
+    rates[repriced_type] *= 1.05
+    repriced = set(i for i in ids if store[i][1] == repriced_type)
+    edited = set(rnd.sample(ids, 10)) - set(resized) - repriced
+    for eid in edited:
+        store[eid][4] = 0.0
+    deleted = rnd.sample(ids, 20)
+    for eid in deleted:
+        del store[eid]
+    added = list(range(900000, 900015))
+    for eid in added:
+        store[eid] = [DOORS, 0, "count", 1.0, None]
+
+    t0 = time.time()
+    incremental, written = amount_run(store, rates, previous)
+    changes = incremental.changes
+    print("incremental run | {:7.1f} ms | {} written: {}".format(
+        (time.time() - t0) * 1000.0, len(written), changes.summary()))
+
+    alive = set(store)
+    expected = (set(resized) | repriced | edited | set(added)) & alive
+    ok = (written == expected and not (set(moved) & written)
+          and changes.counts[ADDED] == len(added)
+          and changes.counts[MODIFIED] + changes.counts[DRIFTED] == len(expected) - len(added)
+          and set(changes.dropped) == set(deleted)
+          and len(incremental.ledger) == len(store))
+    ledger = incremental.ledger
+
+    def stored(eid):
+        return store[eid][4]
+
+    moved = set(moved) & alive
+    t0 = time.time()
+    holds = ledger.holds(moved, set(), stored)
+    edited_one = ledger.ids[0]
+    store[edited_one][4] += 1.0
+    stale = (not ledger.holds(moved | {edited_one}, set(), stored)
+             and not ledger.holds(set(), {ledger.ids[1]}, stored))
+    print("ledger check    | {:7.1f} ms | holds after a move: {}, stale after an edit or delete: {}".format(
+        (time.time() - t0) * 1000.0, holds, stale))
+    return ok and holds and stale
+
+
+if __name__ == "__main__":
+    ok = run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
+    print("incremental run wrote exactly the changed elements" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
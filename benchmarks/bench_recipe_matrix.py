@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Benchmark: re-pricing a recipe library through RecipeMatrix.
+
+Runs outside Revit:  python benchmarks/bench_recipe_matrix.py [types] [materials]
+
+Reports the backend in use (scipy / numpy / python), the one-off compile
+time and the cost of one re-price of every type.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools.extension", "lib"))
+from costestimates.recipes import RecipeBook  # noqa: E402
+from costestimates import recipematrix  # noqa: E402
+
+
+def make_library(n_types, n_materials, seed=1):
+    rnd = random.Random(seed)
+    materials = ["mat {}".format(i) for i in range(n_materials)]
+    prices = dict((m, rnd.uniform(1, 500)) for m in materials)
+    recipes = {}
+    for i in range(n_types):
+        comps = dict((m, rnd.uniform(0.1, 10)) for m in rnd.sample(materials, 6))
+        if i >= 100 and rnd.random() < 0.3:
+            comps["type {}".format(rnd.randrange(100))] = rnd.uniform(0.1, 2)
+        recipes["type {}".format(i)] = comps
+    return recipes, prices
+
+
+def run(n_types, n_materials, repeats=20):
+    recipes, prices = make_library(n_types, n_materials)
+    t0 = time.time()
+    book = RecipeBook(recipes, prices)
+    compile_s = time.time() - t0
+
+    vec = book.matrix.price_vector(prices)
+    t0 = time.time()
+    for _ in range(repeats):
+        book.matrix.multiply(vec)
+    reprice_ms = (time.time() - t0) * 1000.0 / repeats
+    print("{:>7} types x {:>6} materials [{}] | compile {:6.3f}s | re-price {:8.2f} ms".format(
+        n_types, n_materials, recipematrix.BACKEND, compile_s, reprice_ms))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        run(int(sys.argv[1]), int(sys.argv[2]))
+    else:
+        for n_types, n_materials in ((1000, 500), (10000, 2000), (100000, 10000)):
+            run(n_types, n_materials)
@@ -1,63 +1,37 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
-import os, re, csv
+import os, csv
+from collections import defaultdict
 
-def norm(s):
-    return re.sub(r'\s+', ' ', (s or '').strip()).lower()
+from costestimates.pricebook import load_price_book, stream_price_folder
+from costestimates.matindex import MaterialIndex
+from costestimates.matcher import RuleMatcher
 
-def find_column(columns, *candidates):
-    cols = [c.strip().lower() for c in columns or []]
-    for cand in candidates:
-        if cand.lower() in cols:
-            return cols.index(cand.lower())
-    for cand in candidates:
-        for i, c in enumerate(cols):
-            if cand.lower() in c:
-                return i
-    return None
+def load_cost_folder(folderpath, use_cache=True, stats=None):
+    """Merge all CSV price files in a folder into a lookup.
 
-def load_cost_folder(folderpath):
-    """Merge all CSV price files in a folder into a lookup."""
+    With ``use_cache=False`` the files are streamed record by record, so
+    only the merged lookup is ever held in memory; pass a ``CacheStats`` as
+    ``stats`` to get the row count and rows per second.
+    """
+    if use_cache:
+        return load_price_book(folderpath).cost_map()
     result = {}
     if not folderpath or not os.path.isdir(folderpath):
         return result
-    files = [f for f in os.listdir(folderpath) if f.lower().endswith(".csv")]
-    for fname in files:
-        fpath = os.path.join(folderpath, fname)
-        try:
-            with open(fpath, "r", encoding="utf-8-sig") as fh:
-                rdr = csv.reader(fh)
-                rows = list(rdr)
-            if not rows:
-                continue
-            header = rows[0]
-            name_i = find_column(header, "item", "product description", "material", "description", "name")
-            unit_i = find_column(header, "uom", "unit")
-            rate_i = find_column(header, "rate", "unit cost", "price", "cost")
-            if name_i is None or rate_i is None:
-                continue
-            for r in rows[1:]:
-                try:
-                    nm = (r[name_i] or "").strip()
-                    if not nm:
-                        continue
-                    u = (r[unit_i] or "").strip() if unit_i is not None and unit_i < len(r) else ""
-                    rr = (r[rate_i] or "0").replace(",", "")
-                    try:
-                        rate = float(rr)
-                    except Exception:
-                        rate = 0.0
-                    result[norm(nm)] = {"name": nm, "unit": u, "rate": rate, "src": fname}
-                except Exception:
-                    continue
-        except Exception:
-            continue
+    for key, nm, u, rate, src in stream_price_folder(folderpath, stats):
+        result[key] = {"name": nm, "unit": u, "rate": rate or 0.0, "src": src}
     return result
 
+class RecipeRules(defaultdict):
+    """category -> list of rules, plus one RuleMatcher per category in ``matchers``."""
+    def __init__(self):
+        defaultdict.__init__(self, list)
+        self.matchers = {}
+
 def load_recipes(csv_path):
-    """Return dict: category -> list of rows."""
-    from collections import defaultdict
-    recipes = defaultdict(list)
+    """Return RecipeRules: category -> list of rows, with compiled matchers."""
+    recipes = RecipeRules()
     if not csv_path or not os.path.isfile(csv_path):
         return recipes
     with open(csv_path, "r", encoding="utf-8-sig") as fh:
@@ -76,28 +50,29 @@ def load_recipes(csv_path):
             except: perb = 0.0
             try: wast = float(str(wast).replace("%","").replace(",", ""))
             except: wast = 0.0
-            try:
-                rgx = re.compile(patt, re.IGNORECASE)
-            except:
-                rgx = re.compile(re.escape(patt), re.IGNORECASE)
             recipes[cat].append({
-                "regex": rgx,
+                "pattern": patt,
                 "base_unit": buni,
                 "material": mat,
                 "unit": uom,
                 "per_base": perb,
                 "waste": wast
             })
+    for cat, rules in recipes.items():
+        recipes.matchers[cat] = RuleMatcher([r["pattern"] for r in rules])
     return recipes
 
-def price_lookup(cost_map, material_name):
-    key = norm(material_name)
-    cm = cost_map.get(key)
+def price_lookup(index, material_name):
+    """Return (rate, src, unit) for a material; ``index`` is a MaterialIndex.
+
+    A plain cost map is still accepted but is indexed on every call, so
+    build the index once with ``MaterialIndex(cost_map)`` in loops.
+    """
+    if not isinstance(index, MaterialIndex):
+        index = MaterialIndex(index)
+    cm = index.best(material_name)
     if cm:
         return cm.get("rate", 0.0), cm.get("src",""), cm.get("unit","")
-    for k, v in cost_map.items():
-        if k in key or key in k:
-            return v.get("rate", 0.0), v.get("src",""), v.get("unit","")
     return 0.0, "", ""
 
 def safe_float(x, default=0.0):
@@ -7,9 +7,13 @@ __doc__    = "Material schedule with debug logs & summary; saves to Desktop."
 import os, csv, datetime
 from collections import defaultdict
 
-from Autodesk.Revit.DB import FilteredElementCollector, BuiltInCategory, BuiltInParameter
+from Autodesk.Revit.DB import FilteredElementCollector, BuiltInCategory
 from Autodesk.Revit.UI import TaskDialog
 from pyrevit import revit, script
+from costestimates.typecache import TypeCache
+from costestimates.quantities import open_cache
+from costestimates.amounts import Measurer
+from costestimates.pricebook import norm
 
 import System
 DESKTOP = System.Environment.GetFolderPath(System.Environment.SpecialFolder.DesktopDirectory)
@@ -22,9 +26,11 @@ SCRIPT_DIR  = os.path.dirname(__file__)
 RECIPES_CSV = os.path.join(SCRIPT_DIR, "recipes.csv")
 COST_DIR    = os.path.join(SCRIPT_DIR, "material_costs")
 
-from helpers import load_cost_folder, load_recipes, norm, price_lookup
+from helpers import load_price_book, load_recipes, price_lookup, MaterialIndex
 
 doc = revit.doc
+types = TypeCache(doc)
+quantities = open_cache(doc)
 
 def alert(msg):
     TaskDialog.Show("Material Schedule", msg)
@@ -35,7 +41,8 @@ if not os.path.isfile(RECIPES_CSV):
 if not os.path.isdir(COST_DIR):
     alert("Missing material_costs folder at:\n{}".format(COST_DIR)); script.exit()
 
-cost_map = load_cost_folder(COST_DIR)
+price_book = load_price_book(COST_DIR)
+cost_map = price_book.cost_map()
 recipes  = load_recipes(RECIPES_CSV)
 
 if not cost_map:
@@ -43,17 +50,27 @@ if not cost_map:
 if not recipes:
     alert("No recipe rows loaded from:\n{}\n\nCheck headers (Category, FamilyOrTypePattern, BaseUnit, Constituent, Unit, QtyPerBase, [Waste%]).".format(RECIPES_CSV)); script.exit()
 
-# ---- Category rules (align recipe BaseUnit to these)
+price_index = MaterialIndex(cost_map)
+
+# ---- Recipe category per model category; how each is measured (and so the
+# base unit recipes must use) is in the "schedule" rows of measurement.csv
 CAT_RULES = [
-    ("Block Work in Walls", BuiltInCategory.OST_Walls,               "m²", BuiltInParameter.HOST_AREA_COMPUTED),
-    ("Concrete Works",      BuiltInCategory.OST_StructuralFoundation,"m³", BuiltInParameter.HOST_VOLUME_COMPUTED),
-    ("Concrete Works",      BuiltInCategory.OST_Floors,              "m³", BuiltInParameter.HOST_VOLUME_COMPUTED),
-    ("Concrete Works",      BuiltInCategory.OST_StructuralFraming,   "m³", BuiltInParameter.HOST_VOLUME_COMPUTED),
-    ("Concrete Works",      BuiltInCategory.OST_StructuralColumns,   "m³", BuiltInParameter.HOST_VOLUME_COMPUTED),
+    ("Block Work in Walls", "OST_Walls"),
+    ("Concrete Works",      "OST_StructuralFoundation"),
+    ("Concrete Works",      "OST_Floors"),
+    ("Concrete Works",      "OST_StructuralFraming"),
+    ("Concrete Works",      "OST_StructuralColumns"),
 ]
-CAT_BASEUNIT = {c:u for (c,_,u,_) in CAT_RULES}
+measurer = Measurer(doc, types.params, quantities, tool="schedule")
+CAT_BASEUNIT = {c:measurer.rules.unit(cat) for (c,cat) in CAT_RULES}
 
 def get_item_display_name(el):
+    try:
+        label = types.of(el).label
+        if label:
+            return label
+    except Exception:
+        pass
     try:
         sym = getattr(el, "Symbol", None)
         if sym:
@@ -69,24 +86,20 @@ def get_item_display_name(el):
 # ---- 1) Collect model bases
 bases = defaultdict(lambda: defaultdict(float))  # {cat: {name: qty}}
 total_elements = 0
-for catname, bic, base_unit, bip in CAT_RULES:
+for catname, cat in CAT_RULES:
     try:
+        bic = getattr(BuiltInCategory, cat)
         for el in FilteredElementCollector(doc).OfCategory(bic).WhereElementIsNotElementType():
             total_elements += 1
-            p = el.get_Parameter(bip)
-            if not p: continue
-            val = p.AsDouble()
-            if base_unit == "m²":
-                qty = val * 0.09290304   # ft² -> m²
-            elif base_unit == "m³":
-                qty = val * 0.028316846592  # ft³ -> m³
-            else:
-                qty = val
+            qty, _, reason = measurer.measure(el)
+            if reason is not None: continue  # no such parameter
             if qty <= 1e-9: continue
             bases[catname][get_item_display_name(el)] += qty
     except Exception:
         continue
 
+quantities.save()
+
 # Write bases debug
 try:
     with open(DBG_BASES, "w", newline="") as fh:
@@ -108,22 +121,19 @@ for catname, name_qty in bases.items():
         continue
     materials_by_cat[catname] = {}
     base_unit = CAT_BASEUNIT.get(catname, "")
+    matcher = recipes.matchers[catname]
     for item_name, base_total in name_qty.items():
-        for r in rules:
+        for idx in matcher.match(item_name):
+            r = rules[idx]
             if r.get("base_unit") != base_unit:
                 continue
-            try:
-                if not r["regex"].search(item_name or ""):
-                    continue
-            except Exception:
-                continue
             perb  = float(r.get("per_base",0.0) or 0.0)
             waste = float(r.get("waste",0.0) or 0.0)
             qty   = perb * base_total
             if waste > 0: qty *= (1.0 + waste/100.0)
             mat_name = r["material"].strip()
             unit     = r["unit"].strip()
-            rate, src, unit_from_price = price_lookup(cost_map, mat_name)
+            rate, src, unit_from_price = price_lookup(price_index, mat_name)
             if unit_from_price: unit = unit_from_price
             key = (norm(mat_name), unit)
             cur = materials_by_cat[catname].get(key, {"name": mat_name, "unit": unit, "qty": 0.0, "rate": 0.0, "src": src})
@@ -131,7 +141,7 @@ for catname, name_qty in bases.items():
             if cur["rate"] == 0.0 and rate:
                 cur["rate"] = rate; cur["src"] = src
             materials_by_cat[catname][key] = cur
-            match_rows.append([catname, item_name, r["regex"].pattern, base_total, mat_name, unit, perb, waste, qty])
+            match_rows.append([catname, item_name, r["pattern"], base_total, mat_name, unit, perb, waste, qty])
 
 # Write matches debug
 try:
@@ -214,6 +224,9 @@ msg = [
     "- Base items found (unique names across categories): {}".format(base_items),
     "- Recipe matches (rows): {}".format(len(match_rows)),
     "- Output lines written: {}".format(total_lines),
+    "- {}".format(price_book.stats.summary()),
+    "- {}".format(types.summary()),
+    "- {}".format(quantities.summary()),
     "",
     "Files saved to Desktop:",
     "- {}".format(OUT_XLSX),
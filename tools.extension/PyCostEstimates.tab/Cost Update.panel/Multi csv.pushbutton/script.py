@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 import os
-import csv
 import traceback
 from pyrevit import revit, DB, forms
+from costestimates.pricebook import load_price_book
+from costestimates.recipes import load_recipe_table, RecipeBook
+from costestimates.incremental import load_applied, save_applied, changes
+from costestimates.params import resolver_for
 
 # --- Paths ------------------------------------------------------------
 script_dir = os.path.dirname(__file__)
@@ -10,40 +13,62 @@ csv_folder_path = os.path.join(script_dir, "material_costs")
 csv_recipes_path = os.path.join(script_dir, "recipes.csv")
 
 # --- Load Material Unit-Costs ----------------------------------------
-material_prices, loaded_files = {}, []
+material_prices, loaded_files, price_stats = {}, [], None
 if os.path.isdir(csv_folder_path):
-    csv_files = [f for f in os.listdir(csv_folder_path) if f.endswith(".csv")]
-    if not csv_files:
+    book = load_price_book(csv_folder_path)
+    for fname, err in book.errors:
+        forms.alert("Error reading '{}': {}".format(fname, err), title="CSV Read Error")
+    if not book.files and not book.errors:
         forms.alert("No CSV files found in 'material_costs' folder.", title="Missing Data")
-    else:
-        for fname in csv_files:
-            try:
-                with open(os.path.join(csv_folder_path, fname), "r") as f:
-                    for row in csv.DictReader(f):
-                        try:
-                            material_prices[row["Item"].strip()] = float(row["UnitCost"])
-                        except (KeyError, ValueError):
-                            continue
-                loaded_files.append(fname)
-            except Exception as e:
-                forms.alert("Error reading '{}': {}".format(fname, e), title="CSV Read Error")
+    material_prices = book.prices_by_name()
+    loaded_files = book.file_report()
+    price_stats = book.stats
 else:
     forms.alert("Folder 'material_costs' not found next to the script.", title="Missing Folder")
 
 # --- Load Recipes -----------------------------------------------------
 recipes = {}
 try:
-    with open(csv_recipes_path, "r") as f:
-        for row in csv.DictReader(f):
-            try:
-                recipes.setdefault(row["Type"].strip(), {})[row["Component"].strip()] = float(row["Quantity"])
-            except (KeyError, ValueError):
-                continue
+    recipes = load_recipe_table(csv_recipes_path)
 except Exception as e:
     forms.alert("Error reading recipes.csv: {}".format(e), title="Recipes Load Error")
+recipe_book = RecipeBook(recipes, material_prices)
+if recipe_book.cycles:
+    forms.alert("Recipes that reference each other in a loop were skipped:\n" +
+                "\n".join(" -> ".join(c) for c in recipe_book.cycles), title="Recipe Cycle")
+
+# --- Incremental mode -------------------------------------------------
+# A type or material whose materials and recipes have not changed since
+# the last run, and whose Cost still holds the price written then, is
+# not priced again; the others are priced and written when their Cost
+# differs. Shift+Click forces a full update of every matching type.
+doc_key = revit.doc.PathName or revit.doc.Title
+params = resolver_for(revit.doc)
+full_update = __shiftclick__  # noqa: F821 (injected by pyRevit)
+last_applied = None if full_update else load_applied(doc_key)
+changed_materials, changed_types = changes(last_applied, material_prices, recipes)
+dirty_types = None if changed_materials is None else recipe_book.affected(changed_materials, changed_types)
+last_costs = last_applied[2] if last_applied else {}
+priced_costs = {}   # element id -> the price its Cost now holds
+
+def _already_set(cost_param, value):
+    return abs(cost_param.AsDouble() - value) < 1e-6
+
+def _still_priced(elem, cost_param, dirty):
+    """True when nothing ``elem`` depends on changed and its Cost still holds last run's price."""
+    last = None if dirty else last_costs.get(elem.Id.IntegerValue)
+    if last is None or not _already_set(cost_param, last):
+        return False
+    priced_costs[elem.Id.IntegerValue] = last
+    return True
+
+def _editable(cost_param):
+    return cost_param and cost_param.StorageType == DB.StorageType.Double and not cost_param.IsReadOnly
 
 # --- Book-keeping -----------------------------------------------------
 updated, skipped = [], []
+unchanged_types, unchanged_materials = [], []
+applied = False
 missing_materials = set()
 paint_updated, paint_skipped = [], []
 
@@ -71,24 +96,28 @@ try:
                 tname = p.AsString().strip()
                 if tname not in recipes:
                     continue
+                cost_param = params.get(elem, "cost")
+                if _editable(cost_param) and _still_priced(elem, cost_param,
+                                                           dirty_types is None or tname in dirty_types):
+                    unchanged_types.append(tname)
+                    continue
 
-                total_cost, valid = 0, True
-                for mat, qty in recipes[tname].items():
-                    if mat in material_prices:
-                        total_cost += qty * material_prices[mat]
-                    else:
-                        missing_materials.add(mat)
-                        skipped.append("{} (missing price for {})".format(tname, mat))
-                        valid = False
-                        break
-
-                if valid:
-                    cost_param = elem.LookupParameter("Cost")
-                    if cost_param and cost_param.StorageType == DB.StorageType.Double and not cost_param.IsReadOnly:
-                        cost_param.Set(total_cost)
-                        updated.append((tname, total_cost))
-                    else:
-                        skipped.append("{} (no editable 'Cost' parameter)".format(tname))
+                total_cost = recipe_book.rate(tname)
+                if total_cost is None:
+                    if tname in recipe_book.missing:
+                        missing_materials.add(recipe_book.missing[tname])
+                    skipped.append("{} ({})".format(tname, recipe_book.errors[tname]))
+                    continue
+
+                if _editable(cost_param):
+                    priced_costs[elem.Id.IntegerValue] = total_cost
+                    if _already_set(cost_param, total_cost):
+                        unchanged_types.append(tname)
+                        continue
+                    cost_param.Set(total_cost)
+                    updated.append((tname, total_cost))
+                else:
+                    skipped.append("{} (no editable 'Cost' parameter)".format(tname))
 
         # ---------- ELEMENT TYPE COST APPLICATION -------------------------
         apply_cost_to_elements(DB.FilteredElementCollector(revit.doc).OfClass(DB.WallType),              DB.BuiltInCategory.OST_Walls)
@@ -122,16 +151,27 @@ try:
         for mat in DB.FilteredElementCollector(revit.doc).OfClass(DB.Material).ToElements():
             mat_name = mat.Name.strip()
             if mat_name in material_prices:
-                cost_param = mat.LookupParameter("Cost")
-                if cost_param and cost_param.StorageType == DB.StorageType.Double and not cost_param.IsReadOnly:
+                cost_param = params.get(mat, "cost")
+                if _editable(cost_param):
+                    if _still_priced(mat, cost_param, changed_materials is None or mat_name in changed_materials):
+                        unchanged_materials.append(mat_name)
+                        continue
+                    priced_costs[mat.Id.IntegerValue] = material_prices[mat_name]
+                    if _already_set(cost_param, material_prices[mat_name]):
+                        unchanged_materials.append(mat_name)
+                        continue
                     cost_param.Set(material_prices[mat_name])
                     paint_updated.append((mat_name, material_prices[mat_name]))
                 else:
                     paint_skipped.append(mat_name)
 
-except Exception as e:
+    applied = True
+except Exception:
     forms.alert("Script crashed with error:\n{}".format(traceback.format_exc()), title="Crash in Transaction")
 
+if applied:
+    save_applied(doc_key, material_prices, recipes, priced_costs)
+
 # ===================== SUMMARY ========================================
 summary = []
 
@@ -143,6 +183,10 @@ if paint_updated:
     summary.append("\n🎨 Updated Paint / Finish Materials:")
     summary.extend(["- {} : {:.2f} ZMW/m²".format(n, c) for n, c in paint_updated])
 
+if unchanged_types or unchanged_materials:
+    summary.append("\n⏭ Skipped as unchanged since last update: {} type(s), {} material(s)"
+                   " (Shift+Click to force a full update)".format(len(unchanged_types), len(unchanged_materials)))
+
 if skipped:
     summary.append("\n⚠️ Skipped Types:")
     summary.extend(["- " + s for s in skipped])
@@ -151,14 +195,21 @@ if paint_skipped:
     summary.append("\n⚠️ Skipped Materials (no editable Cost param):")
     summary.extend(["- " + n for n in paint_skipped])
 
+if getattr(recipes, "skipped", None):
+    summary.append("\n⚠️ recipes.csv rows ignored (their types are priced without them):")
+    summary.extend(["- line {}: {} ({})".format(line, t, why) for line, t, why in recipes.skipped])
+
 if missing_materials:
     summary.append("\n❗ Missing materials not priced in CSVs:")
     summary.extend(sorted(missing_materials))
 
 if loaded_files:
-    summary.append("\n📂 CSVs loaded:")
+    summary.append("\n📂 CSVs loaded (merge order, later files win):")
     summary.extend(["- " + f for f in loaded_files])
 
+if price_stats:
+    summary.append("\n⏱ " + price_stats.summary())
+
 if not summary:
     summary = ["No matching types or materials found."]
 
@@ -1,25 +1,69 @@
 # -*- coding: utf-8 -*-
+import time
 from pyrevit import revit, DB, forms
 from collections import defaultdict
+from costestimates.params import resolver_for
+from costestimates.amounts import priced_collector, stored_amount_reader
+from costestimates.ledger import load_current
 
 # --- Settings ---
-PARAM_NAME = "Test_1234"
+PARAM_KEY = "total"  # Test_1234, see lib/costestimates/parameters.csv
+BY_LEVEL_AND_PHASE = __shiftclick__  # noqa: F821 (injected by pyRevit)
 doc = revit.doc
-
-# --- Initialize collectors ---
-elements = DB.FilteredElementCollector(doc)\
-    .WhereElementIsNotElementType()\
-    .ToElements()
+params = resolver_for(doc)
 
 category_totals = defaultdict(float)
 category_counts = defaultdict(int)
+level_totals = defaultdict(float)
+phase_totals = defaultdict(float)
+names = {}
 grand_total = 0.0
 total_count = 0
 
+# --- Amount ledger ---
+# What Amount last wrote, while every amount it wrote is still in place.
+# Level and phase breakdowns need the elements, so Shift+Click always
+# reads the model.
+t0 = time.time()
+ledger = None if BY_LEVEL_AND_PHASE else load_current(
+    doc, priced_collector(doc).GetElementCount(), stored_amount_reader(doc, params))
+if ledger is not None:
+    for cat_id, (count, amount) in ledger.by_category().items():
+        cat = DB.Category.GetCategory(doc, DB.ElementId(cat_id))
+        cat_name = cat.Name if cat else "Uncategorized"
+        category_totals[cat_name] += amount
+        category_counts[cat_name] += count
+        grand_total += amount
+        total_count += count
+    elements = []
+    source = "Amount ledger, {} row(s)".format(len(ledger))
+else:
+    # Only the categories Amount prices carry a value; when Test_1234 is
+    # resolved to a shared parameter, Revit also drops every element <= 0.
+    collector = priced_collector(doc)
+    positive = params.positive_filter(PARAM_KEY)
+    if positive is not None:
+        collector = collector.WherePasses(positive)
+    elements = collector.ToElements()
+    source = "{} element(s) returned by Revit ({})".format(
+        len(elements), "filtered on value > 0" if positive is not None else "by category only")
+collect_ms = (time.time() - t0) * 1000.0
+
+
+def _name_of(element_id, default):
+    """Element name by id, read once per id."""
+    key = element_id.IntegerValue if element_id else -1
+    if key not in names:
+        el = doc.GetElement(element_id) if key != -1 else None
+        names[key] = el.Name if el else default
+    return names[key]
+
+
 # --- Process elements ---
+t0 = time.time()
 for elem in elements:
     try:
-        param = elem.LookupParameter(PARAM_NAME)
+        param = params.get(elem, PARAM_KEY)
         if param and param.HasValue and param.StorageType == DB.StorageType.Double:
             value = param.AsDouble()
             if value > 0:
@@ -28,8 +72,12 @@ for elem in elements:
                 category_counts[cat_name] += 1
                 grand_total += value
                 total_count += 1
+                if BY_LEVEL_AND_PHASE:
+                    level_totals[_name_of(getattr(elem, "LevelId", None), "No level")] += value
+                    phase_totals[_name_of(getattr(elem, "CreatedPhaseId", None), "No phase")] += value
     except:
         continue
+sum_ms = (time.time() - t0) * 1000.0
 
 # --- Build message ---
 message = "**Total of Test_1234 across {} elements:**\n\n".format(total_count)
@@ -37,6 +85,12 @@ message += "ZAR {:.2f}\n\n".format(grand_total)
 message += "**Category Breakdown:**\n"
 for cat in sorted(category_totals.keys()):
     message += "- {} ({}): ZAR {:.2f}\n".format(cat, category_counts[cat], category_totals[cat])
+if BY_LEVEL_AND_PHASE:
+    for title, totals in (("Level", level_totals), ("Phase", phase_totals)):
+        message += "\n**{} Breakdown:**\n".format(title)
+        for key in sorted(totals.keys()):
+            message += "- {}: ZAR {:.2f}\n".format(key, totals[key])
+message += "\nFrom {}: read in {:.0f} ms, summed in {:.0f} ms.".format(source, collect_ms, sum_ms)
 
 # --- Show popup ---
 forms.alert(message, title="Test_1234 Totals by Category", warn_icon=True)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""P10/P50/P90 cost of the model under material price uncertainty.
+
+Price ranges come from optional Min/Likely/Max or Sigma columns in the
+Multi csv cost CSVs. Shift+Click to choose the sample count and seed.
+"""
+import os
+from pyrevit import revit, DB, forms
+from pyrevit import script
+from costestimates.pricebook import load_price_book
+from costestimates.recipes import load_recipe_table, RecipeBook
+from costestimates.risk import PriceRisk, load_price_ranges, DEFAULT_SAMPLES
+from costestimates.amounts import Measurer, collect_elements, boq_section
+from costestimates.typecache import TypeCache
+from costestimates.quantities import open_cache
+
+output = script.get_output()
+doc = revit.doc
+
+# --- Paths (shared with Multi csv) -----------------------------------
+multi_dir = os.path.join(os.path.dirname(__file__), "..", "..", "Cost Update.panel", "Multi csv.pushbutton")
+csv_folder_path = os.path.normpath(os.path.join(multi_dir, "material_costs"))
+csv_recipes_path = os.path.normpath(os.path.join(multi_dir, "recipes.csv"))
+
+n_samples, seed = DEFAULT_SAMPLES, 42
+if __shiftclick__:  # noqa: F821 (injected by pyRevit)
+    answer = forms.ask_for_string(default="{} {}".format(n_samples, seed),
+                                  prompt="Number of samples and seed:", title="Price Risk")
+    if not answer:
+        script.exit()
+    try:
+        parts = answer.split()
+        n_samples = int(parts[0])
+        seed = int(parts[1]) if len(parts) > 1 else None
+    except ValueError:
+        forms.alert("Expected two whole numbers, e.g. '10000 42'.", exitscript=True)
+
+# --- Prices, ranges and recipes ---------------------------------------
+if not os.path.isdir(csv_folder_path):
+    forms.alert("Folder 'material_costs' not found in Multi csv.", title="Missing Folder", exitscript=True)
+book = load_price_book(csv_folder_path)
+ranges = load_price_ranges(csv_folder_path)
+if not ranges:
+    forms.alert("No Min/Max or Sigma columns found in the cost CSVs; every price is fixed.",
+                title="No Price Ranges")
+try:
+    recipes = load_recipe_table(csv_recipes_path)
+except Exception as e:
+    recipes = {}
+    forms.alert("Error reading recipes.csv: {}".format(e), title="Recipes Load Error")
+recipe_book = RecipeBook(recipes, book.prices_by_name())
+
+# --- Model quantities (as measured by Amount) -------------------------
+types = TypeCache(doc)
+quantities = open_cache(doc)
+measurer = Measurer(doc, types.params, quantities)
+rows, skipped = [], 0
+for elem in collect_elements(doc):
+    try:
+        qty, method, reason = measurer.measure(elem)
+        if reason:
+            skipped += 1
+            continue
+        info = types.of(elem)
+        name = info.name
+        if not name and info.element:
+            name_p = info.element.get_Parameter(DB.BuiltInParameter.ALL_MODEL_TYPE_NAME)
+            name = name_p.AsString() if name_p else None
+        if not name or info.cost is None:
+            raise Exception("Missing type name or Cost")
+        rows.append((name.strip(), boq_section(elem), qty, info.cost))
+    except Exception:
+        skipped += 1
+
+quantities.save()
+
+# --- Simulate ---------------------------------------------------------
+result = PriceRisk(recipe_book, ranges).run(rows, n=n_samples, seed=seed)
+
+
+def _row(label, stats):
+    return [label] + ["{:,.2f}".format(stats[k]) for k in ("mean", "p10", "p50", "p90")]
+
+
+columns = ["", "Mean", "P10", "P50", "P90"]
+output.print_md("## Price risk: {:,} elements, {} skipped".format(len(rows), skipped))
+output.print_table([_row("**Total**", result.total)], columns=columns, title="Total (ZMW)")
+output.print_table([_row(s, result.sections[s]) for s in sorted(result.sections)],
+                   columns=columns, title="By BOQ section (ZMW)")
+spread = sorted(result.types, key=lambda t: result.types[t]["p90"] - result.types[t]["p10"], reverse=True)
+output.print_table([_row(t, result.types[t]) for t in spread],
+                   columns=columns, title="By type, widest P10-P90 spread first (ZMW)")
+output.print_md("⏱ " + result.summary())
+output.print_md("⏱ " + types.summary())
+output.print_md("⏱ " + quantities.summary())
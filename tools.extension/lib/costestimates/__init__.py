@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""Shared helpers for the PyCostEstimates pushbuttons.
+
+pyRevit puts this ``lib`` folder on ``sys.path`` for every script in the
+extension, so pushbuttons import from here with ``from costestimates
+import pricebook``.
+
+``amounts``, ``snapshot``, ``typecache``, ``params``, ``earthworks``,
+``painting`` and ``quantities`` read the model through the Revit API;
+everything else runs outside Revit.
+"""
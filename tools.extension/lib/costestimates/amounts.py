@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Quantity rules of the Amount button (Revit side).
+
+``Amount`` multiplies each element's type ``Cost`` by a quantity measured
+per category, as the ``amount`` rows of ``measurement.csv`` say. The same
+quantities feed the price-risk button, so ``Measurer`` lives here rather
+than in either script; Material Schedule uses it with its own rows.
+"""
+from collections import OrderedDict
+
+from pyrevit import DB
+from pyrevit.framework import List
+
+from costestimates.params import resolver_for
+from costestimates.quantities import QuantityCache, spec_key, specs_of
+from costestimates.measurement import MEASURES, MeasurementRules, material_text
+
+PARAM_COST = "Cost"
+PARAM_TARGET = "Test_1234"
+
+# BOQ section each category is billed under (see Generate BOQ's CATEGORY_MAP)
+BOQ_SECTIONS = {
+    DB.BuiltInCategory.OST_Doors: "Doors",
+    DB.BuiltInCategory.OST_Windows: "Windows",
+    DB.BuiltInCategory.OST_StructuralFraming: "Structural Framing",
+    DB.BuiltInCategory.OST_StructuralFoundation: "Structural Foundations",
+    DB.BuiltInCategory.OST_StructuralColumns: "Structural Columns",
+    DB.BuiltInCategory.OST_Floors: "Floors",
+    DB.BuiltInCategory.OST_Walls: "Block Work in Walls",
+    DB.BuiltInCategory.OST_Roofs: "Roofs",
+    DB.BuiltInCategory.OST_Ceilings: "Ceilings",
+    DB.BuiltInCategory.OST_Conduit: "Electrical",
+    DB.BuiltInCategory.OST_LightingFixtures: "Electrical",
+    DB.BuiltInCategory.OST_LightingDevices: "Electrical",
+    DB.BuiltInCategory.OST_ElectricalFixtures: "Electrical",
+    DB.BuiltInCategory.OST_ElectricalEquipment: "Electrical",
+    DB.BuiltInCategory.OST_GenericModel: "Wall and Floor Finishes",
+    DB.BuiltInCategory.OST_Rebar: "Structural Rebar",
+    DB.BuiltInCategory.OST_PlumbingFixtures: "Plumbing",
+    DB.BuiltInCategory.OST_PipeCurves: "Plumbing",
+    DB.BuiltInCategory.OST_PipeFitting: "Plumbing",
+    DB.BuiltInCategory.OST_PipeAccessory: "Plumbing",
+}
+
+
+# Why an element was not priced; SkipReport aggregates these codes.
+NO_CATEGORY = "no_category"
+UNRECOGNIZED_CATEGORY = "unrecognized_category"
+NO_MATERIAL_PARAM = "no_material_param"
+UNSUPPORTED_MATERIAL = "unsupported_material"
+NO_VOLUME = "no_volume"
+NO_AREA = "no_area"
+NO_LENGTH = "no_length"
+MISSING_PARAMETER = "missing_parameter"
+ERROR = "error"
+
+REASONS = OrderedDict([
+    (NO_CATEGORY, "Missing category"),
+    (UNRECOGNIZED_CATEGORY, "Unrecognized category"),
+    (NO_MATERIAL_PARAM, "No 'Structural Material' parameter"),
+    (UNSUPPORTED_MATERIAL, "Unsupported structural material"),
+    (NO_VOLUME, "No volume data"),
+    (NO_AREA, "No area data"),
+    (NO_LENGTH, "No length data"),
+    (MISSING_PARAMETER, "Missing or read-only parameter"),
+    (ERROR, "Revit error"),
+])
+
+NO_QUANTITY = {"volume": NO_VOLUME, "area": NO_AREA, "length": NO_LENGTH}
+
+# Categories and measures come from the "amount" rows of measurement.csv
+PRICED_CATEGORIES = [getattr(DB.BuiltInCategory, c) for c in MeasurementRules("amount").categories()
+                     if hasattr(DB.BuiltInCategory, c)]
+_SECTIONS = dict((int(bic), name) for bic, name in BOQ_SECTIONS.items())
+
+
+def priced_collector(doc):
+    """A collector over every instance of the priced categories."""
+    cats = DB.ElementMulticategoryFilter(List[DB.BuiltInCategory](PRICED_CATEGORIES))
+    return DB.FilteredElementCollector(doc) \
+        .WherePasses(cats) \
+        .WhereElementIsNotElementType()
+
+
+def collect_elements(doc):
+    """Return every instance of the priced categories, in one collector."""
+    return priced_collector(doc).ToElements()
+
+
+def stored_amount_reader(doc, params=None):
+    """Return ``f(element id)``: the ``Test_1234`` value now on it, or None.
+
+    ``load_current`` reads it for the ledger elements changed since the
+    ledger was stamped.
+    """
+    params = params or resolver_for(doc)
+
+    def stored_amount(eid):
+        el = doc.GetElement(DB.ElementId(eid))
+        p = params.get(el, "total") if el is not None else None
+        return p.AsDouble() if p and p.HasValue else None
+    return stored_amount
+
+
+class Measurer(object):
+    """Quantity of an element by its integer category id.
+
+    ``measure(elem)`` returns ``(quantity, method, None)`` or ``(None,
+    method, reason code)``; nothing is raised for an element that simply
+    can't be priced. The ``tool`` rows of ``measurement.csv`` are compiled
+    into one function per category when the measurer is made; where they
+    depend on the structural material, the choice is made once per
+    material id. Parameter values are read through ``quantities``, a
+    ``QuantityCache``.
+    """
+
+    def __init__(self, doc, params=None, quantities=None, tool="amount"):
+        self.doc = doc
+        self.params = params or resolver_for(doc)
+        self.quantities = quantities if quantities is not None else QuantityCache()
+        self.rules = MeasurementRules(tool)
+        self.unsupported = {}
+        self.table = dict((int(getattr(DB.BuiltInCategory, cat)), fn)
+                          for cat, fn in self.rules.compile(self._step, self._by_material).items()
+                          if hasattr(DB.BuiltInCategory, cat))
+
+    def measure(self, elem):
+        category = elem.Category
+        if category is None:
+            return None, None, NO_CATEGORY
+        fn = self.table.get(category.Id.IntegerValue)
+        if fn is None:
+            return None, None, UNRECOGNIZED_CATEGORY
+        return fn(elem)
+
+    def _count(self, elem):
+        return 1.0, "count", None
+
+    def _step(self, category, method, positive, otherwise):
+        if method == "count":
+            return self._count
+        specs = specs_of(self.rules.params[category][method])
+        key = spec_key(specs)
+        factor = MEASURES[method][1]
+        reason = NO_QUANTITY[method]
+        quantities = self.quantities
+
+        def measure(elem):
+            value = quantities.raw(elem, key, specs)
+            if value == value and (value > 0 or not positive):
+                return value * factor, method, None
+            if otherwise is not None:
+                return otherwise(elem)
+            return None, method, reason
+        return measure
+
+    def _by_material(self, choices):
+        chosen = {}
+
+        def measure(elem):
+            mat_param = self.params.get(elem, "structural_material")
+            if not mat_param:
+                return None, None, NO_MATERIAL_PARAM
+            mat_id = mat_param.AsElementId()
+            key = mat_id.IntegerValue
+            fn = chosen.get(key)
+            if fn is None:
+                mat_elem = self.doc.GetElement(mat_id)
+                text = material_text(mat_elem)
+                fn = next((f for m, f in choices if m in text), None) or (mat_elem.Name if mat_elem else "")
+                chosen[key] = fn
+            if not callable(fn):
+                self.unsupported[fn] = self.unsupported.get(fn, 0) + 1
+                return None, None, UNSUPPORTED_MATERIAL
+            return fn(elem)
+        return measure
+
+
+class SkipReport(object):
+    """Skipped elements counted per reason code, with a few sample ids."""
+
+    def __init__(self, samples=5):
+        self.samples = samples
+        self.counts = OrderedDict()
+        self.ids = {}
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def add(self, reason, elem_id):
+        n = self.counts.get(reason, 0)
+        self.counts[reason] = n + 1
+        if n < self.samples:
+            self.ids.setdefault(reason, []).append(elem_id.IntegerValue)
+
+    def lines(self, unsupported=None):
+        for reason, n in sorted(self.counts.items(), key=lambda kv: -kv[1]):
+            line = "{}: {} element(s), e.g. {}".format(
+                REASONS.get(reason, reason), n, ", ".join(str(i) for i in self.ids.get(reason, ())))
+            if reason == UNSUPPORTED_MATERIAL and unsupported:
+                line += " ({})".format(", ".join("'{}' x{}".format(m, c) for m, c in sorted(unsupported.items())))
+            yield line
+
+
+def boq_section(elem):
+    try:
+        return _SECTIONS.get(elem.Category.Id.IntegerValue, elem.Category.Name)
+    except Exception:
+        return "Uncategorized"
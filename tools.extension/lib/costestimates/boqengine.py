@@ -0,0 +1,860 @@
+# -*- coding: utf-8 -*-
+"""Multi-bill BOQ workbook from a headless snapshot, without Revit.
+
+``build_workbook`` writes the cover, BILL 1 (sub & superstructure),
+BILL 2 (MEP), BILL 3 (external works) and the general summary from a
+``sources.QuantitySource``. Generate BOQ passes it the open document
+(``snapshot.LiveSource``); anywhere else, price a saved snapshot with::
+
+    python -m costestimates.boqengine <snapshot.jsonl.gz> <out.xlsx> [material_costs folder] [recipes.csv]
+
+With a price folder, types and paint materials whose name has a price
+(or, with ``recipes.csv``, a recipe rate) are re-priced; everything else
+keeps the rate read from the model.
+"""
+from __future__ import print_function
+import sys
+import time
+import string
+from collections import OrderedDict
+
+import xlsxwriter
+from xlsxwriter.utility import xl_rowcol_to_cell
+
+from costestimates.boqsnapshot import PhaseTimings, read_snapshot
+from costestimates.sources import SnapshotSource
+from costestimates.groupby import TYPE_NAME, FUNCTION_BUCKET, Grouping, fold, count
+from costestimates.measurement import MeasurementRules
+
+TAB_COLORS = {
+    "COVER":   "#A6A6A6",
+    "BILL1":   "#4472C4",
+    "BILL2":   "#C00000",
+    "BILL3":   "#FFD966",   # EXTERNAL WORKS tab = yellow
+    "SUMMARY": "#70AD47",
+}
+
+# Category order for BILL 1 + BILL 2
+CATEGORY_ORDER = [
+    "Cut and Fill",
+    "Structural Foundations",
+    "Internal Floors",
+    "Internal Walls",
+    "Internal Stairs",
+    "Block Work in Walls",
+    "Structural Columns",
+    "Structural Framing",
+    "Structural Rebar",
+    "Roofs",
+    "Ceilings",
+    "Windows",
+    "Doors",
+    "Electrical",
+    "Plumbing",
+    "Painting",
+    "Wall and Floor Finishes",
+    "Furniture",
+]
+
+# Category order for BILL 3 (external works)
+EXTERNAL_WORKS_ORDER = [
+    "External Floors",
+    "External Walls",
+    "External Stairs",
+    "Parking",
+    "Planting",
+    "Site Works",
+    "Paving",
+    "Drainage",
+    "Fencing",
+]
+
+# Sections split by Function (internal/external), written first
+SPLIT_SECTIONS = (
+    "Internal Floors", "External Floors",
+    "Internal Walls",  "External Walls",
+    "Internal Stairs", "External Stairs",
+)
+
+VIRTUAL_PAINT    = object()
+VIRTUAL_EARTH    = object()
+VIRTUAL_EXTERNAL = object()  # used for manual / split / site categories
+
+# Section -> snapshot category name(s)
+CATEGORY_MAP = {
+    # CORE / BUILDING / STRUCTURE / MEP
+    "Cut and Fill":            VIRTUAL_EARTH,  # topography / graded region volumes
+    "Structural Foundations":  "OST_StructuralFoundation",
+
+    # split by Function (internal/external)
+    "Internal Floors":         VIRTUAL_EXTERNAL,
+    "External Floors":         VIRTUAL_EXTERNAL,
+    "Internal Walls":          VIRTUAL_EXTERNAL,
+    "External Walls":          VIRTUAL_EXTERNAL,
+    "Internal Stairs":         VIRTUAL_EXTERNAL,
+    "External Stairs":         VIRTUAL_EXTERNAL,
+
+    "Block Work in Walls":     "OST_Walls",
+    "Structural Columns":      "OST_StructuralColumns",
+    "Structural Framing":      "OST_StructuralFraming",
+    "Structural Rebar":        "OST_Rebar",
+    "Roofs":                   "OST_Roofs",
+    "Ceilings":                "OST_Ceilings",
+    "Windows":                 "OST_Windows",
+    "Doors":                   "OST_Doors",
+
+    "Electrical": [
+        "OST_Conduit",
+        "OST_LightingFixtures",
+        "OST_LightingDevices",
+        "OST_ElectricalFixtures",
+        "OST_ElectricalEquipment",
+    ],
+    "Plumbing": [
+        "OST_PlumbingFixtures",
+        "OST_PipeCurves",
+        "OST_PipeFitting",
+        "OST_PipeAccessory",
+    ],
+
+    "Painting":                VIRTUAL_PAINT,
+    "Wall and Floor Finishes": "OST_GenericModel",
+    "Furniture": [
+        "OST_Furniture",
+        "OST_FurnitureSystems",
+    ],
+
+    # EXTERNAL WORKS (manual / site)
+    "Parking":         VIRTUAL_EXTERNAL,
+    "Planting":        VIRTUAL_EXTERNAL,
+    "Site Works":      VIRTUAL_EXTERNAL,
+    "Paving":          VIRTUAL_EXTERNAL,
+    "Drainage":        VIRTUAL_EXTERNAL,
+    "Fencing":         VIRTUAL_EXTERNAL,
+}
+
+_missing = [c for c in CATEGORY_ORDER + EXTERNAL_WORKS_ORDER if c not in CATEGORY_MAP]
+if _missing:
+    raise ValueError("Missing in CATEGORY_MAP: " + ", ".join(_missing))
+
+# External works sections filled from model elements, by category name
+EXTERNAL_CATEGORIES = {
+    # bays, bollards, markings, signs, etc.
+    "Parking":    ["OST_Parking", "OST_ParkingComponents", "OST_Site", "OST_SpecialityEquipment"],
+    # trees / shrubs
+    "Planting":   ["OST_Planting"],
+    # site furniture, lighting poles (street lights modelled as lighting
+    # fixtures), signs, benches; generic models as the catch-all
+    "Site Works": ["OST_Site", "OST_SpecialityEquipment", "OST_LightingFixtures", "OST_GenericModel"],
+}
+# Placeholder item of an external works section with nothing modelled
+PLACEHOLDER_LABELS = {
+    "Site Works": "Site works - see site drawings / spec",
+}
+
+CATEGORY_DESCRIPTIONS = {
+    "Cut and Fill": (
+        "Bulk earthworks operations including excavation (cut) and embankment (fill), "
+        "measured from Revit Topography / Graded Regions, or estimated from Building "
+        "Pads if no graded region exists."
+    ),
+    "Structural Foundations": (
+        "Mass or reinforced concrete footings, hardcore bedding, DPM and formwork, "
+        "conforming to BS 8000 (earthworks) and BS 8110 (concrete)."
+    ),
+
+    "Internal Floors": (
+        "In-situ or suspended internal concrete floor slabs, screeds and finishes within "
+        "the building footprint."
+    ),
+    "External Floors": (
+        "External slabs, aprons, walkways, ramps and hardscape slabs cast in place, "
+        "including preparation, sub-base and finishing, exposed to weather."
+    ),
+
+    "Internal Walls": (
+        "Internal wall construction including blockwork, plaster, paint, finishes, framing "
+        "and associated sundries within the building envelope."
+    ),
+    "External Walls": (
+        "External / retaining walls, upstands, plinth walls and exposed walling to the "
+        "perimeter and site works, including finishes and weatherproofing."
+    ),
+
+    "Internal Stairs": (
+        "Internal stair flights, landings, risers and finishes within the building, "
+        "including structural support and balustrades where applicable."
+    ),
+    "External Stairs": (
+        "External stair flights, ramps or stepped access in exposed locations, including "
+        "concrete, nosings, drainage slots, balustrades and associated works."
+    ),
+
+    "Block Work in Walls": (
+        "Concrete block walls, load-bearing or cavity, plastered both sides and painted to "
+        "BS 8000-3 masonry workmanship standards, including all mortar, bed-joint "
+        "reinforcement, movement provision and finishing to BS 5628-2/-3 quality."
+    ),
+    "Structural Columns": (
+        "Concrete/steel columns with starter bars, ties and shuttering; concrete to spec "
+        "per BS 8110-1, steel primed per BS 5493."
+    ),
+    "Structural Framing": (
+        "Mild steel beams and trusses, welded or bolted, treated with primer/paint to "
+        "BS 5493 and fabricated per BS 5950."
+    ),
+    "Structural Rebar": (
+        "High-yield deformed steel bars (BS 4449 B500B), cut, bent, fixed and supported "
+        "with chairs/spacers, placed per BS 8666 & BS 8110-1."
+    ),
+    "Roofs": (
+        "0.5 mm IBR/IT4 pre-painted roof sheeting fixed to purlins with screws, complete "
+        "with ridge capping, insulation and flashings, per BS 5534 & BS 8217."
+    ),
+    "Ceilings": (
+        "Particleboard or PVC tongue-and-groove ceilings, fixed or suspended per BS 5306 "
+        "and manufacturer instructions."
+    ),
+    "Windows": (
+        "Aluminium sliding or casement windows with glazing, mosquito nets, stays, "
+        "handles and fixings; installed per BS 6262 (glazing) and BS 6375."
+    ),
+    "Doors": (
+        "Timber or engineered doors with hardwood frames, architraves, ironmongery, seals "
+        "and painting; installed and fitted as per BS 8214."
+    ),
+    "Wall and Floor Finishes": (
+        "Tiling and screed finishes and plaster/paint to walls, following BS 5385 "
+        "(tiling), BS 8203 (screed) and BS 8000 finishing workmanship standards."
+    ),
+    "Plumbing": (
+        "Sanitary appliances (WC pans, cisterns, basins, sinks, urinals) per BS 6465-3, "
+        "with associated pipework, fittings, joints, valves, traps and accessories per "
+        "BS 5572 sanitary drainage."
+    ),
+    "Electrical": (
+        "Steel conduits per BS 4568-1, armoured cables/junction boxes per SANS 1507/BS 7671, "
+        "with lighting fixtures and switchgear as specified."
+    ),
+    "Painting": (
+        "Measured areas from the Revit Paint tool on wall faces (all sides), grouped by "
+        "material. Rates use the material 'Cost' if present."
+    ),
+
+    # EXTERNAL WORKS descriptions
+    "Parking": (
+        "External parking areas including formation, preparation, sub-base, basecourse and "
+        "final wearing course (asphalt / concrete block paving), line marking, edging and "
+        "any associated kerbs."
+    ),
+    "Planting": (
+        "Planting works including topsoil preparation, supply and installation of trees, shrubs, "
+        "hedges, grassing and maintenance during the defects liability period, in accordance "
+        "with landscape drawings and specifications."
+    ),
+    "Site Works": (
+        "Site preparation, grading, levelling, hardcore fill, compaction, temporary works, "
+        "access routes, street furniture and other external site-related works as indicated "
+        "on the site development plans."
+    ),
+    "Paving": (
+        "Walkways and paved circulation areas using concrete blocks / pavers on sand bedding, "
+        "including compacted sub-base, edge restraints and jointing sand."
+    ),
+    "Drainage": (
+        "Surface water and site drainage including open drains, culverts, manholes, catchpits, "
+        "gullies and pipework laid to falls, including bedding and surround."
+    ),
+    "Fencing": (
+        "Site perimeter fencing including posts, rails, mesh / palisade panels, gates and "
+        "associated excavation and concrete setting of posts."
+    ),
+}
+
+COVER_NAME   = "COVER"
+BILL1_NAME   = "BILL 1 - SUB & SUPERSTRUCTURE"
+BILL2_NAME   = "BILL 2 - MEP"
+BILL3_NAME   = "BILL 3 - EXTERNAL WORKS"
+SUMMARY_NAME = "GENERAL SUMMARY"
+ORDERED_BILLS = [BILL1_NAME, BILL2_NAME, BILL3_NAME]
+
+BILL_FOR_CATEGORY = {
+    "Electrical": BILL2_NAME,
+    "Plumbing":   BILL2_NAME,
+
+    # external works live on BILL 3
+    "External Floors": BILL3_NAME,
+    "External Walls":  BILL3_NAME,
+    "External Stairs": BILL3_NAME,
+    "Parking":         BILL3_NAME,
+    "Planting":        BILL3_NAME,
+    "Site Works":      BILL3_NAME,
+    "Paving":          BILL3_NAME,
+    "Drainage":        BILL3_NAME,
+    "Fencing":         BILL3_NAME,
+
+    # internal split categories -> BILL 1
+    "Internal Floors": BILL1_NAME,
+    "Internal Walls":  BILL1_NAME,
+    "Internal Stairs": BILL1_NAME,
+}
+
+CURRENCY_SYM = "K"
+CONTINGENCY_RATE = 0.05
+FIRST_PAGE_LAST_ROW = 47
+SIG_BLOCK_HEIGHT = 4
+
+
+def _bill_for(cat):
+    return BILL_FOR_CATEGORY.get(cat, BILL1_NAME)
+
+
+def _safe_sheet_name(name, used):
+    s = name.replace(u"–", "-").replace(u"—", "-")
+    for ch in '[]:*?/\\':
+        s = s.replace(ch, "")
+    s = s.strip().strip("'")[:31]
+    base = s
+    i = 1
+    while s in used:
+        suf = "({})".format(i)
+        s = (base[:31-len(suf)] + suf)
+        i += 1
+    used.add(s)
+    return s
+
+
+def _item_label(idx):
+    return string.ascii_uppercase[idx] if idx < 26 else str(idx + 1)
+
+
+def _sheet_ref(name, cell_addr):
+    return "'{}'!{}".format(name.replace("'", "''"), cell_addr)
+
+
+# ------------------------------------------------------------------------------
+# Section groupings
+# ------------------------------------------------------------------------------
+# Sections split into "Internal ..." and "External ..." by the type's
+# Function, and the category each is read from
+FUNCTION_SPLITS = OrderedDict([
+    ("Floors", "OST_Floors"),
+    ("Walls",  "OST_Walls"),
+    ("Stairs", "OST_Stairs"),
+])
+
+# Category -> measure, from the "boq" rows of measurement.csv; categories
+# without a rule count instances ("No.")
+ROW_MEASURES = MeasurementRules("boq").row_measures()
+
+
+def section_groupings():
+    """``{split or section name: Grouping}`` of every section read from model rows."""
+    plan = OrderedDict()
+    for name, cat in FUNCTION_SPLITS.items():
+        plan[name] = Grouping([cat], ROW_MEASURES, keys=(FUNCTION_BUCKET, TYPE_NAME))
+    for cat_name in CATEGORY_ORDER:
+        cats = CATEGORY_MAP.get(cat_name)
+        if not cats or cats is VIRTUAL_PAINT or cats is VIRTUAL_EARTH or cats is VIRTUAL_EXTERNAL:
+            continue
+        plan[cat_name] = Grouping(cats if isinstance(cats, list) else [cats], ROW_MEASURES)
+    # External works are counted whatever their category's rule
+    for ext_cat in EXTERNAL_WORKS_ORDER:
+        if ext_cat in EXTERNAL_CATEGORIES:
+            plan[ext_cat] = Grouping(EXTERNAL_CATEGORIES[ext_cat], count())
+    return plan
+
+
+def _cut_and_fill_items(earthworks):
+    """Cut / fill rows from the snapshot's earthworks section."""
+    grouped = {}
+    if not earthworks:
+        return grouped
+    total_cut_m3  = earthworks.get("cut", 0.0)
+    total_fill_m3 = earthworks.get("fill", 0.0)
+    pad_excav_m3  = earthworks.get("pad_excavation", 0.0)
+
+    if total_cut_m3 > 1e-9:
+        grouped["Cut Volume"] = {
+            "qty": round(total_cut_m3, 2),
+            "rate": 0.0,
+            "unit": "m³",
+            "comment": ""
+        }
+    if total_fill_m3 > 1e-9:
+        grouped["Fill Volume"] = {
+            "qty": round(total_fill_m3, 2),
+            "rate": 0.0,
+            "unit": "m³",
+            "comment": ""
+        }
+    if total_cut_m3 < 1e-9 and total_fill_m3 < 1e-9:
+        if pad_excav_m3 > 1e-9:
+            grouped["Pad Excavation (est.)"] = {
+                "qty": round(pad_excav_m3, 2),
+                "rate": 0.0,
+                "unit": "m³",
+                "comment": "Estimated from Building Pad volumes (no graded region / schedule values)."
+            }
+    return grouped
+
+
+# ------------------------------------------------------------------------------
+# Prices
+# ------------------------------------------------------------------------------
+def load_prices(folderpath, recipes_csv=None):
+    """``{name: rate}`` from a price folder, plus recipe rates when given."""
+    from costestimates.pricebook import load_price_book
+    prices = load_price_book(folderpath).prices_by_name()
+    if recipes_csv:
+        from costestimates.recipes import load_recipe_table, RecipeBook
+        prices.update(RecipeBook(load_recipe_table(recipes_csv), prices).rates)
+    return prices
+
+
+def reprice(snap, prices):
+    """Replace the rate of every row and paint item with a price for its name.
+
+    Paint items are looked up by material (``"Paint - X"`` by ``X``).
+    Returns the number of rates replaced.
+    """
+    replaced = 0
+    for i, name in enumerate(snap.names):
+        rate = prices.get(name)
+        if rate is not None:
+            snap.rates[i] = rate
+            replaced += 1
+    for name, data in snap.painting.items():
+        rate = prices.get(name[len("Paint - "):] if name.startswith("Paint - ") else name)
+        if rate is not None:
+            data["rate"] = rate
+            replaced += 1
+    return replaced
+
+
+# ------------------------------------------------------------------------------
+# Workbook
+# ------------------------------------------------------------------------------
+class BoqWorkbook(object):
+    """The cover, three bills and general summary, written top to bottom.
+
+    The workbook is opened in constant-memory mode, so each sheet must be
+    written in row order; ``write_section`` appends to the end of its bill.
+    """
+
+    def __init__(self, path, title, address):
+        self.path = path
+        self.title = title
+        self.address = address
+        self.title_text = "BILL OF QUANTITIES (BOQ) FOR THE CONSTRUCTION OF {}".format(title.upper())
+        self.wb = xlsxwriter.Workbook(path, {'constant_memory': True})
+        try:
+            self.wb.set_calc_on_load()
+        except AttributeError:
+            pass
+        self._formats()
+
+        used = set()
+        self.names = dict((n, _safe_sheet_name(n, used)) for n in (
+            COVER_NAME, BILL1_NAME, BILL2_NAME, BILL3_NAME, SUMMARY_NAME))
+        self.init_cover_sheet(self.names[COVER_NAME]).set_tab_color(TAB_COLORS["COVER"])
+        self.sheets = {}
+        for bill_name, color in zip(ORDERED_BILLS, ("BILL1", "BILL2", "BILL3")):
+            ws = self.init_bill_sheet(self.names[bill_name])
+            ws.set_tab_color(TAB_COLORS[color])
+            self.sheets[bill_name] = {
+                "ws": ws,
+                "row": 2,
+                "cat_counter": 1,
+                "cat_subtotals": {},
+                "order": []
+            }
+
+    def _formats(self):
+        wb = self.wb
+        font = 'Arial Narrow'
+
+        def col_fmt(bold=False, italic=False, underline=False, wrap=False, num_fmt=None):
+            fmt = {
+                'valign': 'top',
+                'font_name': font,
+                'font_size': 12,
+                'border': 1
+            }
+            if bold: fmt['bold'] = True
+            if italic: fmt['italic'] = True
+            if underline: fmt['underline'] = True
+            if wrap: fmt['text_wrap'] = True
+            if num_fmt: fmt['num_format'] = num_fmt
+            return wb.add_format(fmt)
+
+        self.fmt_header      = col_fmt(bold=True)
+        self.fmt_section     = col_fmt(bold=True)
+        self.fmt_description = col_fmt(italic=True, underline=True, wrap=True)
+        self.fmt_normal      = col_fmt()
+        self.fmt_italic      = col_fmt(italic=True, wrap=True)
+        self.fmt_money       = col_fmt(num_fmt='#,##0.00')
+        self.fmt_title       = wb.add_format({'bold': True, 'font_name': font, 'font_size': 12, 'align':'left'})
+        self.fmt_cover_huge  = wb.add_format({'bold': True, 'font_name': font, 'font_size': 16, 'align': 'center'})
+        self.fmt_center      = wb.add_format({'font_name': font, 'font_size': 12, 'align': 'center', 'valign': 'vcenter', 'border': 1})
+        self.fmt_text        = wb.add_format({'font_name': font, 'font_size': 12, 'border': 1})
+        self.fmt_bold        = wb.add_format({'font_name': font, 'font_size': 12, 'border': 1, 'bold': True})
+        self.fmt_wrap        = wb.add_format({'font_name': font, 'font_size': 12, 'border': 1, 'text_wrap': True, 'valign': 'top'})
+        self.fmt_percent     = wb.add_format({'font_name': font, 'font_size': 12, 'border': 1, 'num_format': '0.00%'})
+        self.fmt_money_right = wb.add_format({'font_name': font, 'font_size': 12, 'border': 1, 'num_format': '#,##0.00', 'align': 'right'})
+        self.fmt_noborder    = wb.add_format({'font_name': font, 'font_size': 12})
+        self.fmt_text_center = wb.add_format({'font_name': font, 'font_size': 12, 'align': 'center', 'valign': 'vcenter'})
+
+    # --------------------------------------------------------------------------
+    # Sheet setup
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _set_portrait(ws):
+        ws.set_paper(9)
+        ws.set_portrait()
+        ws.set_margins(left=0.5, right=0.5, top=0.5, bottom=0.8)
+
+    def init_bill_sheet(self, name):
+        ws = self.wb.add_worksheet(name)
+        self._set_portrait(ws)
+        ws.merge_range(0, 0, 0, 5, self.title_text, self.fmt_title)
+
+        headers = ["ITEM", "DESCRIPTION", "UNIT", "QTY", "RATE (EUR)", "AMOUNT (EUR)"]
+        for c, h in enumerate(headers):
+            ws.write(1, c, h, self.fmt_header)
+
+        ws.set_column(1, 1, 45)
+        ws.set_column(4, 4, 12)
+        ws.set_column(5, 5, 16)
+        ws.freeze_panes(2, 0)
+        return ws
+
+    def init_cover_sheet(self, name):
+        ws = self.wb.add_worksheet(name)
+        self._set_portrait(ws)
+
+        ws.set_column("B:D", 50)
+        ws.set_row(8, 28)
+        ws.set_row(15, 28)
+        ws.set_row(19, 28)
+        ws.set_row(21, 24)
+
+        ws.merge_range("B9:D9", "DEPARTMENT OF HOUSING AND INFRASTRUCTURE DEVELOPMENT", self.fmt_cover_huge)
+        ws.merge_range("B15:D15", "BILL OF QUANTITIES", self.fmt_cover_huge)
+        ws.merge_range("B17:D17", "FOR THE", self.fmt_text_center)
+        ws.merge_range("B19:D19", self.title_text, self.fmt_cover_huge)
+        ws.merge_range("B21:D21", "AT {}".format(self.address.upper()), self.fmt_text_center)
+        return ws
+
+    # --------------------------------------------------------------------------
+    # Sections
+    # --------------------------------------------------------------------------
+    def write_section(self, cat_name, grouped, comments=True):
+        """
+        Writes a category block (cat_name) on its bill using pre-grouped items:
+          grouped[name] = {qty, rate, unit, comment}
+        Comment lines follow their item unless ``comments`` is False.
+        """
+        if not grouped:
+            return
+
+        ctx          = self.sheets[_bill_for(cat_name)]
+        ws           = ctx["ws"]
+        row          = ctx["row"]
+        cat_counter  = ctx["cat_counter"]
+        cat_subtotal = ctx["cat_subtotals"]
+
+        ws.write(row, 0, str(cat_counter), self.fmt_section)
+        ws.write(row, 1, cat_name.upper(), self.fmt_section)
+        row += 1
+        cat_counter += 1
+        ctx["order"].append(cat_name)
+
+        if CATEGORY_DESCRIPTIONS.get(cat_name):
+            ws.write(row, 1, CATEGORY_DESCRIPTIONS[cat_name], self.fmt_description)
+            row += 1
+
+        first_item_row = row
+        item_idx = 0
+        for name, data in grouped.items():
+            ws.write(row, 0, _item_label(item_idx), self.fmt_normal)
+            ws.write(row, 1, name, self.fmt_normal)
+            ws.write(row, 2, data["unit"], self.fmt_normal)
+            ws.write(row, 3, round(float(data["qty"]), 2), self.fmt_normal)
+            ws.write(row, 4, round(float(data["rate"]), 2), self.fmt_money)
+
+            ws.write_formula(
+                row, 5,
+                "={}*{}".format(
+                    xl_rowcol_to_cell(row, 3),
+                    xl_rowcol_to_cell(row, 4)
+                ),
+                self.fmt_money
+            )
+            row += 1
+            item_idx += 1
+
+            if comments and data.get("comment"):
+                ws.write(row, 1, data["comment"], self.fmt_italic)
+                row += 1
+
+        last_item_row = row - 1
+        ws.write(row, 1, cat_name.upper() + " TO COLLECTION", self.fmt_section)
+        ws.write_formula(
+            row, 5,
+            "=SUM(F{}:F{})".format(first_item_row + 1, last_item_row + 1),
+            self.fmt_money
+        )
+        cat_subtotal[cat_name.upper()] = xl_rowcol_to_cell(row, 5)
+        row += 2
+
+        ctx["row"]         = row
+        ctx["cat_counter"] = cat_counter
+
+    # --------------------------------------------------------------------------
+    # Collections & GENERAL SUMMARY
+    # --------------------------------------------------------------------------
+    def finalize_bill_sheet(self, ws, row, sheet_cat_order, cat_subtotals):
+        ws.write(row, 1, "COLLECTION", self.fmt_section)
+        row += 1
+        count = 1
+        for cname in sheet_cat_order:
+            up = cname.upper()
+            cell = cat_subtotals.get(up)
+            if cell:
+                ws.write(row, 0, str(count), self.fmt_normal)
+                ws.write(row, 1, up, self.fmt_normal)
+                ws.write_formula(row, 5, "={}".format(cell), self.fmt_money)
+                row += 1
+                count += 1
+
+        ws.write_blank(row, 0, None, self.fmt_section)
+        ws.write(row, 1, "GRAND TOTAL", self.fmt_section)
+        if cat_subtotals:
+            sum_cells = ",".join(
+                cat_subtotals[k.upper()]
+                for k in sheet_cat_order
+                if k.upper() in cat_subtotals
+            )
+            ws.write_formula(row, 5, "=SUM({})".format(sum_cells), self.fmt_money)
+        else:
+            ws.write(row, 5, 0, self.fmt_money)
+
+        return xl_rowcol_to_cell(row, 5), row
+
+    def write_summary(self):
+        bill_grand_refs = []
+        for bill_name in ORDERED_BILLS:
+            ctx = self.sheets[bill_name]
+            grand_addr, _ = self.finalize_bill_sheet(ctx["ws"], ctx["row"], ctx["order"], ctx["cat_subtotals"])
+            bill_grand_refs.append(_sheet_ref(self.names[bill_name], grand_addr))
+
+        summary_ws = self.wb.add_worksheet(self.names[SUMMARY_NAME])
+        self._set_portrait(summary_ws)
+        summary_ws.set_tab_color(TAB_COLORS["SUMMARY"])
+
+        summary_ws.set_column(0, 0, 6)
+        summary_ws.set_column(1, 1, 60)
+        summary_ws.set_column(2, 2, 4)
+        summary_ws.set_column(3, 3, 18)
+
+        summary_ws.merge_range(0, 0, 0, 3, "GENERAL SUMMARY", self.fmt_center)
+
+        summary_ws.write(1, 0, "ITEM", self.fmt_header)
+        summary_ws.write(1, 1, "DESCRIPTION", self.fmt_header)
+        summary_ws.write(1, 2, "", self.fmt_header)
+        summary_ws.write(1, 3, "AMOUNT (ZMW)", self.fmt_header)
+
+        row = 2
+        summary_ws.merge_range(row, 1, row, 3, self.title.upper(), self.fmt_bold)
+        row += 2
+
+        for idx, (bill_name, ref) in enumerate(zip(ORDERED_BILLS, bill_grand_refs), start=1):
+            sheet_name = self.names[bill_name]
+            if " - " in sheet_name:
+                label_tail = sheet_name.split(" - ", 1)[-1].upper()
+            else:
+                label_tail = sheet_name.upper()
+
+            summary_ws.write(row, 1, "BILL No. {}: {}".format(idx, label_tail), self.fmt_text)
+            summary_ws.write(row, 2, CURRENCY_SYM, self.fmt_text)
+            summary_ws.write_formula(row, 3, "=" + ref, self.fmt_money_right)
+            row += 1
+
+        sub1_row = row
+        summary_ws.write_blank(row, 0, None, self.fmt_text)
+        summary_ws.write(row, 1, "Sub total 1", self.fmt_bold)
+        summary_ws.write(row, 2, CURRENCY_SYM, self.fmt_bold)
+        if bill_grand_refs:
+            summary_ws.write_formula(row, 3, "=SUM({})".format(",".join(bill_grand_refs)), self.fmt_money_right)
+        else:
+            summary_ws.write(row, 3, 0, self.fmt_money_right)
+        row += 2
+
+        disc_text = (
+            "Should the Contractor desire to make any discount on the above total, "
+            "it is to be made here and the amount will be treated as a percentage of "
+            "the total as above. The rates inserted by the contractor against the "
+            "items throughout this tender will be adjusted accordingly by this "
+            "percentage during project execution"
+        )
+
+        disc_top = row
+        disc_bottom = row + 5
+        summary_ws.merge_range(disc_top, 1, disc_bottom, 1, disc_text, self.fmt_wrap)
+        summary_ws.write(disc_top, 2, "%", self.fmt_center)
+        summary_ws.write(disc_top + 1, 2, 0, self.fmt_percent)
+        discount_cell = xl_rowcol_to_cell(disc_top + 1, 2)
+
+        row = disc_bottom + 1
+
+        sub2_row = row
+        summary_ws.write_blank(row, 0, None, self.fmt_text)
+        summary_ws.write(row, 1, "Sub total 2", self.fmt_bold)
+        summary_ws.write(row, 2, CURRENCY_SYM, self.fmt_bold)
+        summary_ws.write_formula(
+            row, 3,
+            "={}*(1-{})".format(xl_rowcol_to_cell(sub1_row, 3), discount_cell),
+            self.fmt_money_right
+        )
+        row += 1
+
+        summary_ws.write(row, 1, "Allow for contingencies @ {}%".format(int(CONTINGENCY_RATE * 100)), self.fmt_text)
+        summary_ws.write_blank(row, 2, None, self.fmt_text)
+        summary_ws.write_formula(
+            row, 3,
+            "={}*{}".format(xl_rowcol_to_cell(sub2_row, 3), CONTINGENCY_RATE),
+            self.fmt_money_right
+        )
+        contingency_row = row
+        row += 1
+
+        sub3_row = row
+        summary_ws.write_blank(row, 0, None, self.fmt_text)
+        summary_ws.write(row, 1, "Sub total 3", self.fmt_bold)
+        summary_ws.write(row, 2, CURRENCY_SYM, self.fmt_bold)
+        summary_ws.write_formula(
+            row, 3,
+            "={}+{}".format(xl_rowcol_to_cell(sub2_row, 3), xl_rowcol_to_cell(contingency_row, 3)),
+            self.fmt_money_right
+        )
+        row += 1
+
+        summary_ws.write(row, 1, "Add VAT OR TOT, whichever is applicable", self.fmt_text)
+        summary_ws.write(row, 2, "", self.fmt_text)
+        summary_ws.write(row, 3, "Inclusive", self.fmt_text)
+        row += 1
+
+        summary_ws.write(row, 1, "GRAND TOTAL CARRIED TO FORM OF TENDER", self.fmt_bold)
+        summary_ws.write(row, 2, CURRENCY_SYM, self.fmt_bold)
+        summary_ws.write_formula(row, 3, "={}".format(xl_rowcol_to_cell(sub3_row, 3)), self.fmt_money_right)
+        row += 1
+
+        sig_top_row_1based = FIRST_PAGE_LAST_ROW - SIG_BLOCK_HEIGHT + 1
+        sig_top_row_0based = sig_top_row_1based - 1
+
+        while row < sig_top_row_0based:
+            for col in range(4):
+                summary_ws.write_blank(row, col, None, self.fmt_noborder)
+            row += 1
+
+        for line in (
+            "Signature of Contractor .................................................................",
+            "Name of Firm: ..............................................................................",
+            "Address: ...................................................................................",
+            "Date: ......................................................................................",
+        ):
+            summary_ws.write(row, 1, line, self.fmt_text)
+            row += 1
+
+        summary_ws.set_h_pagebreaks([FIRST_PAGE_LAST_ROW])
+
+    def close(self):
+        self.wb.close()
+
+
+def build_workbook(source, path, timings=None):
+    """Write the BOQ workbook of ``source`` (a ``QuantitySource``) to ``path``.
+
+    Returns ``(skipped, timings)``: rows that could not be grouped and
+    the milliseconds spent per phase (added to ``timings`` when given).
+    """
+    timings = timings if timings is not None else PhaseTimings()
+
+    # Every section read from model rows, in one pass over them
+    t0 = time.time()
+    plan = section_groupings()
+    skipped = fold(source, plan.values())
+    timings.add("group", t0)
+
+    t0 = time.time()
+    painting = source.painting()
+    timings.add("painting", t0)
+    t0 = time.time()
+    cut_and_fill = _cut_and_fill_items(source.earthworks())
+    timings.add("cut and fill", t0)
+
+    t0 = time.time()
+    book = BoqWorkbook(path, source.title, source.address)
+
+    # 0. Internal/external groups for Floors, Walls, Stairs
+    for name in FUNCTION_SPLITS:
+        book.write_section("Internal " + name, plan[name].items("internal"))
+        book.write_section("External " + name, plan[name].items("external"))
+
+    # 1. CATEGORY_ORDER (remaining categories)
+    for cat_name in CATEGORY_ORDER:
+        if cat_name in SPLIT_SECTIONS:
+            continue
+        cats = CATEGORY_MAP.get(cat_name)
+        if cats is VIRTUAL_PAINT:
+            book.write_section(cat_name, painting, comments=False)
+        elif cats is VIRTUAL_EARTH:
+            book.write_section(cat_name, cut_and_fill, comments=False)
+        elif cat_name in plan:
+            book.write_section(cat_name, plan[cat_name].items())
+
+    # 2. EXTERNAL_WORKS_ORDER with model data for Parking / Planting / Site Works
+    for ext_cat in EXTERNAL_WORKS_ORDER:
+        if ext_cat in SPLIT_SECTIONS or CATEGORY_MAP.get(ext_cat) is not VIRTUAL_EXTERNAL:
+            continue
+
+        grouped = plan[ext_cat].items() if ext_cat in plan else {}
+
+        # fallback placeholder = unit "Item"
+        if not grouped:
+            grouped = {
+                PLACEHOLDER_LABELS.get(ext_cat, ext_cat + " works - see site drawings / spec"): {
+                    "qty": 1.0,
+                    "rate": 0.0,
+                    "unit": "Item",  # <-- keep placeholder as Item
+                    "comment": ""
+                }
+            }
+        book.write_section(ext_cat, grouped)
+    timings.add("sections", t0)
+
+    # 3. Collections, GENERAL SUMMARY
+    t0 = time.time()
+    book.write_summary()
+    book.close()
+    timings.add("write workbook", t0)
+    return skipped, timings
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    t0 = time.time()
+    snapshot = read_snapshot(sys.argv[1])
+    timings = PhaseTimings()
+    timings.add("read snapshot", t0)
+    if len(sys.argv) > 3:
+        t0 = time.time()
+        n = reprice(snapshot, load_prices(sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else None))
+        timings.add("prices", t0)
+        print("Re-priced {} rate(s) from {}".format(n, sys.argv[3]))
+    skipped, timings = build_workbook(SnapshotSource(snapshot), sys.argv[2], timings)
+    print("Wrote {} from {} element(s), {} skipped: {}".format(
+        sys.argv[2], len(snapshot), skipped + snapshot.skipped, timings.summary()))
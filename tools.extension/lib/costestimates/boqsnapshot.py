@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""Headless BOQ snapshot: what Generate BOQ reads from the model, on disk.
+
+Generate BOQ writes one next to the workbook; ``boqengine`` turns it (plus
+an optional price book) into the same workbook without Revit, e.g. on a
+build agent.
+
+The file is gzip-compressed UTF-8 JSON, one value per line:
+
+- line 1, the header object::
+
+    {"format": "costestimates-boq-snapshot", "version": 1,
+     "created": "2024-05-01T10:00:00", "columns": [...],
+     "project": {"title": "...", "address": "..."}, "skipped": 0}
+
+- one array per element, in ``columns`` order: element id, category
+  (``BuiltInCategory`` name, e.g. ``"OST_Walls"``), type id, level id,
+  type name, function, rate, type comments, area (m²), volume (m³),
+  length (m) and structural material (lower case). A measure the element
+  does not have is ``null``.
+- section objects, one key each, in any order after the header:
+  ``{"painting": [[item, qty, rate, unit, comment], ...]}`` holds the
+  painted areas already grouped by material, and ``{"earthworks": {"cut":
+  m³, "fill": m³, "pad_excavation": m³, "summary": "..."}}`` the cut and
+  fill volumes.
+
+Readers skip section keys they do not know, so sections can be added
+without a version bump; changing ``columns`` needs one.
+"""
+import os
+import time
+import gzip
+import json
+import datetime
+from array import array
+from collections import OrderedDict
+
+SNAPSHOT_FORMAT = "costestimates-boq-snapshot"
+SNAPSHOT_VERSION = 1
+COLUMNS = ("id", "category", "type_id", "level", "name", "function", "rate",
+           "comment", "area", "volume", "length", "material")
+NAN = float("nan")
+# gzip level and rows per write: speed over the last few percent of size
+COMPRESS_LEVEL = 6
+WRITE_BATCH = 5000
+
+
+def is_missing(value):
+    return value != value
+
+
+class PhaseTimings(object):
+    """Wall-clock milliseconds per named phase; repeated names accumulate."""
+
+    def __init__(self):
+        self.phases = OrderedDict()
+
+    def add(self, name, t0):
+        self.phases[name] = self.phases.get(name, 0.0) + (time.time() - t0) * 1000.0
+
+    def total_ms(self):
+        return sum(self.phases.values())
+
+    def summary(self):
+        return ", ".join("{} {:.0f} ms".format(n, ms) for n, ms in self.phases.items())
+
+
+class BoqSnapshot(object):
+    """Snapshot rows as parallel columns, plus the pre-grouped sections.
+
+    Categories are ``BuiltInCategory`` names, so nothing here needs Revit.
+    """
+
+    def __init__(self, title="PROJECT", address="PROJECT ADDRESS"):
+        self.title = title
+        self.address = address
+        self.created = None
+        self.ids = []
+        self.cats = []
+        self.type_ids = []
+        self.levels = []
+        self.names = []
+        self.functions = []
+        self.rates = array("d")
+        self.comments = []
+        self.areas = array("d")
+        self.volumes = array("d")
+        self.lengths = array("d")
+        self.materials = []
+        self.by_cat = {}
+        self.painting = OrderedDict()
+        self.earthworks = None
+        self.skipped = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _columns(self):
+        return (self.ids, self.cats, self.type_ids, self.levels, self.names, self.functions,
+                self.rates, self.comments, self.areas, self.volumes, self.lengths, self.materials)
+
+    def add(self, values):
+        """Append one row given in ``COLUMNS`` order (None for a missing measure)."""
+        values = list(values)
+        if values[6] is None:
+            values[6] = 0.0
+        for k in (8, 9, 10):
+            if values[k] is None:
+                values[k] = NAN
+        self.by_cat.setdefault(values[1], []).append(len(self.ids))
+        for column, value in zip(self._columns(), values):
+            column.append(value)
+
+    def row(self, i):
+        return [column[i] for column in self._columns()]
+
+    def rows(self, *cat_names):
+        """Yield row indices of the given categories, in category order."""
+        for name in cat_names:
+            for i in self.by_cat.get(name, ()):
+                yield i
+
+
+def _plain(column):
+    """``column`` as a list with NaN as None (JSON ``null``)."""
+    return [None if v != v else v for v in column]
+
+
+def write_snapshot(snapshot, path):
+    """Write ``snapshot`` to ``path`` (gzip JSON lines, see module docstring)."""
+    header = OrderedDict([
+        ("format", SNAPSHOT_FORMAT),
+        ("version", SNAPSHOT_VERSION),
+        ("created", snapshot.created or datetime.datetime.now().replace(microsecond=0).isoformat()),
+        ("columns", list(COLUMNS)),
+        ("project", OrderedDict([("title", snapshot.title), ("address", snapshot.address)])),
+        ("skipped", snapshot.skipped),
+    ])
+    dumps = json.JSONEncoder(separators=(",", ":")).encode
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wb", COMPRESS_LEVEL) as fh:
+        def put(lines):
+            fh.write(("\n".join(lines) + "\n").encode("ascii"))
+        put([dumps(header)])
+        columns = list(snapshot._columns())
+        for k in (8, 9, 10):
+            columns[k] = _plain(columns[k])
+        batch = []
+        for row in zip(*columns):
+            batch.append(dumps(row))
+            if len(batch) == WRITE_BATCH:
+                put(batch)
+                batch = []
+        if batch:
+            put(batch)
+        if snapshot.painting:
+            put([dumps({"painting": [[name, d["qty"], d["rate"], d["unit"], d.get("comment", "")]
+                                     for name, d in snapshot.painting.items()]})])
+        if snapshot.earthworks is not None:
+            put([dumps({"earthworks": snapshot.earthworks})])
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp, path)
+
+
+def read_snapshot(path):
+    """Return the ``BoqSnapshot`` saved at ``path``.
+
+    Raises ValueError when the file is not a snapshot or has another version.
+    """
+    with gzip.open(path, "rb") as fh:
+        lines = iter(fh)
+        header = json.loads(next(lines).decode("utf-8"))
+        if header.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError("{} is not a BOQ snapshot".format(path))
+        if header.get("version") != SNAPSHOT_VERSION or tuple(header.get("columns", ())) != COLUMNS:
+            raise ValueError("{}: unsupported snapshot version {}".format(path, header.get("version")))
+        project = header.get("project") or {}
+        snapshot = BoqSnapshot(project.get("title") or "PROJECT",
+                               project.get("address") or "PROJECT ADDRESS")
+        snapshot.created = header.get("created")
+        snapshot.skipped = header.get("skipped", 0)
+        for line in lines:
+            value = json.loads(line.decode("utf-8"))
+            if isinstance(value, list):
+                snapshot.add(value)
+            elif "painting" in value:
+                for name, qty, rate, unit, comment in value["painting"]:
+                    snapshot.painting[name] = {"qty": qty, "rate": rate, "unit": unit, "comment": comment}
+            elif "earthworks" in value:
+                snapshot.earthworks = value["earthworks"]
+    return snapshot
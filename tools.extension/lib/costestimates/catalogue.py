@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""Optional SQLite price catalogue with supplier, region and dated prices.
+
+The flat CSVs hold one ``UnitCost`` per item. A catalogue keeps every
+supplier, region and price revision, and answers "what did X cost from
+supplier S in region R on date D" from an index instead of a file scan.
+
+Drop a ``catalogue.sqlite`` into a ``material_costs/`` folder and
+``pricebook.load_price_book`` reads from it instead of the CSVs. Build or
+refresh one from the existing CSVs with::
+
+    python -m costestimates.catalogue <material_costs folder> [supplier] [region] [YYYY-MM-DD]
+
+``sqlite3`` is not shipped with IronPython; there ``available()`` returns
+False and the CSV price book is used as before.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import datetime
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+from costestimates.pricebook import (
+    PriceBook, norm, find_column, parse_rate, iter_rows, list_price_files)
+
+CATALOGUE_FILE = "catalogue.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS price (
+    id        INTEGER PRIMARY KEY,
+    key       TEXT NOT NULL,
+    name      TEXT NOT NULL,
+    unit      TEXT NOT NULL DEFAULT '',
+    rate      REAL,
+    supplier  TEXT NOT NULL DEFAULT '',
+    region    TEXT NOT NULL DEFAULT '',
+    effective TEXT NOT NULL DEFAULT '',
+    src       TEXT NOT NULL DEFAULT '',
+    UNIQUE (key, supplier, region, effective)
+);
+CREATE INDEX IF NOT EXISTS ix_price_lookup ON price (key, effective);
+CREATE INDEX IF NOT EXISTS ix_price_supplier ON price (supplier, key);
+CREATE INDEX IF NOT EXISTS ix_price_region ON price (region, key);
+CREATE INDEX IF NOT EXISTS ix_price_effective ON price (effective);
+"""
+
+
+def available():
+    return sqlite3 is not None
+
+
+def catalogue_path(folderpath):
+    return os.path.join(folderpath, CATALOGUE_FILE)
+
+
+def _ms(t0):
+    return (time.time() - t0) * 1000.0
+
+
+def _today():
+    return datetime.date.today().isoformat()
+
+
+class Catalogue(object):
+    """A local SQLite price catalogue file."""
+
+    def __init__(self, path):
+        if sqlite3 is None:
+            raise RuntimeError("sqlite3 is not available in this Python")
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def import_csv(self, fpath, supplier="", region="", effective=""):
+        """Upsert one price CSV; returns the number of rows written.
+
+        Optional ``Supplier``, ``Region`` and ``Effective``/``Date`` columns
+        override the defaults given here row by row.
+        """
+        src = os.path.basename(fpath)
+        rows = iter_rows(fpath)
+        header = next(rows, None)
+        if not header:
+            return 0
+        name_i = find_column(header, "item", "product description", "material", "description", "name")
+        rate_i = find_column(header, "rate", "unit cost", "price", "cost")
+        unit_i = find_column(header, "uom", "unit")
+        if unit_i == rate_i:
+            unit_i = None
+        sup_i = find_column(header, "supplier", "vendor")
+        reg_i = find_column(header, "region")
+        eff_i = find_column(header, "effective", "date")
+        if name_i is None or rate_i is None:
+            return 0
+
+        def cell(r, i, default=""):
+            return r[i].strip() if i is not None and i < len(r) and r[i].strip() else default
+
+        def records():
+            for r in rows:
+                nm = cell(r, name_i)
+                if not nm:
+                    continue
+                rate = parse_rate(r[rate_i]) if rate_i < len(r) else None
+                yield (norm(nm), nm, cell(r, unit_i), rate, cell(r, sup_i, supplier),
+                       cell(r, reg_i, region), cell(r, eff_i, effective), src)
+
+        with self.conn:
+            cur = self.conn.executemany(
+                "INSERT OR REPLACE INTO price (key, name, unit, rate, supplier, region, effective, src) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", records())
+        return cur.rowcount
+
+    def import_folder(self, folderpath, supplier="", region="", effective=""):
+        """Import every CSV of a ``material_costs`` folder in merge order."""
+        return sum(self.import_csv(os.path.join(folderpath, f), supplier, region, effective)
+                   for f in list_price_files(folderpath))
+
+    def _select(self, where, args, supplier, region, as_of):
+        sql = ["SELECT key, name, unit, rate, src FROM price WHERE effective <= ?"]
+        params = [as_of or _today()]
+        if where:
+            sql.append("AND " + where)
+            params.extend(args)
+        if supplier is not None:
+            sql.append("AND supplier = ?")
+            params.append(supplier)
+        if region is not None:
+            sql.append("AND region = ?")
+            params.append(region)
+        sql.append("ORDER BY key, effective, id")
+        return self.conn.execute(" ".join(sql), params)
+
+    def lookup(self, material_name, supplier=None, region=None, as_of=None):
+        """Return the price record in force on ``as_of`` (default today)."""
+        rec = None
+        for key, nm, u, rate, src in self._select("key = ?", [norm(material_name)], supplier, region, as_of):
+            rec = {"name": nm, "unit": u, "rate": rate or 0.0, "src": src}
+        return rec
+
+    def price_book(self, supplier=None, region=None, as_of=None):
+        """Return a ``PriceBook`` of the prices in force on ``as_of``.
+
+        It behaves like a CSV-loaded book, so ``cost_map``,
+        ``prices_by_name`` and ``file_report`` work unchanged.
+        """
+        book = PriceBook(os.path.dirname(self.path))
+        t0 = time.time()
+        latest = {}
+        for key, nm, u, rate, src in self._select("", [], supplier, region, as_of):
+            latest[key] = (key, nm, u, rate, src)
+        for key, nm, u, rate, src in latest.values():
+            if src not in book._entries:
+                book._entries[src] = []
+                book.files.append(src)
+            book._entries[src].append((key, nm, u, rate))
+        book.files.sort(key=lambda f: f.lower())
+        book.stats.load_ms = _ms(t0)
+        book.stats.rows = len(latest)
+        book.stats.backend = "catalogue"
+        return book
+
+
+def import_folder(folderpath, supplier="", region="", effective=""):
+    """Create or refresh ``folderpath/catalogue.sqlite`` from its CSVs."""
+    cat = Catalogue(catalogue_path(folderpath))
+    try:
+        return cat.import_folder(folderpath, supplier, region, effective)
+    finally:
+        cat.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    args = sys.argv[1:] + [""] * 3
+    n = import_folder(args[0], args[1], args[2], args[3])
+    print("Imported {} price rows into {}".format(n, catalogue_path(args[0])))
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""Cut and fill volumes for the BOQ "Cut and Fill" section.
+
+Sources are tried in order until one yields a volume:
+
+1. topography schedules (cell text);
+2. graded regions;
+3. topography elements;
+4. whitelisted site categories whose ``SITE_CUT_VOLUME`` or
+   ``SITE_FILL_VOLUME`` is > 0, filtered inside Revit;
+5. whitelisted site categories with user "Cut"/"Fill" parameters, read
+   under an element and time budget;
+6. building pad volumes, as an excavation estimate.
+
+Whether a parameter is a cut or fill parameter is decided once per
+parameter definition, not once per element. The old last resort scanned
+every element of the document; nothing here does.
+"""
+import re
+import time
+
+from pyrevit import DB
+
+from costestimates.units import FT3_TO_M3
+from costestimates.boqsnapshot import PhaseTimings
+
+BIC = DB.BuiltInCategory
+BIP = DB.BuiltInParameter
+
+CATEGORY_WHITELIST = [getattr(BIC, n) for n in (
+    "OST_Topography", "OST_Toposolid", "OST_BuildingPad", "OST_Site", "OST_Mass", "OST_GenericModel",
+) if hasattr(BIC, n)]
+DEFAULT_MAX_ELEMENTS = 20000
+DEFAULT_MAX_SECONDS = 15.0
+
+_num_pat = re.compile(r"[-+]?\d+(?:[.,]\d+)?")
+
+
+def parse_value_string_to_m3(s):
+    if not s:
+        return 0.0
+    s = s.strip()
+    m = _num_pat.search(s)
+    if not m:
+        return 0.0
+    val = float(m.group(0).replace(",", "."))
+    s_low = s.lower()
+    if "ft" in s_low or "ft³" in s_low or "ft^3" in s_low or "cf" in s_low:
+        return val * FT3_TO_M3
+    return val
+
+
+def param_to_m3(p):
+    if not p or not p.HasValue:
+        return 0.0
+    try:
+        if p.StorageType == DB.StorageType.Double:
+            return p.AsDouble() * FT3_TO_M3
+    except:
+        pass
+    try:
+        return parse_value_string_to_m3(p.AsValueString())
+    except:
+        return 0.0
+
+
+def read_cut_fill_from_schedule_cells(doc):
+    cut_total = 0.0
+    fill_total = 0.0
+    try:
+        topo_cat_id = DB.Category.GetCategory(doc, BIC.OST_Topography).Id
+    except:
+        topo_cat_id = None
+
+    for vs in DB.FilteredElementCollector(doc).OfClass(DB.ViewSchedule).ToElements():
+        try:
+            if (
+                topo_cat_id
+                and vs.Definition
+                and vs.Definition.CategoryId
+                and vs.Definition.CategoryId.IntegerValue
+                != topo_cat_id.IntegerValue
+            ):
+                continue
+
+            table = vs.GetTableData()
+            header = table.GetSectionData(DB.SectionType.Header)
+            body   = table.GetSectionData(DB.SectionType.Body)
+            if body is None:
+                continue
+
+            col_count = body.NumberOfColumns
+            header_names = []
+
+            if header and header.NumberOfRows > 0:
+                hdr_row = header.NumberOfRows - 1
+                for c in range(col_count):
+                    header_names.append((header.GetCellText(hdr_row, c) or "").strip().lower())
+            else:
+                if body.NumberOfRows == 0:
+                    continue
+                header_names = [""] * col_count
+
+            cut_cols = [i for i, h in enumerate(header_names) if ("cut" in h and "net" not in h)]
+            fill_cols = [i for i, h in enumerate(header_names) if ("fill" in h and "net" not in h)]
+
+            if not cut_cols and not fill_cols and vs.Definition:
+                try:
+                    field_names = [
+                        vs.Definition.GetField(i).GetName().lower()
+                        for i in range(vs.Definition.GetFieldCount())
+                    ]
+                    for i, cap in enumerate(field_names):
+                        if "cut" in cap and "net" not in cap:
+                            cut_cols.append(i)
+                        if "fill" in cap and "net" not in cap:
+                            fill_cols.append(i)
+                except:
+                    pass
+
+            if not cut_cols and not fill_cols:
+                continue
+
+            for r in range(body.NumberOfRows):
+                if any("total" in (body.GetCellText(r, c) or "").strip().lower() for c in range(col_count)):
+                    continue
+                for c in cut_cols:
+                    cut_total += parse_value_string_to_m3(body.GetCellText(r, c))
+                for c in fill_cols:
+                    fill_total += parse_value_string_to_m3(body.GetCellText(r, c))
+
+        except:
+            continue
+
+    return cut_total, fill_total
+
+
+def _positive(bip):
+    rule = DB.ParameterFilterRuleFactory.CreateGreaterRule(DB.ElementId(bip), 0.0, 1e-9)
+    return DB.ElementParameterFilter(rule)
+
+
+class EarthworksResult(object):
+    """Volumes in m³ plus where they came from and what it cost to find them."""
+
+    def __init__(self):
+        self.cut = 0.0
+        self.fill = 0.0
+        self.pad_excavation = 0.0
+        self.source = "none"
+        self.scanned = 0
+        self.definitions = 0
+        self.truncated = False
+        self.timings = PhaseTimings()
+
+    def found(self):
+        return self.cut >= 1e-9 or self.fill >= 1e-9
+
+    def summary(self):
+        text = "cut/fill from {}: {} element(s) read, {} parameter definition(s) classified ({})".format(
+            self.source, self.scanned, self.definitions, self.timings.summary())
+        if self.truncated:
+            text += " - budget reached, volumes may be incomplete"
+        return text
+
+
+class EarthworksExtractor(object):
+    """Finds cut and fill volumes without scanning the whole model."""
+
+    def __init__(self, doc, categories=None, max_elements=DEFAULT_MAX_ELEMENTS,
+                 max_seconds=DEFAULT_MAX_SECONDS):
+        self.doc = doc
+        self.categories = categories or CATEGORY_WHITELIST
+        self.max_elements = max_elements
+        self.max_seconds = max_seconds
+        self._kinds = {}
+
+    def _kind(self, p):
+        """Return ``(is cut, is fill)`` for ``p``, decided once per definition."""
+        key = p.Id.IntegerValue
+        kind = self._kinds.get(key)
+        if kind is None:
+            try:
+                nml = (p.Definition.Name if p.Definition else "").lower()
+            except:
+                nml = ""
+            relevant = "offset" not in nml
+            kind = (relevant and "cut" in nml,
+                    relevant and "fill" in nml and "net" not in nml)
+            self._kinds[key] = kind
+        return kind
+
+    def element_volumes(self, elem):
+        """Return ``(cut, fill)`` in m³ for one element; each parameter counts once."""
+        cut = fill = 0.0
+        try:
+            cut = param_to_m3(elem.get_Parameter(BIP.SITE_CUT_VOLUME))
+            fill = param_to_m3(elem.get_Parameter(BIP.SITE_FILL_VOLUME))
+        except:
+            pass
+        if cut <= 1e-9 and fill <= 1e-9:
+            try:
+                for p in elem.Parameters:
+                    is_cut, is_fill = self._kind(p)
+                    if not (is_cut or is_fill):
+                        continue
+                    v = param_to_m3(p)
+                    if is_cut:
+                        cut += v
+                    if is_fill:
+                        fill += v
+            except:
+                pass
+        return max(cut, 0.0), max(fill, 0.0)
+
+    def _add(self, result, elements, budget=False):
+        t0 = time.time()
+        for n, elem in enumerate(elements):
+            if budget and (n >= self.max_elements or time.time() - t0 > self.max_seconds):
+                result.truncated = True
+                break
+            result.scanned += 1
+            c, f = self.element_volumes(elem)
+            result.cut += c
+            result.fill += f
+
+    def _site_collector(self):
+        from pyrevit.framework import List
+        cats = DB.ElementMulticategoryFilter(List[DB.BuiltInCategory](self.categories))
+        return DB.FilteredElementCollector(self.doc).WherePasses(cats).WhereElementIsNotElementType()
+
+    def _graded_regions(self):
+        try:
+            import Autodesk
+            Arch = Autodesk.Revit.DB.Architecture
+            if hasattr(Arch, "GradedRegion"):
+                return list(DB.FilteredElementCollector(self.doc).OfClass(Arch.GradedRegion).ToElements())
+        except Exception:
+            pass
+        return []
+
+    def extract(self):
+        result = EarthworksResult()
+        doc = self.doc
+
+        stages = [
+            ("schedules", None),
+            ("graded regions", self._graded_regions),
+            ("topography", lambda: DB.FilteredElementCollector(doc)
+                .OfCategory(BIC.OST_Topography).WhereElementIsNotElementType().ToElements()),
+            ("site cut/fill parameters", lambda: self._site_collector().WherePasses(
+                DB.LogicalOrFilter(_positive(BIP.SITE_CUT_VOLUME), _positive(BIP.SITE_FILL_VOLUME)))),
+            ("named cut/fill parameters", self._site_collector),
+        ]
+        for name, collect in stages:
+            t0 = time.time()
+            try:
+                if collect is None:
+                    result.cut, result.fill = read_cut_fill_from_schedule_cells(doc)
+                else:
+                    self._add(result, collect(), budget=name.startswith("named"))
+            except Exception:
+                pass
+            result.timings.add(name, t0)
+            if result.found():
+                result.source = name
+                break
+
+        if not result.found():
+            t0 = time.time()
+            for p in DB.FilteredElementCollector(doc).OfCategory(BIC.OST_BuildingPad) \
+                    .WhereElementIsNotElementType().ToElements():
+                try:
+                    v = p.get_Parameter(BIP.HOST_VOLUME_COMPUTED) or p.LookupParameter("Volume")
+                    if v and v.HasValue:
+                        result.pad_excavation += v.AsDouble() * FT3_TO_M3
+                except:
+                    pass
+            result.timings.add("building pads", t0)
+            if result.pad_excavation > 1e-9:
+                result.source = "building pads"
+
+        result.definitions = len(self._kinds)
+        return result
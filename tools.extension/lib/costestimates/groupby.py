@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""Group-by aggregation over a ``sources.QuantitySource``, in one pass.
+
+A ``Grouping`` names the categories it takes rows from, the keys it
+groups them by (``TYPE_NAME``, ``FUNCTION_BUCKET``, ``LEVEL`` or any
+``key(source, i, info)``) and how each row is measured (``count()``,
+``area()``, ``volume()``, ``length()`` or any ``measure(source, i,
+measures)`` returning ``(qty, unit)``, or a table of them per category
+such as ``measurement.MeasurementRules.row_measures``). ``fold`` walks
+every category once, reads each row's type attributes and measures
+once, and adds it to every grouping that takes its category.
+
+Per group, the first row fixes the unit; the rate is the first non-zero
+one and the comment the first meaningful type comment, as the BOQ has
+always done. Groups keep the order their first row was seen in, with
+each grouping's categories visited in the order it lists them.
+"""
+from array import array
+from collections import OrderedDict
+
+
+# ------------------------------------------------------------------------------
+# Keys
+# ------------------------------------------------------------------------------
+def TYPE_NAME(source, i, info):
+    return info[0]
+
+
+def is_external_function(fv_lower):
+    return "exterior" in fv_lower or "external" in fv_lower or "outside" in fv_lower
+
+
+def FUNCTION_BUCKET(source, i, info):
+    """``"external"`` or ``"internal"``, from the type's Function."""
+    return "external" if is_external_function(info[3]) else "internal"
+
+
+def LEVEL(source, i, info):
+    return source.level(i)
+
+
+# ------------------------------------------------------------------------------
+# Measures
+# ------------------------------------------------------------------------------
+def count(unit="No."):
+    """One ``unit`` per row."""
+    def measure(source, i, m):
+        return 1.0, unit
+    return measure
+
+
+def _measure(index, unit):
+    def factory(otherwise=None, positive=False):
+        """The row's measure when present (and > 0 if ``positive``), else
+        ``otherwise`` (a measure), else zero."""
+        def measure(source, i, m):
+            value = m[index]
+            if value == value and (value > 0 or not positive):
+                return value, unit
+            if otherwise is not None:
+                return otherwise(source, i, m)
+            return 0.0, unit
+        return measure
+    return factory
+
+
+area = _measure(0, "m²")
+volume = _measure(1, "m³")
+length = _measure(2, "m")
+_COUNT = count()
+
+
+# ------------------------------------------------------------------------------
+# Aggregation
+# ------------------------------------------------------------------------------
+def clean_comment(name, raw_comment):
+    comment = raw_comment or ""
+    if comment.strip().lower() == (name or "").strip().lower():
+        comment = ""
+    if len(comment.replace(" ", "")) < 3:
+        comment = ""
+    return comment
+
+
+class Grouping(object):
+    """Rows of ``categories`` grouped by ``keys``, measured by ``measure``.
+
+    ``measure`` may be a ``{category: measure}`` table; categories it
+    lacks are counted. Accumulators are parallel columns indexed by group
+    slot; a key gets its slot the first time a row has it.
+    """
+
+    def __init__(self, categories, measure, keys=(TYPE_NAME,)):
+        self.categories = list(categories)
+        self.measure = measure
+        self.keys = tuple(keys)
+        self._by_name = self.keys == (TYPE_NAME,)
+        self.slots = OrderedDict()
+        self.qty = array("d")
+        self.rates = array("d")
+        self.units = []
+        self.comments = []
+        self.errors = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def measure_for(self, category):
+        if isinstance(self.measure, dict):
+            return self.measure.get(category) or _COUNT
+        return self.measure
+
+    def add(self, source, i, info, qty, unit):
+        if self._by_name:
+            key = (info[0],)
+        else:
+            key = tuple([k(source, i, info) for k in self.keys])
+        rate = info[1]
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots[key] = len(self.qty)
+            self.qty.append(qty)
+            self.rates.append(rate)
+            self.units.append(unit)
+            self.comments.append(clean_comment(info[0], info[2]))
+            return
+        self.qty[slot] += qty
+        if rate and self.rates[slot] == 0.0:
+            self.rates[slot] = rate
+        if info[2] and not self.comments[slot]:
+            self.comments[slot] = clean_comment(info[0], info[2])
+
+    def items(self, *prefix):
+        """``{last key: {qty, rate, unit, comment}}`` of the groups whose keys start with ``prefix``."""
+        n = len(prefix)
+        out = OrderedDict()
+        for key, slot in self.slots.items():
+            if key[:n] == prefix:
+                out[key[-1]] = {
+                    "qty": self.qty[slot],
+                    "rate": self.rates[slot],
+                    "unit": self.units[slot],
+                    "comment": self.comments[slot],
+                }
+        return out
+
+
+def pass_order(groupings):
+    """Categories in an order that keeps every grouping's own order.
+
+    Where groupings disagree, categories follow their first appearance.
+    """
+    first = OrderedDict()
+    after = {}
+    before = {}
+    for g in groupings:
+        for a, b in zip(g.categories, g.categories[1:]):
+            if b not in after.setdefault(a, set()):
+                after[a].add(b)
+                before[b] = before.get(b, 0) + 1
+        for c in g.categories:
+            first.setdefault(c, len(first))
+    order = []
+    ready = [c for c in first if not before.get(c)]
+    while ready:
+        ready.sort(key=first.get)
+        c = ready.pop(0)
+        order.append(c)
+        for b in after.get(c, ()):
+            before[b] -= 1
+            if not before[b]:
+                ready.append(b)
+    seen = set(order)
+    return order + [c for c in first if c not in seen]
+
+
+def fold(source, groupings):
+    """Add every row of ``source`` to the groupings that take its category.
+
+    Returns the number of rows that failed in at least one grouping.
+    """
+    targets = {}
+    for g in groupings:
+        for c in g.categories:
+            targets.setdefault(c, []).append(g)
+    failed = 0
+    for category in pass_order(groupings):
+        into = targets[category]
+        adds = [(g, g.add, g.measure_for(category)) for g in into]
+        type_info = source.type_info
+        read_measures = source.measures
+        for i in source.instances(category):
+            ok = True
+            try:
+                info = type_info(i)
+                measures = read_measures(i)
+            except Exception:
+                failed += 1
+                for g in into:
+                    g.errors += 1
+                continue
+            for g, add, measure in adds:
+                try:
+                    qty, unit = measure(source, i, measures)
+                    add(source, i, info, qty, unit)
+                except Exception:
+                    g.errors += 1
+                    ok = False
+            if not ok:
+                failed += 1
+    return failed
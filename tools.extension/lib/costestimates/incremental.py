@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Fingerprint of the last price book and recipe set applied to a model.
+
+``Multi csv`` saves the prices and recipes it applied to each document,
+with the price it left in the ``Cost`` of each type and material. On the
+next run, ``changes`` compares them with the current ones, and
+``RecipeBook.affected`` turns the changed materials and recipes into the
+set of types that must be priced again. The others are not priced while
+their ``Cost`` still holds the saved price, so an undone or unsaved run
+is caught by that one read.
+"""
+from __future__ import print_function
+import os
+import pickle
+import hashlib
+
+from costestimates.pricebook import default_cache_dir
+
+STATE_VERSION = 3
+
+
+def state_path(doc_key, cache_dir=None):
+    digest = hashlib.md5((doc_key or "untitled").encode("utf-8")).hexdigest()[:12]
+    return os.path.join(cache_dir or default_cache_dir(), "applied_{}.pickle".format(digest))
+
+
+def load_applied(doc_key, cache_dir=None):
+    """Return ``(prices, recipes, {element id: cost})`` last applied to ``doc_key``, or None."""
+    try:
+        with open(state_path(doc_key, cache_dir), "rb") as fh:
+            state = pickle.load(fh)
+        if state.get("version") == STATE_VERSION:
+            return state["prices"], state["recipes"], state["costs"]
+    except Exception:
+        pass
+    return None
+
+
+def save_applied(doc_key, prices, recipes, costs, cache_dir=None):
+    path = state_path(doc_key, cache_dir)
+    try:
+        folder = os.path.dirname(path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        state = {
+            "version": STATE_VERSION,
+            "prices": dict(prices),
+            "recipes": dict((t, dict(c)) for t, c in recipes.items()),
+            "costs": dict(costs),
+        }
+        with open(path, "wb") as fh:
+            pickle.dump(state, fh, 2)
+    except Exception:
+        pass
+
+
+def _changed_keys(old, new):
+    return set(k for k in set(old) | set(new) if old.get(k) != new.get(k))
+
+
+def changes(applied, prices, recipes):
+    """Return ``(changed materials, changed recipe types)`` since ``applied``.
+
+    Returns ``(None, None)`` when nothing was applied before, meaning
+    everything must be written.
+    """
+    if applied is None:
+        return None, None
+    old_prices, old_recipes = applied[:2]
+    new_recipes = dict((t, dict(c)) for t, c in recipes.items())
+    return _changed_keys(old_prices, prices), _changed_keys(old_recipes, new_recipes)
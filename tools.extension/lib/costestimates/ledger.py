@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""The Amount ledger: what Amount wrote, kept next to the model.
+
+Amount appends one row per priced element (element id, category id,
+type id, measure, quantity, rate, amount) and saves the ledger as a
+sidecar in the cache folder, stamped with the model version it was
+built from. Grand Total and Generate BOQ read the ledger instead of
+scanning the model while the stamp still matches.
+
+The stamp is the document's version GUID plus the number of elements in
+the priced categories; a different count makes the ledger stale. Once
+the model has been saved or synced to a new version, the elements
+``GetChangedElements`` reports since the stamped version (Revit 2023+)
+are checked: a deleted ledger element, or a changed one whose
+``Test_1234`` no longer holds its ledger amount, makes the ledger stale.
+Otherwise it is stamped with the new version, so only those elements
+are ever read. Edits not yet saved are not seen, nor is undoing
+Amount's own transaction (its elements then match the stamped version).
+
+``AmountTracker`` is Amount's incremental mode: it compares each element
+with its row in the previous ledger (category, type, measure, quantity,
+rate) and with the value currently written, so only added, changed or
+hand-edited elements are written again. It knows nothing about Revit.
+"""
+import os
+import pickle
+import hashlib
+from array import array
+from collections import OrderedDict
+
+from costestimates.pricebook import default_cache_dir
+
+LEDGER_VERSION = 3
+TOLERANCE = 1e-6
+
+# AmountTracker.check() results
+ADDED = "added"
+MODIFIED = "modified"
+DRIFTED = "drifted"
+MEASURES = ("count", "area", "volume", "length")
+_MEASURE_CODES = dict((m, i) for i, m in enumerate(MEASURES))
+
+
+def _id_typecode():
+    """A 64-bit signed array typecode: element ids are Int64 since Revit 2024."""
+    for code in ("q", "l"):
+        try:
+            if array(code).itemsize == 8:
+                return code
+        except ValueError:
+            pass
+    return "d"  # exact for ids below 2**53
+
+
+ID_TYPECODE = _id_typecode()
+
+# column name -> array typecode
+COLUMNS = OrderedDict([
+    ("ids", ID_TYPECODE),
+    ("cats", "i"),
+    ("type_ids", ID_TYPECODE),
+    ("measures", "b"),
+    ("quantities", "d"),
+    ("rates", "d"),
+    ("amounts", "d"),
+])
+
+
+def array_bytes(arr):
+    return arr.tobytes() if hasattr(arr, "tobytes") else arr.tostring()
+
+
+def array_from_bytes(code, data):
+    arr = array(code)
+    if hasattr(arr, "frombytes"):
+        arr.frombytes(data)
+    else:
+        arr.fromstring(data)
+    return arr
+
+
+def ledger_path(doc, cache_dir=None):
+    key = (doc.PathName or doc.Title or "untitled").encode("utf-8")
+    return os.path.join(cache_dir or default_cache_dir(),
+                        "ledger_{}.pickle".format(hashlib.md5(key).hexdigest()[:12]))
+
+
+def document_version(doc):
+    """The version GUID of ``doc`` as a string, or None (before Revit 2021)."""
+    try:
+        from pyrevit import DB
+        return str(DB.Document.GetDocumentVersion(doc).VersionGUID)
+    except Exception:
+        return None
+
+
+def changes_since(doc, version):
+    """Return ``(modified ids, deleted ids)`` of ``doc`` since ``version`` (Revit 2023+)."""
+    from System import Guid
+    changed = doc.GetChangedElements(Guid(version))
+    return (set(i.IntegerValue for i in changed.GetModifiedElementIds()),
+            set(i.IntegerValue for i in changed.GetDeletedElementIds()))
+
+
+def model_stamp(doc, element_count):
+    """Return the stamp of ``doc`` holding ``element_count`` priced elements, or None."""
+    version = document_version(doc)
+    if version is None:
+        return None
+    return "{}|{}".format(version, element_count)
+
+
+class Ledger(object):
+    """Parallel typed arrays, one row per priced element."""
+
+    def __init__(self, stamp=None):
+        self.stamp = stamp
+        for name, code in COLUMNS.items():
+            setattr(self, name, array(code))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, elem_id, cat, type_id, measure, quantity, rate, amount=None):
+        self.ids.append(elem_id)
+        self.cats.append(cat)
+        self.type_ids.append(type_id)
+        self.measures.append(_MEASURE_CODES[measure])
+        self.quantities.append(quantity)
+        self.rates.append(rate)
+        self.amounts.append(quantity * rate if amount is None else amount)
+
+    def total(self, positive=True):
+        return sum(a for a in self.amounts if a > 0 or not positive)
+
+    def by_category(self, positive=True):
+        """Return ``{category id: (count, amount)}``, by default of amounts > 0 only."""
+        totals = {}
+        for cat, amount in zip(self.cats, self.amounts):
+            if positive and amount <= 0:
+                continue
+            n, s = totals.get(cat, (0, 0.0))
+            totals[cat] = (n + 1, s + amount)
+        return totals
+
+    def measure(self, i):
+        return MEASURES[self.measures[i]]
+
+    def holds(self, modified, deleted, stored_amount):
+        """True when no row is in ``deleted`` and every row in ``modified`` keeps its amount.
+
+        ``stored_amount(element id)`` returns the amount now on the
+        element, or None when it has none.
+        """
+        if not deleted.isdisjoint(self.ids):
+            return False
+        for i, eid in enumerate(self.ids):
+            if eid in modified:
+                amount = stored_amount(eid)
+                if amount is None or _differs(amount, self.amounts[i]):
+                    return False
+        return True
+
+    def save(self, path):
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        image = {
+            "version": LEDGER_VERSION,
+            "id_typecode": ID_TYPECODE,
+            "stamp": self.stamp,
+            "columns": dict((name, array_bytes(getattr(self, name))) for name in COLUMNS),
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump(image, fh, 2)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Return the ledger saved at ``path``, or None if missing or unreadable."""
+        try:
+            with open(path, "rb") as fh:
+                image = pickle.load(fh)
+            if image.get("version") != LEDGER_VERSION or image.get("id_typecode") != ID_TYPECODE:
+                return None
+            ledger = cls(image["stamp"])
+            for name, code in COLUMNS.items():
+                setattr(ledger, name, array_from_bytes(code, image["columns"][name]))
+            return ledger
+        except Exception:
+            return None
+
+
+def load_current(doc, element_count, stored_amount=None, cache_dir=None):
+    """Return the saved ledger of ``doc`` if its stamp still matches, else None.
+
+    ``element_count`` is the number of elements now in the priced
+    categories. When the model has moved to a new version,
+    ``stored_amount(element id)`` reads the amount now on each ledger
+    element it reports as changed (see ``Ledger.holds``); without it,
+    a new version makes the ledger stale.
+    """
+    stamp = model_stamp(doc, element_count)
+    if stamp is None:
+        return None
+    path = ledger_path(doc, cache_dir)
+    ledger = Ledger.load(path)
+    if ledger is None or not ledger.stamp:
+        return None
+    if ledger.stamp == stamp:
+        return ledger
+    version, count = ledger.stamp.rsplit("|", 1)
+    if count != str(element_count) or stored_amount is None:
+        return None
+    try:
+        modified, deleted = changes_since(doc, version)
+    except Exception:
+        return None
+    if not ledger.holds(modified, deleted, stored_amount):
+        return None
+    try:
+        if not doc.IsModified:
+            ledger.stamp = stamp
+            ledger.save(path)
+    except Exception:
+        pass
+    return ledger
+
+
+def _differs(a, b):
+    return abs(a - b) > TOLERANCE * max(1.0, abs(a), abs(b))
+
+
+class ChangeSet(object):
+    """What an incremental Amount run found."""
+
+    def __init__(self):
+        self.counts = OrderedDict((k, 0) for k in (ADDED, MODIFIED, DRIFTED))
+        self.unchanged = 0
+        self.dropped = []
+
+    def writes(self):
+        return sum(self.counts.values())
+
+    def summary(self):
+        return "{} added, {} changed, {} edited by hand, {} unchanged, {} deleted or no longer priced".format(
+            self.counts[ADDED], self.counts[MODIFIED], self.counts[DRIFTED], self.unchanged, len(self.dropped))
+
+
+class AmountTracker(object):
+    """Decides, element by element, whether Amount must write again.
+
+    With no ``previous`` ledger every element is ``ADDED`` (a full run).
+    ``check`` classifies one element; ``record`` adds it to the new
+    ledger once its amount is written (or found unchanged); ``finish``
+    lists the previous rows that were never seen.
+    """
+
+    def __init__(self, previous=None):
+        self.previous = previous
+        self.index = dict((eid, i) for i, eid in enumerate(previous.ids)) if previous is not None else {}
+        self.ledger = Ledger()
+        self.changes = ChangeSet()
+
+    def check(self, elem_id, cat, type_id, measure, quantity, rate, current=None):
+        """Return ``ADDED``, ``MODIFIED``, ``DRIFTED`` or None when unchanged.
+
+        ``current`` is the amount now stored on the element, if any.
+        """
+        i = self.index.pop(elem_id, None)
+        if i is None:
+            return ADDED
+        prev = self.previous
+        if (prev.cats[i] != cat or prev.type_ids[i] != type_id
+                or prev.measures[i] != _MEASURE_CODES[measure]
+                or _differs(prev.quantities[i], quantity) or _differs(prev.rates[i], rate)):
+            return MODIFIED
+        if current is None or _differs(current, quantity * rate):
+            return DRIFTED
+        return None
+
+    def record(self, status, elem_id, cat, type_id, measure, quantity, rate, current=None):
+        """Add the element's row; ``current`` is the amount it kept when unchanged."""
+        if status is None:
+            self.changes.unchanged += 1
+        else:
+            self.changes.counts[status] += 1
+        self.ledger.add(elem_id, cat, type_id, measure, quantity, rate,
+                        current if status is None else None)
+
+    def finish(self):
+        self.changes.dropped = sorted(self.index)
+        self.index = {}
+        return self.changes
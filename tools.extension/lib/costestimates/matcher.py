@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Single-pass matching of item names against many recipe patterns.
+
+``RuleMatcher`` takes the ``FamilyOrTypePattern`` column of one category and
+returns the indices of every rule that matches a name:
+
+- literal patterns (no regex metacharacters) go into one case-insensitive
+  Aho-Corasick automaton, so all of them are found in one scan of the name;
+- a regex with a required literal run (e.g. ``slab`` in ``C25.*slab``) puts
+  that run into the same automaton and is only run when the run occurs;
+- the remaining regexes are OR-ed into one grouped alternation that
+  rejects most names in a single ``search``; only names it accepts are
+  tested per regex;
+- results are cached per distinct name.
+"""
+from __future__ import print_function
+import re
+from collections import deque
+
+_META = re.compile(r'[.^$*+?{}\[\]\\|()]')
+_BACKREF = re.compile(r'\\\d|\(\?P=')
+_REPEAT = re.compile(r'\{\d*,?\d*\}')
+_RUN_END = re.compile(r'[.^$*+?{]')
+
+
+def is_literal(pattern):
+    return not _META.search(pattern)
+
+
+def required_literal(pattern, min_len=3):
+    """Return a lowercase substring every match of ``pattern`` contains.
+
+    Only simple patterns (no groups, classes, escapes or alternation) are
+    analysed; anything else returns None and is handled by the gate.
+    """
+    if any(ch in pattern for ch in "|()[]\\"):
+        return None
+    pattern = _REPEAT.sub("{", pattern)
+    best, pos = "", 0
+    for m in _RUN_END.finditer(pattern + "$"):
+        run = pattern[pos:m.start()]
+        if m.group() in "?*{":
+            run = run[:-1]
+        if len(run) > len(best):
+            best = run
+        pos = m.end()
+    return best.lower() if len(best) >= min_len else None
+
+
+class AhoCorasick(object):
+    """Automaton reporting which of ``words`` occur in a text."""
+
+    def __init__(self, words):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for wid, word in enumerate(words):
+            node = 0
+            for ch in word:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = nxt
+            self._out[node] += (wid,)
+        self._link()
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def search(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+class RuleMatcher(object):
+    """All-matches lookup over the patterns of one recipe category."""
+
+    def __init__(self, patterns):
+        words, self._word_rules = [], []   # automaton word id -> rule index
+        self._anchored = {}                 # rule index -> compiled regex
+        gate_parts, self._gated, self._ungated = [], [], []
+        for idx, patt in enumerate(patterns):
+            if is_literal(patt):
+                words.append(patt.lower())
+                self._word_rules.append(idx)
+                continue
+            try:
+                rgx = re.compile(patt, re.IGNORECASE)
+            except re.error:
+                words.append(patt.lower())
+                self._word_rules.append(idx)
+                continue
+            anchor = required_literal(patt)
+            if anchor:
+                words.append(anchor)
+                self._word_rules.append(idx)
+                self._anchored[idx] = rgx
+            elif _BACKREF.search(patt) or rgx.groupindex:
+                self._ungated.append((idx, rgx))
+            else:
+                gate_parts.append("(?:{})".format(patt))
+                self._gated.append((idx, rgx))
+        self._automaton = AhoCorasick(words) if words else None
+        self._gate = None
+        if gate_parts:
+            try:
+                self._gate = re.compile("|".join(gate_parts), re.IGNORECASE)
+            except re.error:
+                self._ungated.extend(self._gated)
+                self._gated = []
+        self._cache = {}
+
+    def match(self, name):
+        """Return the sorted indices of every rule matching ``name``."""
+        name = name or ""
+        hit = self._cache.get(name)
+        if hit is not None:
+            return hit
+        found = set()
+        if self._automaton:
+            for w in self._automaton.search(name.lower()):
+                idx = self._word_rules[w]
+                rgx = self._anchored.get(idx)
+                if rgx is None or rgx.search(name):
+                    found.add(idx)
+        if self._gate is not None and self._gate.search(name):
+            found.update(idx for idx, rgx in self._gated if rgx.search(name))
+        found.update(idx for idx, rgx in self._ungated if rgx.search(name))
+        hit = tuple(sorted(found))
+        self._cache[name] = hit
+        return hit
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Trigram index for fuzzy material-name lookups against a price book.
+
+``price_lookup`` used to fall back to a substring scan over the whole cost
+map. ``MaterialIndex`` answers the same question (exact key, then either
+name containing the other) from character trigram posting lists, so each
+query only verifies the handful of entries that share its trigrams.
+
+Ranking is deterministic: exact match, then prefix matches, then other
+containments; ties go to the smallest length difference, then to the
+lexically smallest key.
+"""
+from __future__ import print_function
+from collections import defaultdict
+
+from costestimates.pricebook import norm
+
+N = 3
+
+EXACT, PREFIX, CONTAINS = 0, 1, 2
+
+
+def _grams(s):
+    return set(s[i:i + N] for i in range(len(s) - N + 1))
+
+
+class MaterialIndex(object):
+    """Inverted trigram index over the normalised keys of a cost map."""
+
+    def __init__(self, cost_map):
+        self.cost_map = cost_map
+        self._keys = sorted(cost_map)
+        self._postings = defaultdict(list)   # trigram -> [key id]
+        self._gram_count = []                # key id -> distinct trigrams
+        self._short = []                     # ids of keys shorter than N
+        for kid, k in enumerate(self._keys):
+            grams = _grams(k)
+            self._gram_count.append(len(grams))
+            if not grams:
+                self._short.append(kid)
+            for g in grams:
+                self._postings[g].append(kid)
+        self._memo = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _contained_in(self, key, grams):
+        """Ids of catalogue keys that contain ``key``."""
+        if not grams:
+            return [i for i, k in enumerate(self._keys) if key in k]
+        lists = sorted((self._postings.get(g, ()) for g in grams), key=len)
+        found = set(lists[0])
+        for lst in lists[1:]:
+            if not found:
+                break
+            found.intersection_update(lst)
+        return [i for i in found if key in self._keys[i]]
+
+    def _contained_by(self, key, grams):
+        """Ids of catalogue keys that are substrings of ``key``."""
+        hits = defaultdict(int)
+        for g in grams:
+            for i in self._postings.get(g, ()):
+                hits[i] += 1
+        out = [i for i, n in hits.items() if n == self._gram_count[i] and self._keys[i] in key]
+        out.extend(i for i in self._short if self._keys[i] in key)
+        return out
+
+    def search(self, material_name, limit=None):
+        """Return ``[(rank, key)]`` best first for ``material_name``."""
+        key = norm(material_name)
+        if not key:
+            return []
+        if key in self.cost_map:
+            return [(EXACT, key)]
+        grams = _grams(key)
+        ids = set(self._contained_in(key, grams))
+        ids.update(self._contained_by(key, grams))
+        ranked = []
+        for i in ids:
+            k = self._keys[i]
+            kind = PREFIX if (k.startswith(key) or key.startswith(k)) else CONTAINS
+            ranked.append((kind, abs(len(k) - len(key)), k))
+        ranked.sort()
+        if limit:
+            ranked = ranked[:limit]
+        return [(kind, k) for kind, _, k in ranked]
+
+    def best(self, material_name):
+        """Return the best cost-map record for ``material_name`` or None."""
+        if material_name in self._memo:
+            return self._memo[material_name]
+        hits = self.search(material_name, limit=1)
+        rec = self.cost_map[hits[0][1]] if hits else None
+        self._memo[material_name] = rec
+        return rec
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""How each tool measures each category, read from ``measurement.csv``.
+
+``measurement.csv`` (next to this module) has one row per tool and
+category, plus one per material where that changes the measure:
+
+    Tool,Category,Material,Measure,Area,Volume,Length
+    boq,OST_StructuralColumns,steel,length|volume|count,,HOST_VOLUME_COMPUTED|Volume,CURVE_ELEM_LENGTH|Length
+
+- ``Tool``: ``amount`` (Amount and Price Risk), ``boq`` (Generate BOQ)
+  or ``schedule`` (Material Schedule);
+- ``Category``: a ``BuiltInCategory`` name;
+- ``Material``: empty, or text the element's structural material (name
+  and class, any case) must contain. A category's rows are tried in file
+  order and an empty one matches any material;
+- ``Measure``: ``count``, ``area``, ``volume`` or ``length``. Several,
+  separated by ``|``, are tried in order until the element has one;
+  ``area>0`` only takes a positive area;
+- ``Area``, ``Volume``, ``Length``: the parameters tried for that measure,
+  in order (``BuiltInParameter`` or parameter names).
+
+Units and the conversion from Revit's internal feet depend only on the
+measure (``MEASURES``), so every tool converts the same way.
+``MeasurementRules(tool)`` compiles a tool's rows once into one function
+per category: ``row_measures`` for snapshot rows (the BOQ engine),
+``amounts.Measurer`` for model elements (Amount, Material Schedule).
+"""
+import os
+from collections import OrderedDict
+
+from costestimates.pricebook import iter_rows, find_column
+from costestimates.groupby import count, area, volume, length
+from costestimates.units import FT2_TO_M2, FT3_TO_M3, FT_TO_M
+
+RULES_FILE = os.path.join(os.path.dirname(__file__), "measurement.csv")
+
+# measure -> (unit, factor from Revit internal units)
+MEASURES = OrderedDict([
+    ("count", ("No.", 1.0)),
+    ("area", ("m²", FT2_TO_M2)),
+    ("volume", ("m³", FT3_TO_M3)),
+    ("length", ("m", FT_TO_M)),
+])
+# measures read from parameters, in the rules file's column order
+PARAM_MEASURES = ("area", "volume", "length")
+_ROW_MEASURES = {"area": area, "volume": volume, "length": length}
+
+
+class Rule(object):
+    """One row of the rules file."""
+
+    def __init__(self, tool, category, material, steps, params):
+        self.tool = tool
+        self.category = category
+        self.material = material
+        self.steps = steps
+        self.params = params
+
+
+def parse_measure(text):
+    """``"area>0|count"`` -> ``(("area", True), ("count", False))``."""
+    steps = []
+    for part in text.split("|"):
+        part = part.strip().lower()
+        positive = part.endswith(">0")
+        name = part[:-2].strip() if positive else part
+        if name not in MEASURES:
+            raise ValueError("unknown measure '{}'".format(part))
+        steps.append((name, positive))
+    return tuple(steps)
+
+
+def load_rules(path=None):
+    """Return the ``Rule`` of every row of ``path`` (default ``measurement.csv``).
+
+    Raises ValueError on an unknown measure or a measure without parameters.
+    """
+    path = path or RULES_FILE
+    rows = iter_rows(path)
+    header = next(rows, None) or []
+    cols = [find_column(header, c) for c in ("tool", "category", "material", "measure") + PARAM_MEASURES]
+    if cols[0] is None or cols[1] is None or cols[3] is None:
+        raise ValueError("{}: needs Tool, Category and Measure columns".format(path))
+    rules = []
+    for line, r in enumerate(rows, 2):
+        cells = [(r[i].strip() if i is not None and i < len(r) else "") for i in cols]
+        if not cells[0] or cells[0].startswith("#"):
+            continue
+        try:
+            steps = parse_measure(cells[3])
+        except ValueError as e:
+            raise ValueError("{} line {}: {}".format(path, line, e))
+        params = dict((m, tuple(p.strip() for p in text.split("|") if p.strip()))
+                      for m, text in zip(PARAM_MEASURES, cells[4:]) if text)
+        for m, _ in steps:
+            if m != "count" and m not in params:
+                raise ValueError("{} line {}: no {} parameters".format(path, line, m.title()))
+        rules.append(Rule(cells[0].lower(), cells[1], cells[2].lower(), steps, params))
+    return rules
+
+
+_loaded = {}
+
+
+def default_rules():
+    """The rules in ``measurement.csv``, read once per session."""
+    if RULES_FILE not in _loaded:
+        _loaded[RULES_FILE] = load_rules(RULES_FILE)
+    return _loaded[RULES_FILE]
+
+
+def material_text(material):
+    """A Revit material's name and class in lower case, as rules match it."""
+    if not material:
+        return ""
+    return (material.Name + " " + (getattr(material, "MaterialClass", "") or "")).lower()
+
+
+class MeasurementRules(object):
+    """The rules of one tool, by category.
+
+    ``params[category][measure]`` are the parameters read for a measure,
+    the same across the category's rows.
+    """
+
+    def __init__(self, tool, rules=None):
+        self.tool = tool
+        self.by_category = OrderedDict()
+        self.params = {}
+        for rule in (rules if rules is not None else default_rules()):
+            if rule.tool != tool:
+                continue
+            self.by_category.setdefault(rule.category, []).append(rule)
+            merged = self.params.setdefault(rule.category, {})
+            for m, names in rule.params.items():
+                if merged.setdefault(m, names) != names:
+                    raise ValueError("{} {}: rows disagree on the {} parameters".format(
+                        tool, rule.category, m.title()))
+
+    def __contains__(self, category):
+        return category in self.by_category
+
+    def categories(self):
+        return list(self.by_category)
+
+    def material_categories(self):
+        """Categories measured differently by material."""
+        return [c for c, rules in self.by_category.items() if any(r.material for r in rules)]
+
+    def unit(self, category):
+        """Unit of the category's first measure."""
+        return MEASURES[self.by_category[category][0].steps[0][0]][0]
+
+    def compile(self, step, by_material):
+        """``{category: measure}`` built once from the rules.
+
+        Each row's measures are chained from the last one back, with
+        ``step(category, measure, positive, otherwise)``; a category whose
+        rows name materials gets ``by_material([(material, fn), ...])``.
+        """
+        table = {}
+        for category, rules in self.by_category.items():
+            choices = []
+            for rule in rules:
+                fn = None
+                for measure, positive in reversed(rule.steps):
+                    fn = step(category, measure, positive, fn)
+                choices.append((rule.material, fn))
+            if len(choices) == 1 and not choices[0][0]:
+                table[category] = choices[0][1]
+            else:
+                table[category] = by_material(choices)
+        return table
+
+    def row_measures(self):
+        """``{category: measure(source, i, measures)}`` for ``groupby``.
+
+        A row whose material no rule matches is counted.
+        """
+        def step(category, measure, positive, otherwise):
+            if measure == "count":
+                return count(MEASURES["count"][0])
+            return _ROW_MEASURES[measure](otherwise=otherwise, positive=positive)
+
+        def by_material(choices):
+            fallback = count(MEASURES["count"][0])
+
+            def measure(source, i, m):
+                low = source.material(i)
+                for text, fn in choices:
+                    if text in low:
+                        return fn(source, i, m)
+                return fallback(source, i, m)
+            return measure
+
+        return self.compile(step, by_material)
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""Painted wall areas for the BOQ "Painting" section.
+
+Reading painted faces means pulling wall geometry, which is the slowest
+part of an export. Two things keep it off the common path:
+
+- a quick reject: a wall with no paint materials (on itself or on its
+  parts) is skipped before any geometry is requested;
+- ``PaintAreaCache``: painted area per material, per wall, keyed by a
+  fingerprint of the wall (type, location curve, height, area and paint
+  material set). It is LRU-bounded and saved between exports, so
+  unchanged walls are never re-tessellated.
+
+Moving paint between faces of a wall with a material it already carries
+keeps the fingerprint; Shift+Click on Generate BOQ rebuilds the cache.
+
+Areas are measured by one of two backends:
+
+- ``"material"`` (default) asks the element for its paint material ids
+  and ``GetMaterialArea(id, True)`` per id, without touching geometry;
+- ``"faces"`` walks side faces, then parts, then solids, reading
+  ``Face.Area`` of every painted face.
+
+The material backend drops to the face walk for any wall it returns
+nothing for. ``compare_backends`` runs both over the same walls and
+lists the materials where they disagree (painted top or end faces are
+counted by the material backend but not by the side-face walk).
+"""
+import os
+import time
+import pickle
+import hashlib
+from collections import OrderedDict
+
+from pyrevit import DB
+
+from costestimates.units import FT2_TO_M2
+from costestimates.params import resolver_for
+from costestimates.pricebook import default_cache_dir
+
+PAINT_CACHE_VERSION = 2
+MAX_ENTRIES = 50000
+DEFAULT_BACKEND = "material"
+
+
+def cache_path(doc, cache_dir=None):
+    key = (doc.PathName or doc.Title or "untitled").encode("utf-8")
+    return os.path.join(cache_dir or default_cache_dir(),
+                        "paint_{}.pickle".format(hashlib.md5(key).hexdigest()[:12]))
+
+
+class PaintAreaCache(object):
+    """``{wall id: (fingerprint, {material id: ft²})}``, least recently used first."""
+
+    def __init__(self, path=None, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        if path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as fh:
+                image = pickle.load(fh)
+            if image.get("version") == PAINT_CACHE_VERSION:
+                self.entries = OrderedDict(image["entries"])
+        except Exception:
+            pass
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            folder = os.path.dirname(self.path)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            tmp = self.path + ".tmp"
+            with open(tmp, "wb") as fh:
+                pickle.dump({"version": PAINT_CACHE_VERSION, "entries": list(self.entries.items())}, fh, 2)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(tmp, self.path)
+        except Exception:
+            pass
+
+    def clear(self):
+        self.entries = OrderedDict()
+
+    def get(self, wall_id, fp):
+        entry = self.entries.pop(wall_id, None)
+        if entry is None or entry[0] != fp:
+            self.misses += 1
+            return None
+        self.entries[wall_id] = entry  # most recently used
+        self.hits += 1
+        return entry[1]
+
+    def put(self, wall_id, fp, areas):
+        self.entries.pop(wall_id, None)
+        self.entries[wall_id] = (fp, areas)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evicted += 1
+
+
+class PaintStats(object):
+    def __init__(self):
+        self.walls = 0
+        self.rejected = 0
+        self.cached = 0
+        self.measured = 0
+        self.fallbacks = 0
+        self.ms = 0.0
+
+    def summary(self):
+        return "painting: {} wall(s), {} without paint, {} from cache, {} measured ({} by faces), {:.0f} ms".format(
+            self.walls, self.rejected, self.cached, self.measured, self.fallbacks, self.ms)
+
+
+def _ids(collection):
+    return sorted(i.IntegerValue for i in collection) if collection else []
+
+
+def painted_material_ids(doc, wall):
+    """Return ``(paint material ids of the wall and its parts, part ids)``."""
+    mats = set()
+    try:
+        mats.update(_ids(wall.GetMaterialIds(True)))
+    except Exception:
+        return None, []  # cannot tell; measure the wall
+    parts = []
+    try:
+        if DB.PartUtils.HasAssociatedParts(doc, wall.Id):
+            for pid in DB.PartUtils.GetAssociatedParts(doc, wall.Id, True, True):
+                parts.append(pid)
+                mats.update(_ids(doc.GetElement(pid).GetMaterialIds(True)))
+    except Exception:
+        pass
+    return mats, parts
+
+
+def fingerprint(wall, mats, parts):
+    """Cheap summary of everything that changes a wall's painted area."""
+    curve = None
+    try:
+        loc = wall.Location.Curve
+        curve = tuple(round(v, 6) for pt in (loc.GetEndPoint(0), loc.GetEndPoint(1)) for v in (pt.X, pt.Y, pt.Z))
+    except Exception:
+        pass
+
+    def _double(bip):
+        p = wall.get_Parameter(bip)
+        return round(p.AsDouble(), 6) if p and p.HasValue else None
+
+    return (
+        wall.GetTypeId().IntegerValue,
+        curve,
+        _double(DB.BuiltInParameter.WALL_USER_HEIGHT_PARAM),
+        _double(DB.BuiltInParameter.HOST_AREA_COMPUTED),
+        tuple(sorted(mats or ())),
+        tuple(sorted(p.IntegerValue for p in parts)),
+    )
+
+
+def _geometry_options():
+    opt = DB.Options()
+    opt.ComputeReferences = True
+    opt.IncludeNonVisibleObjects = False
+    return opt
+
+
+def _faces(geom):
+    for g in geom or ():
+        if isinstance(g, DB.Solid) and g.Faces:
+            for f in g.Faces:
+                yield f
+        elif isinstance(g, DB.GeometryInstance):
+            for gg in g.GetInstanceGeometry():
+                if isinstance(gg, DB.Solid) and gg.Faces:
+                    for f in gg.Faces:
+                        yield f
+
+
+def measure_painted_faces(doc, wall, parts, opt):
+    """Return ``{material id: ft²}`` from the wall's painted faces.
+
+    Side faces first; then the wall's parts, if it has any; then the
+    wall's own solids.
+    """
+    areas = {}
+
+    def _add(mid, area):
+        if mid != DB.ElementId.InvalidElementId:
+            areas[mid.IntegerValue] = areas.get(mid.IntegerValue, 0.0) + area
+
+    try:
+        for side in (DB.ShellLayerType.Interior, DB.ShellLayerType.Exterior):
+            for ref in DB.HostObjectUtils.GetSideFaces(wall, side) or []:
+                if not doc.IsPainted(wall.Id, ref):
+                    continue
+                face = wall.GetGeometryObjectFromReference(ref)
+                if isinstance(face, DB.Face):
+                    _add(doc.GetPaintedMaterial(wall.Id, ref), face.Area)
+    except Exception:
+        pass
+    if areas:
+        return areas
+
+    def _collect(host):
+        try:
+            for f in _faces(host.get_Geometry(opt)):
+                ref = f.Reference
+                if ref and doc.IsPainted(host.Id, ref):
+                    _add(doc.GetPaintedMaterial(host.Id, ref), f.Area)
+        except Exception:
+            pass
+
+    if parts:
+        for pid in parts:
+            _collect(doc.GetElement(pid))
+        return areas
+
+    _collect(wall)
+    return areas
+
+
+def _material_areas(host, areas):
+    for mid in host.GetMaterialIds(True) or ():
+        area = host.GetMaterialArea(mid, True)
+        if area > 0.0:
+            areas[mid.IntegerValue] = areas.get(mid.IntegerValue, 0.0) + area
+
+
+def measure_material_areas(doc, wall, parts, opt=None):
+    """Return ``{material id: ft²}`` from ``GetMaterialArea(id, True)``.
+
+    Same order as ``measure_painted_faces``: the wall itself, then its
+    parts when the wall carries no paint.
+    """
+    areas = {}
+    try:
+        _material_areas(wall, areas)
+        if not areas:
+            for pid in parts:
+                _material_areas(doc.GetElement(pid), areas)
+    except Exception:
+        return {}
+    return areas
+
+
+BACKENDS = OrderedDict([
+    ("material", measure_material_areas),
+    ("faces", measure_painted_faces),
+])
+
+
+def measure_wall(doc, wall, parts, opt, backend=DEFAULT_BACKEND, stats=None):
+    """Painted ``{material id: ft²}`` of one wall with ``backend``."""
+    if backend == "material":
+        areas = measure_material_areas(doc, wall, parts)
+        if areas:
+            return areas
+        if stats is not None:
+            stats.fallbacks += 1
+    return measure_painted_faces(doc, wall, parts, opt)
+
+
+def compare_backends(doc, walls, tolerance=0.01):
+    """Painted m² per material id from every backend, plus disagreements.
+
+    Returns ``(totals, mismatches)``: ``totals[backend][material id]`` in
+    m², and ``[(material id, m² material, m² faces)]`` for ids differing
+    by more than ``tolerance`` m². Neither backend falls back here.
+    """
+    opt = _geometry_options()
+    totals = OrderedDict((name, {}) for name in BACKENDS)
+    for wall in walls:
+        try:
+            mats, parts = painted_material_ids(doc, wall)
+        except Exception:
+            continue
+        for name, measure in BACKENDS.items():
+            for mid, area in measure(doc, wall, parts, opt).items():
+                totals[name][mid] = totals[name].get(mid, 0.0) + area * FT2_TO_M2
+    by_material, by_faces = totals["material"], totals["faces"]
+    mismatches = []
+    for mid in sorted(set(by_material) | set(by_faces)):
+        a, b = by_material.get(mid, 0.0), by_faces.get(mid, 0.0)
+        if abs(a - b) > tolerance:
+            mismatches.append((mid, a, b))
+    return totals, mismatches
+
+
+def gather_wall_painting(doc, walls, cache=None, stats=None, backend=DEFAULT_BACKEND):
+    """Group painted wall area by material: ``{"Paint - name": {qty, rate, unit, comment}}``."""
+    t0 = time.time()
+    stats = stats if stats is not None else PaintStats()
+    params = resolver_for(doc)
+    opt = _geometry_options()
+    totals = {}
+
+    for wall in walls:
+        stats.walls += 1
+        try:
+            mats, parts = painted_material_ids(doc, wall)
+            if mats is not None and not mats and not parts:
+                stats.rejected += 1
+                continue
+            wall_id = wall.Id.IntegerValue
+            fp = (backend,) + fingerprint(wall, mats, parts)
+            areas = cache.get(wall_id, fp) if cache is not None else None
+            if areas is None:
+                areas = measure_wall(doc, wall, parts, opt, backend, stats)
+                stats.measured += 1
+                if cache is not None:
+                    cache.put(wall_id, fp, areas)
+            else:
+                stats.cached += 1
+            for mid, area in areas.items():
+                totals[mid] = totals.get(mid, 0.0) + area
+        except Exception:
+            pass
+
+    grouped = {}
+    for mid, area_ft2 in totals.items():
+        mat = doc.GetElement(DB.ElementId(mid))
+        key = "Paint - {}".format((mat.Name if mat else None) or "Paint")
+        rate = 0.0
+        try:
+            p = params.get(mat, "cost") if mat else None
+            rate = float(p.AsDouble()) if (p and p.HasValue) else 0.0
+        except Exception:
+            pass
+        if key not in grouped:
+            grouped[key] = {"qty": 0.0, "rate": rate, "unit": "m²", "comment": ""}
+        grouped[key]["qty"] += area_ft2 * FT2_TO_M2
+        if grouped[key]["rate"] == 0.0 and rate:
+            grouped[key]["rate"] = rate
+
+    for v in grouped.values():
+        if abs(v["qty"]) < 1e-6:
+            v["qty"] = 0.0
+    stats.ms += (time.time() - t0) * 1000.0
+    return grouped
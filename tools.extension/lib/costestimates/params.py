@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Logical parameters resolved once per document.
+
+``LookupParameter(name)`` walks an element's whole parameter set on every
+call. ``parameters.csv`` (next to this module) maps each logical
+parameter the pushbuttons use to a shared-parameter GUID and/or a
+``BuiltInParameter``:
+
+    Key,Name,Guid,BuiltInParameter
+    total,Test_1234,53c43491-3699-4705-a7ff-d1db3e635a7c,
+
+``ParameterResolver`` checks the mapping against the document once, then
+reads through ``get_Parameter(guid)`` / ``get_Parameter(bip)``. Name
+lookup is used only when the fast path finds nothing on an element, or
+when the key has no GUID or built-in parameter.
+"""
+import os
+from collections import OrderedDict
+
+from pyrevit import DB
+from System import Guid
+
+from costestimates.pricebook import iter_rows, find_column
+
+MAPPING_FILE = os.path.join(os.path.dirname(__file__), "parameters.csv")
+
+# Used when parameters.csv is missing or lacks a key
+DEFAULT_MAPPING = OrderedDict([
+    ("cost", ("Cost", None, "ALL_MODEL_COST")),
+    ("total", ("Test_1234", "53c43491-3699-4705-a7ff-d1db3e635a7c", None)),
+    ("type_comments", ("Type Comments", None, "ALL_MODEL_TYPE_COMMENTS")),
+    ("function", ("Function", None, "FUNCTION_PARAM")),
+    ("structural_material", ("Structural Material", None, "STRUCTURAL_MATERIAL_PARAM")),
+])
+
+
+def load_mapping(path=None):
+    """Return ``{key: (name, guid or None, BuiltInParameter name or None)}``."""
+    mapping = OrderedDict(DEFAULT_MAPPING)
+    path = path or MAPPING_FILE
+    if not os.path.isfile(path):
+        return mapping
+    rows = iter_rows(path)
+    header = next(rows, None)
+    if not header:
+        return mapping
+    key_i = find_column(header, "key")
+    name_i = find_column(header, "name")
+    guid_i = find_column(header, "guid")
+    bip_i = find_column(header, "builtinparameter", "builtin")
+    for r in rows:
+        cells = [(r[i].strip() if i is not None and i < len(r) else "") for i in (key_i, name_i, guid_i, bip_i)]
+        if not cells[0]:
+            continue
+        mapping[cells[0].lower()] = (cells[1] or None, cells[2] or None, cells[3] or None)
+    return mapping
+
+
+class ParameterResolver(object):
+    """Fast parameter access for one document."""
+
+    def __init__(self, doc, mapping=None):
+        self.doc = doc
+        self.mapping = mapping if mapping is not None else load_mapping()
+        self.modes = {}
+        self._fast = {}
+        self._ids = {}
+        for key, (name, guid, bip) in self.mapping.items():
+            ref, mode, pid = None, "name", None
+            if guid:
+                try:
+                    g = Guid(guid)
+                    spe = DB.SharedParameterElement.Lookup(doc, g)
+                    if spe is not None:
+                        ref, mode, pid = g, "guid", spe.Id
+                except Exception:
+                    pass
+            if ref is None and bip and hasattr(DB.BuiltInParameter, bip):
+                ref, mode = getattr(DB.BuiltInParameter, bip), "builtin"
+            self._fast[key] = ref
+            self._ids[key] = pid
+            self.modes[key] = mode
+        self.fast_hits = 0
+        self.by_name = 0
+
+    def name(self, key):
+        return self.mapping[key][0]
+
+    def get(self, el, key):
+        """Return ``el``'s parameter for logical ``key``, or None."""
+        ref = self._fast[key]
+        if ref is not None:
+            p = el.get_Parameter(ref)
+            if p is not None:
+                self.fast_hits += 1
+                return p
+        name = self.mapping[key][0]
+        if not name:
+            return None
+        self.by_name += 1
+        return el.LookupParameter(name)
+
+    def positive_filter(self, key):
+        """An ``ElementParameterFilter`` passing elements whose ``key`` is > 0.
+
+        None when ``key`` is only known by name, since Revit filters by
+        parameter id.
+        """
+        pid = self._ids.get(key)
+        if pid is None and self.modes.get(key) == "builtin":
+            pid = self._ids[key] = DB.ElementId(self._fast[key])
+        if pid is None:
+            return None
+        rule = DB.ParameterFilterRuleFactory.CreateGreaterRule(pid, 0.0, 1e-9)
+        return DB.ElementParameterFilter(rule)
+
+    def summary(self):
+        modes = ", ".join("{}={}".format(k, m) for k, m in self.modes.items())
+        return "parameters: {} fast read(s), {} by name ({})".format(self.fast_hits, self.by_name, modes)
+
+
+_current = [None, None]
+
+
+def resolver_for(doc):
+    """Return the resolver of ``doc``, building it on first use."""
+    if _current[0] is not doc:
+        _current[0], _current[1] = doc, ParameterResolver(doc)
+    return _current[1]
@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+"""Compiled price book for the ``material_costs/`` CSV folders.
+
+Every CSV is streamed once, row by row, into compact ``(key, name, unit,
+rate)`` tuples, one per distinct item, and the result is pickled to a
+cache image keyed by each file's path, size and mtime. Later runs only
+re-parse the files that changed, so both the ``Multi csv`` and
+``Material Schedule`` buttons share one parsed copy.
+"""
+from __future__ import print_function
+import os
+import re
+import csv
+import time
+import pickle
+import hashlib
+import tempfile
+import threading
+from collections import deque, OrderedDict
+
+CACHE_VERSION = 4
+PRECEDENCE_FILE = "precedence.txt"
+MAX_WORKERS = 4
+
+
+def norm(s):
+    return re.sub(r'\s+', ' ', (s or '').strip()).lower()
+
+
+def find_column(columns, *candidates):
+    cols = [c.strip().lower() for c in columns or []]
+    for cand in candidates:
+        if cand.lower() in cols:
+            return cols.index(cand.lower())
+    for cand in candidates:
+        for i, c in enumerate(cols):
+            if cand.lower() in c:
+                return i
+    return None
+
+
+_NUMBER = re.compile(r'[-+]?[\d.,\s\u00a0]*\d')
+_THOUSANDS = re.compile(r'^[-+]?\d{1,3}(,\d{3})+$')
+_MOJIBAKE = (u"\u00c3", u"\u00c2", u"\u00e2\u20ac")
+
+
+def parse_rate(text):
+    """Return a price cell as a float, or None when it holds no number.
+
+    Currency symbols and spaces are ignored. A ``,`` after the last ``.``
+    is a decimal comma with dot grouping (``1.234,56``); otherwise ``,`` is
+    a thousands separator when the value also has a ``.`` or is grouped in
+    threes (``12,500``), and a lone ``,`` with one or two decimals
+    (``12,5``) is a decimal comma.
+    """
+    m = _NUMBER.search(text or "")
+    if not m:
+        return None
+    num = re.sub(r'[\s\u00a0]', '', m.group())
+    if "," in num:
+        if "." in num and num.rfind(",") > num.rfind("."):
+            num = num.replace(".", "").replace(",", ".")
+        elif "." in num or _THOUSANDS.match(num):
+            num = num.replace(",", "")
+        elif num.count(",") == 1 and len(num.split(",")[1]) <= 2:
+            num = num.replace(",", ".")
+        else:
+            num = num.replace(",", "")
+    try:
+        return float(num)
+    except ValueError:
+        return None
+
+
+def repair_text(s):
+    """Undo UTF-8 that was decoded as cp1252 (``Ã‚Â½`` -> ``½``)."""
+    for _ in range(3):
+        if not any(marker in s for marker in _MOJIBAKE):
+            break
+        try:
+            s = s.encode("cp1252").decode("utf-8")
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            break
+    return s
+
+
+def _decoded_lines(fh):
+    for raw in fh:
+        try:
+            line = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            line = raw.decode("cp1252", "replace")
+        yield repair_text(line)
+
+
+def iter_rows(fpath):
+    """Yield a CSV's rows one at a time, decoding each line on its own.
+
+    Lines are tried as UTF-8 and fall back to cp1252, so files that mix
+    both (as exported from Excel and then hand-edited) read correctly.
+    """
+    with open(fpath, "rb") as fh:
+        first = True
+        for row in csv.reader(_decoded_lines(fh)):
+            if first and row:
+                row[0] = row[0].lstrip(u"\ufeff")
+            first = False
+            yield row
+
+
+def read_rows(fpath):
+    """Read a whole (small) CSV as lists of cells."""
+    return list(iter_rows(fpath))
+
+
+def iter_price_records(fpath, src=None):
+    """Yield ``(key, name, unit, rate, src)`` for one price CSV.
+
+    Memory use is constant: the column mapping comes from the first row
+    only and each later row is normalised and yielded as it is read.
+    ``rate`` is None for rows whose price cell is not numeric, so callers
+    can choose between skipping the row and treating it as zero.
+    """
+    src = src or os.path.basename(fpath)
+    rows = iter_rows(fpath)
+    header = next(rows, None)
+    if not header:
+        return
+    name_i = find_column(header, "item", "product description", "material", "description", "name")
+    rate_i = find_column(header, "rate", "unit cost", "price", "cost")
+    unit_i = find_column(header, "uom", "unit")
+    if unit_i == rate_i:
+        unit_i = None
+    if name_i is None or rate_i is None:
+        return
+
+    for r in rows:
+        if name_i >= len(r):
+            continue
+        nm = r[name_i].strip()
+        if not nm:
+            continue
+        u = r[unit_i].strip() if unit_i is not None and unit_i < len(r) else ""
+        rate = parse_rate(r[rate_i]) if rate_i < len(r) else None
+        yield norm(nm), nm, u, rate, src
+
+
+def compile_price_file(fpath):
+    """Return ``((key, name, unit, rate) tuples, rows read)`` for one price CSV.
+
+    Records are taken one at a time from ``iter_price_records``. A row
+    repeating an earlier item (same name, and both with or both without a
+    rate) replaces it, as it would on merge, so the result grows with the
+    distinct items of the file rather than with its rows.
+    """
+    kept = OrderedDict()
+    n = 0
+    for key, nm, u, rate, _ in iter_price_records(fpath):
+        n += 1
+        item = (nm, rate is None)
+        kept.pop(item, None)
+        kept[item] = (key, nm, u, rate)
+    return list(kept.values()), n
+
+
+def stream_price_folder(folderpath, stats=None):
+    """Yield the records of every CSV in ``folderpath`` without caching."""
+    t0 = time.time()
+    for fname in list_price_files(folderpath):
+        for rec in iter_price_records(os.path.join(folderpath, fname), fname):
+            if stats:
+                stats.rows += 1
+            yield rec
+    if stats:
+        stats.parse_ms = _ms(t0)
+
+
+def list_price_files(folderpath):
+    """Return the folder's CSV names in merge order; later files win.
+
+    Files merge alphabetically. A ``precedence.txt`` in the folder may list
+    CSV names one per line, highest priority first; listed files merge
+    after, and so override, every unlisted file.
+    """
+    files = sorted((f for f in os.listdir(folderpath) if f.lower().endswith(".csv")),
+                   key=lambda f: f.lower())
+    ranked = []
+    prec_path = os.path.join(folderpath, PRECEDENCE_FILE)
+    if os.path.isfile(prec_path):
+        for line in read_rows(prec_path):
+            name = line[0].strip() if line else ""
+            if name in files and name not in ranked:
+                ranked.append(name)
+    return [f for f in files if f not in ranked] + ranked[::-1]
+
+
+def default_cache_dir():
+    base = os.environ.get("APPDATA") or tempfile.gettempdir()
+    return os.path.join(base, "pyRevit", "CostEstimates")
+
+
+def _cache_path(folderpath, cache_dir):
+    key = os.path.normcase(os.path.abspath(folderpath)).encode("utf-8")
+    return os.path.join(cache_dir, "pricebook_{}.pickle".format(hashlib.md5(key).hexdigest()[:12]))
+
+
+def _ms(t0):
+    return (time.time() - t0) * 1000.0
+
+
+class CacheStats(object):
+    """Hit/miss counters and phase timings of one price book load."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.rebuilt = False
+        self.load_ms = 0.0
+        self.parse_ms = 0.0
+        self.save_ms = 0.0
+        self.rows = 0
+        self.backend = "csv"
+
+    @property
+    def rows_per_s(self):
+        return self.rows / (self.parse_ms / 1000.0) if self.parse_ms else 0.0
+
+    def summary(self):
+        if self.backend == "catalogue":
+            return "Price catalogue: {} rows | query {:.0f} ms".format(self.rows, self.load_ms)
+        return ("Price cache: {} hit(s), {} miss(es){} | load {:.0f} ms, parse {:.0f} ms "
+                "({} rows, {:.0f} rows/s), save {:.0f} ms").format(
+            self.hits, self.misses, " (rebuilt)" if self.rebuilt else "",
+            self.load_ms, self.parse_ms, self.rows, self.rows_per_s, self.save_ms)
+
+
+class PriceBook(object):
+    """Parsed price files of one folder, merged in ``files`` order."""
+
+    def __init__(self, folderpath):
+        self.folderpath = folderpath
+        self.files = []
+        self.errors = []
+        self.stats = CacheStats()
+        self.file_ms = {}
+        self.file_rows = {}
+        self.cached_files = set()
+        self._entries = {}
+
+    def records(self):
+        """Yield ``(key, name, unit, rate, src)``; later files win on merge."""
+        for fname in self.files:
+            for key, nm, u, rate in self._entries[fname]:
+                yield key, nm, u, rate, fname
+
+    def file_report(self):
+        """Return one ``name: rows, ms`` line per file, in merge order."""
+        return ["{}: {} rows, {:.0f} ms{}".format(
+                    f, self.file_rows.get(f, len(self._entries[f])), self.file_ms.get(f, 0.0),
+                    " (cached)" if f in self.cached_files else "")
+                for f in self.files]
+
+    def cost_map(self):
+        """Return ``{norm(name): {name, unit, rate, src}}`` as used by helpers."""
+        result = {}
+        for key, nm, u, rate, src in self.records():
+            result[key] = {"name": nm, "unit": u, "rate": rate or 0.0, "src": src}
+        return result
+
+    def prices_by_name(self):
+        """Return ``{name: rate}`` for rows with a numeric rate."""
+        result = {}
+        for _, nm, _, rate, _ in self.records():
+            if rate is not None:
+                result[nm] = rate
+        return result
+
+
+def _load_image(path):
+    try:
+        with open(path, "rb") as fh:
+            image = pickle.load(fh)
+        if image.get("version") == CACHE_VERSION:
+            return image["files"]
+    except Exception:
+        pass
+    return None
+
+
+def _save_image(path, files):
+    try:
+        folder = os.path.dirname(path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump({"version": CACHE_VERSION, "files": files}, fh, 2)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp, path)
+    except Exception:
+        pass
+
+
+def _parse_files(paths, workers):
+    """Parse ``paths`` on a small thread pool.
+
+    Returns ``{path: (compile_price_file result, ms, error)}``. Files are
+    independent and the work is I/O and float parsing, so IronPython
+    (which has no GIL) gets real parallelism; on CPython the reads still
+    overlap.
+    """
+    results = {}
+    todo = deque(paths)
+
+    def work():
+        while True:
+            try:
+                fpath = todo.popleft()
+            except IndexError:
+                return
+            t0 = time.time()
+            try:
+                results[fpath] = (compile_price_file(fpath), _ms(t0), None)
+            except Exception as e:
+                results[fpath] = (None, _ms(t0), str(e))
+
+    n = min(workers, len(paths))
+    if n <= 1:
+        work()
+        return results
+    threads = [threading.Thread(target=work) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def load_price_book(folderpath, cache_dir=None, use_cache=True, workers=MAX_WORKERS,
+                    supplier=None, region=None, as_of=None):
+    """Load every CSV in ``folderpath``, re-parsing only changed files.
+
+    Changed files are parsed concurrently, then merged in
+    ``list_price_files`` order so the result never depends on thread or
+    directory-listing order. When the folder holds a ``catalogue.sqlite``
+    and sqlite3 is available, prices come from that catalogue instead,
+    filtered by ``supplier``, ``region`` and ``as_of`` date.
+    """
+    book = PriceBook(folderpath)
+    if not folderpath or not os.path.isdir(folderpath):
+        return book
+    from costestimates import catalogue
+    if catalogue.available() and os.path.isfile(catalogue.catalogue_path(folderpath)):
+        cat = catalogue.Catalogue(catalogue.catalogue_path(folderpath))
+        try:
+            return cat.price_book(supplier, region, as_of)
+        finally:
+            cat.close()
+    stats = book.stats
+    files = list_price_files(folderpath)
+
+    image_path = _cache_path(folderpath, cache_dir or default_cache_dir())
+    t0 = time.time()
+    cached = _load_image(image_path) if use_cache else None
+    stats.load_ms = _ms(t0)
+    if cached is None:
+        cached = {}
+        stats.rebuilt = True
+
+    t0 = time.time()
+    fresh, stale = {}, {}
+    for fname in files:
+        fpath = os.path.abspath(os.path.join(folderpath, fname))
+        try:
+            st = os.stat(fpath)
+        except OSError as e:
+            book.errors.append((fname, str(e)))
+            continue
+        entry = cached.get(fpath)
+        if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            stats.hits += 1
+            fresh[fpath] = entry
+            book.cached_files.add(fname)
+        else:
+            stale[fpath] = st
+
+    parsed = _parse_files(sorted(stale), workers)
+    for fname in files:
+        fpath = os.path.abspath(os.path.join(folderpath, fname))
+        if fpath in parsed:
+            compiled, ms, err = parsed[fpath]
+            book.file_ms[fname] = ms
+            if err is not None:
+                book.errors.append((fname, err))
+                continue
+            st = stale[fpath]
+            rows, count = compiled
+            fresh[fpath] = {"size": st.st_size, "mtime": st.st_mtime, "rows": rows, "count": count}
+            stats.misses += 1
+            stats.rows += count
+        if fpath in fresh:
+            book._entries[fname] = fresh[fpath]["rows"]
+            book.file_rows[fname] = fresh[fpath]["count"]
+            book.files.append(fname)
+    stats.parse_ms = _ms(t0)
+
+    if use_cache and (stats.misses or set(fresh) != set(cached)):
+        t0 = time.time()
+        _save_image(image_path, fresh)
+        stats.save_ms = _ms(t0)
+    return book
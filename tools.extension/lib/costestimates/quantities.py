@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""Measured quantities kept between runs, per element.
+
+On a large model most of an export is spent reading area, volume and
+length parameters of elements that have not changed since the last
+export. ``QuantityCache`` keeps the raw value (Revit internal units) of
+every measure read, per element id, in typed arrays saved in the cache
+folder; Generate BOQ, Amount and Material Schedule all read through it.
+
+A measure is named by the parameters tried for it, e.g.
+``HOST_AREA_COMPUTED|Area``, so tools reading the same parameters share
+entries. NaN means the element has none of them.
+
+Entries belong to the document version they were read at
+(``Document.GetDocumentVersion``). When the version moves on, the
+elements ``GetChangedElements`` reports as modified or deleted are
+evicted (Revit 2023+); where that is not available, everything is.
+A document with unsaved changes neither reads nor saves the cache,
+since its elements may match no saved version.
+"""
+import os
+import pickle
+import hashlib
+from array import array
+from collections import OrderedDict
+
+from pyrevit import DB
+
+from costestimates.pricebook import default_cache_dir
+from costestimates.ledger import ID_TYPECODE, array_bytes, array_from_bytes, changes_since
+
+QUANTITY_CACHE_VERSION = 2
+NAN = float("nan")
+NOT_READ = float("-inf")
+
+
+def spec_key(specs):
+    """Name of the measure read from ``specs`` (parameter names / BuiltInParameters)."""
+    return "|".join(str(s) for s in specs) if specs else None
+
+
+def specs_of(names):
+    """Parameter names as ``read_raw`` specs: ``BuiltInParameter`` members where one exists."""
+    return tuple(getattr(DB.BuiltInParameter, n) if hasattr(DB.BuiltInParameter, n) else n
+                 for n in names)
+
+
+def read_raw(el, specs):
+    """First of ``specs`` present on ``el``, as a raw double; NaN when none has a value."""
+    for spec in specs:
+        p = el.LookupParameter(spec) if isinstance(spec, str) else el.get_Parameter(spec)
+        if p:
+            return p.AsDouble() if p.HasValue else NAN
+    return NAN
+
+
+def cache_path(doc, cache_dir=None):
+    key = (doc.PathName or doc.Title or "untitled").encode("utf-8")
+    return os.path.join(cache_dir or default_cache_dir(),
+                        "quantities_{}.pickle".format(hashlib.md5(key).hexdigest()[:12]))
+
+
+class QuantityCache(object):
+    """Raw measure values per element id (64-bit); one ``array('d')`` per measure."""
+
+    def __init__(self, path=None, doc_version=None):
+        self.path = path
+        self.doc_version = doc_version
+        self.ids = array(ID_TYPECODE)
+        self.rows = {}
+        self.columns = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _row(self, eid):
+        row = self.rows.get(eid)
+        if row is None:
+            row = self.rows[eid] = len(self.ids)
+            self.ids.append(eid)
+            for column in self.columns.values():
+                column.append(NOT_READ)
+        return row
+
+    def _column(self, key):
+        column = self.columns.get(key)
+        if column is None:
+            column = self.columns[key] = array("d", [NOT_READ]) * len(self.ids)
+        return column
+
+    def raw(self, el, key, specs):
+        """Raw value of measure ``key`` on ``el``, read from ``specs`` on a miss."""
+        if not specs:
+            return NAN
+        row = self._row(el.Id.IntegerValue)
+        column = self._column(key)
+        value = column[row]
+        if value != NOT_READ:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = column[row] = read_raw(el, specs)
+        return value
+
+    def value(self, el, key, specs, factor):
+        """``raw`` times ``factor`` (NaN stays NaN)."""
+        return self.raw(el, key, specs) * factor
+
+    def evict(self, ids):
+        """Forget every measure of ``ids``."""
+        drop = set(i for i in ids if i in self.rows)
+        if not drop:
+            return
+        keep = [r for r, eid in enumerate(self.ids) if eid not in drop]
+        self.ids = array(ID_TYPECODE, (self.ids[r] for r in keep))
+        for key, column in self.columns.items():
+            self.columns[key] = array("d", (column[r] for r in keep))
+        self.rows = dict((eid, r) for r, eid in enumerate(self.ids))
+        self.evicted += len(drop)
+
+    def clear(self):
+        self.evicted += len(self.ids)
+        self.ids = array(ID_TYPECODE)
+        self.rows = {}
+        self.columns = OrderedDict()
+
+    def save(self):
+        if not self.path or self.doc_version is None:
+            return
+        try:
+            folder = os.path.dirname(self.path)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            image = {
+                "version": QUANTITY_CACHE_VERSION,
+                "id_typecode": ID_TYPECODE,
+                "doc_version": self.doc_version,
+                "ids": array_bytes(self.ids),
+                "columns": [(k, array_bytes(c)) for k, c in self.columns.items()],
+            }
+            tmp = self.path + ".tmp"
+            with open(tmp, "wb") as fh:
+                pickle.dump(image, fh, 2)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(tmp, self.path)
+        except Exception:
+            pass
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, "rb") as fh:
+                image = pickle.load(fh)
+            if image.get("version") != QUANTITY_CACHE_VERSION or image.get("id_typecode") != ID_TYPECODE:
+                return None
+            cache = cls(path, image["doc_version"])
+            cache.ids = array_from_bytes(ID_TYPECODE, image["ids"])
+            cache.rows = dict((eid, r) for r, eid in enumerate(cache.ids))
+            cache.columns = OrderedDict((k, array_from_bytes("d", c)) for k, c in image["columns"])
+            return cache
+        except Exception:
+            return None
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        return "quantity cache: {} element(s), {} of {} read(s) cached ({:.1%}), {} evicted{}".format(
+            len(self.ids), self.hits, lookups, float(self.hits) / lookups if lookups else 0.0,
+            self.evicted, "" if self.path and self.doc_version else " (not saved: unsaved changes)")
+
+
+def open_cache(doc, cache_dir=None):
+    """Return the quantity cache of ``doc``, brought up to its current version.
+
+    Memory-only (nothing read from or saved to disk) when the document has
+    unsaved changes or no version information.
+    """
+    try:
+        if doc.IsModified:
+            return QuantityCache()
+        version = str(DB.Document.GetDocumentVersion(doc).VersionGUID)
+    except Exception:
+        return QuantityCache()
+
+    path = cache_path(doc, cache_dir)
+    cache = QuantityCache.load(path)
+    if cache is None:
+        return QuantityCache(path, version)
+    if cache.doc_version != version:
+        try:
+            cache.evict(set.union(*changes_since(doc, cache.doc_version)))
+        except Exception:
+            cache.clear()
+        cache.doc_version = version
+    return cache
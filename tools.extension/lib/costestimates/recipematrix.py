@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Recipes as a sparse types x materials matrix.
+
+Sub-assemblies are flattened once, so each type's row holds the total
+quantity of every priced (leaf) material it uses. All composite rates are
+then one product with the price vector:
+
+- SciPy CSR matrix when SciPy is importable;
+- NumPy ``bincount`` over the COO triplets when only NumPy is;
+- plain Python row sums otherwise (IronPython).
+
+A leaf with no price is NaN in the vector, so every type that uses it
+comes out NaN and is reported as unpriced.
+"""
+from __future__ import print_function
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+NAN = float("nan")
+
+if sparse is not None and np is not None:
+    BACKEND = "scipy"
+elif np is not None:
+    BACKEND = "numpy"
+else:
+    BACKEND = "python"
+
+
+def _isnan(x):
+    return x != x
+
+
+class RecipeMatrix(object):
+    """Flattened recipe quantities, ``rows`` x ``cols`` in COO form."""
+
+    def __init__(self, types, materials, rows, cols, vals):
+        self.types = types
+        self.materials = materials
+        self.mat_index = dict((m, i) for i, m in enumerate(materials))
+        self.rows, self.cols, self.vals = rows, cols, vals
+        self._csr = None
+        if BACKEND == "scipy":
+            self._csr = sparse.csr_matrix((vals, (rows, cols)), shape=(len(types), len(materials)))
+        elif BACKEND == "numpy":
+            self._np = (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp),
+                        np.asarray(vals, dtype=float))
+        else:
+            self._py = [[] for _ in types]
+            for r, c, v in zip(rows, cols, vals):
+                self._py[r].append((c, v))
+
+    @classmethod
+    def from_book(cls, book):
+        """Flatten a ``RecipeBook`` (types on a cycle are left out)."""
+        flat = {}
+        for tname in book.order:
+            if tname in book.errors:
+                continue
+            acc = {}
+            for comp, qty in book.recipes[tname].items():
+                if comp in book.prices or comp == tname or comp not in book.recipes:
+                    acc[comp] = acc.get(comp, 0.0) + qty
+                elif comp in flat:
+                    for mat, q in flat[comp].items():
+                        acc[mat] = acc.get(mat, 0.0) + qty * q
+                else:
+                    acc = None
+                    break
+            if acc is not None:
+                flat[tname] = acc
+
+        types = [t for t in book.order if t in flat]
+        materials = sorted(set(m for acc in flat.values() for m in acc))
+        index = dict((m, i) for i, m in enumerate(materials))
+        rows, cols, vals = [], [], []
+        for r, tname in enumerate(types):
+            for mat, qty in flat[tname].items():
+                rows.append(r)
+                cols.append(index[mat])
+                vals.append(qty)
+        return cls(types, materials, rows, cols, vals)
+
+    def price_vector(self, prices):
+        """Return prices aligned to ``materials``; NaN where unpriced."""
+        vec = [prices.get(m, NAN) for m in self.materials]
+        return np.asarray(vec, dtype=float) if np is not None else vec
+
+    def multiply(self, prices):
+        """Return composite rates for a price vector (or a materials x N batch)."""
+        if BACKEND == "scipy":
+            return self._csr.dot(prices)
+        if BACKEND == "numpy":
+            rows, cols, vals = self._np
+            n = len(self.types)
+            if prices.ndim == 1:
+                return np.bincount(rows, weights=vals * prices[cols], minlength=n)
+            out = np.zeros((n, prices.shape[1]))
+            np.add.at(out, rows, vals[:, None] * prices[cols])
+            return out
+        return [sum(v * prices[c] for c, v in row) for row in self._py]
+
+    def rates(self, prices):
+        """Return ``{type: rate}`` for every type whose materials are all priced."""
+        out = self.multiply(self.price_vector(prices))
+        return dict((t, float(v)) for t, v in zip(self.types, out) if not _isnan(v))
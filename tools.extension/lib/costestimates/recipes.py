@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Composite rates for ``recipes.csv`` (Type -> Component -> Quantity).
+
+A component is priced from the price book when it has a price. Otherwise,
+if it names another recipe type, it is a sub-assembly (e.g. "Concrete C25"
+inside "Pad footing"). ``RecipeBook`` compiles these references into a DAG,
+flattens it into a ``RecipeMatrix`` and prices every type with one
+matrix-vector product. Each composite rate is then a dictionary read,
+however many types share it.
+"""
+from __future__ import print_function
+from collections import OrderedDict
+
+from costestimates.pricebook import find_column, read_rows
+from costestimates.recipematrix import RecipeMatrix
+
+
+class RecipeTable(OrderedDict):
+    """``{type: {component: qty}}`` in file order, plus the rows left out.
+
+    ``skipped`` lists ``(line, type, reason)`` for every row of a type
+    that was not read into its recipe, so callers can report it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        OrderedDict.__init__(self, *args, **kwargs)
+        self.skipped = []
+
+
+def load_recipe_table(csv_path):
+    """Return a ``RecipeTable``: ``{type: {component: qty}}`` in file order."""
+    recipes = RecipeTable()
+    rows = read_rows(csv_path)
+    if not rows:
+        return recipes
+    header = rows[0]
+    type_i = find_column(header, "type")
+    comp_i = find_column(header, "component")
+    qty_i = find_column(header, "quantity")
+    if type_i is None or comp_i is None or qty_i is None:
+        return recipes
+    width = max(type_i, comp_i, qty_i)
+    for line, r in enumerate(rows[1:], 2):
+        tname = r[type_i].strip() if type_i < len(r) else ""
+        if not tname:
+            continue
+        if width >= len(r):
+            recipes.skipped.append((line, tname, "missing columns"))
+            continue
+        comp = r[comp_i].strip()
+        if not comp:
+            recipes.skipped.append((line, tname, "no component"))
+            continue
+        try:
+            qty = float(r[qty_i])
+        except ValueError:
+            recipes.skipped.append((line, tname, "quantity '{}' is not a number".format(r[qty_i].strip())))
+            continue
+        recipes.setdefault(tname, OrderedDict())[comp] = qty
+    return recipes
+
+
+class RecipeBook(object):
+    """Recipes compiled against a price book and evaluated once.
+
+    ``rates`` maps every type that could be priced to its composite rate.
+    ``errors`` maps every other type to the reason, and ``missing`` maps it
+    to the unpriced material at the root of the failure (if any).
+    """
+
+    def __init__(self, recipes, prices):
+        self.recipes = recipes
+        self.prices = prices
+        self.rates = {}
+        self.errors = {}
+        self.missing = {}
+        self.cycles = []
+        self.order = self._compile()
+        self._evaluate()
+
+    def _deps(self, tname):
+        return [c for c in self.recipes[tname]
+                if c != tname and c not in self.prices and c in self.recipes]
+
+    def _compile(self):
+        """Topologically sort recipe types, sub-assemblies first."""
+        WHITE, GREY, BLACK = 0, 1, 2
+        color = dict.fromkeys(self.recipes, WHITE)
+        order = []
+        for root in self.recipes:
+            if color[root] != WHITE:
+                continue
+            color[root] = GREY
+            stack = [(root, iter(self._deps(root)))]
+            while stack:
+                node, it = stack[-1]
+                child = next(it, None)
+                if child is None:
+                    stack.pop()
+                    color[node] = BLACK
+                    order.append(node)
+                elif color[child] == WHITE:
+                    color[child] = GREY
+                    stack.append((child, iter(self._deps(child))))
+                elif color[child] == GREY:
+                    path = [n for n, _ in stack]
+                    cycle = path[path.index(child):] + [child]
+                    self.cycles.append(cycle)
+                    self.errors.setdefault(node, "recipe cycle: " + " -> ".join(cycle))
+        return order
+
+    def _evaluate(self):
+        """Price every type with one matrix product, then explain failures."""
+        self.matrix = RecipeMatrix.from_book(self)
+        self.rates = self.matrix.rates(self.prices)
+        for tname in self.order:
+            if tname in self.rates or tname in self.errors:
+                continue
+            for comp in self.recipes[tname]:
+                if comp in self.prices or comp in self.rates:
+                    continue
+                if comp in self.errors and comp != tname:
+                    self.errors[tname] = self.errors[comp]
+                    if comp in self.missing:
+                        self.missing[tname] = self.missing[comp]
+                else:
+                    self.errors[tname] = "missing price for {}".format(comp)
+                    self.missing[tname] = comp
+                break
+
+    def rate(self, tname):
+        """Return the composite rate of ``tname``, or None."""
+        return self.rates.get(tname)
+
+    def dependents(self):
+        """Return the reverse index ``{component: set(types using it)}``."""
+        rev = {}
+        for tname, comps in self.recipes.items():
+            for comp in comps:
+                rev.setdefault(comp, set()).add(tname)
+        return rev
+
+    def affected(self, materials=(), types=()):
+        """Return every type whose rate depends on ``materials`` or ``types``.
+
+        Walks the reverse index upwards, so a changed sub-assembly marks
+        every recipe that uses it, directly or through other recipes.
+        """
+        rev = self.dependents()
+        seen = set(t for t in types if t in self.recipes)
+        todo = list(seen) + list(materials)
+        while todo:
+            for parent in rev.get(todo.pop(), ()):
+                if parent not in seen:
+                    seen.add(parent)
+                    todo.append(parent)
+        return seen
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""Monte-Carlo price risk over the compiled recipes.
+
+Each material may carry a price range in the cost CSVs, in optional
+columns next to ``UnitCost``:
+
+- ``Min`` / ``Likely`` / ``Max``: triangular distribution. ``Likely``
+  defaults to the row's ``UnitCost``;
+- ``Sigma``: normal distribution around ``UnitCost``, either an amount or
+  a percentage of it (``10%``). Samples are clipped at zero.
+
+Materials without a range keep their fixed price. ``PriceRisk`` draws N
+price vectors at once (a materials x N matrix), pushes them through the
+``RecipeMatrix`` in one product and multiplies by the model quantities,
+giving a sample of N costs per type, per BOQ section and in total.
+Materials are sampled independently of each other.
+
+NumPy is used when importable. The pure-Python fallback gives the same
+statistics but is slow; keep N in the hundreds under IronPython.
+"""
+from __future__ import print_function
+import os
+import time
+import random
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from costestimates.pricebook import iter_rows, find_column, parse_rate, list_price_files
+
+DEFAULT_SAMPLES = 10000
+PERCENTILES = (10, 50, 90)
+
+
+def _exact_column(header, *names):
+    cols = [c.strip().lower() for c in header]
+    for name in names:
+        if name in cols:
+            return cols.index(name)
+    return None
+
+
+def _cell(row, i):
+    return row[i].strip() if i is not None and i < len(row) else ""
+
+
+def load_price_ranges(folderpath):
+    """Return ``{material name: (min, likely, max, sigma)}`` from the CSVs.
+
+    Unused fields are None. Files are read in merge order, so a later
+    file's range replaces an earlier one like its price does.
+    """
+    ranges = {}
+    for fname in list_price_files(folderpath):
+        rows = iter_rows(os.path.join(folderpath, fname))
+        header = next(rows, None)
+        if not header:
+            continue
+        name_i = find_column(header, "item", "product description", "material", "description", "name")
+        rate_i = find_column(header, "rate", "unit cost", "price", "cost")
+        min_i = _exact_column(header, "min", "minimum", "low")
+        mode_i = _exact_column(header, "likely", "most likely", "mode")
+        max_i = _exact_column(header, "max", "maximum", "high")
+        sigma_i = _exact_column(header, "sigma", "std", "stdev")
+        if name_i is None or (min_i is None and max_i is None and sigma_i is None):
+            continue
+
+        for r in rows:
+            nm = _cell(r, name_i)
+            if not nm:
+                continue
+            rate = parse_rate(_cell(r, rate_i)) if rate_i is not None else None
+            low, high = parse_rate(_cell(r, min_i)), parse_rate(_cell(r, max_i))
+            mode = parse_rate(_cell(r, mode_i))
+            if mode is None:
+                mode = rate
+            sigma = parse_rate(_cell(r, sigma_i))
+            if sigma is not None and _cell(r, sigma_i).endswith("%"):
+                sigma = (rate or 0.0) * sigma / 100.0
+
+            if low is not None and high is not None:
+                if mode is None:
+                    mode = (low + high) / 2.0
+                low, high = min(low, mode, high), max(low, mode, high)
+                ranges[nm] = (low, mode, high, None)
+            elif sigma is not None and rate is not None:
+                ranges[nm] = (None, rate, None, abs(sigma))
+    return ranges
+
+
+def _triangular_ppf(u, low, mode, high):
+    """Inverse CDF of a triangular distribution (scalar version)."""
+    span = high - low
+    if span <= 0:
+        return mode
+    c = (mode - low) / span
+    if u < c:
+        return low + math.sqrt(u * span * (mode - low))
+    return high - math.sqrt((1.0 - u) * span * (high - mode))
+
+
+def _percentile(sorted_vals, pct):
+    """Linear-interpolated percentile, as ``numpy.percentile`` computes it."""
+    if not sorted_vals:
+        return float("nan")
+    pos = (len(sorted_vals) - 1) * pct / 100.0
+    lo = int(math.floor(pos))
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (pos - lo)
+
+
+def summarise(samples):
+    """Return ``{mean, std, min, max, p10, p50, p90}`` of a 1-D sample."""
+    if np is not None:
+        arr = np.asarray(samples, dtype=float)
+        stats = {"mean": float(arr.mean()), "std": float(arr.std()),
+                 "min": float(arr.min()), "max": float(arr.max())}
+        for pct, val in zip(PERCENTILES, np.percentile(arr, PERCENTILES)):
+            stats["p{}".format(pct)] = float(val)
+        return stats
+    vals = sorted(samples)
+    mean = sum(vals) / len(vals)
+    stats = {"mean": mean, "std": math.sqrt(sum((v - mean) ** 2 for v in vals) / len(vals)),
+             "min": vals[0], "max": vals[-1]}
+    for pct in PERCENTILES:
+        stats["p{}".format(pct)] = _percentile(vals, pct)
+    return stats
+
+
+class RiskResult(object):
+    """Statistics of one simulation run."""
+
+    def __init__(self, n, seed):
+        self.n = n
+        self.seed = seed
+        self.types = {}
+        self.sections = {}
+        self.total = None
+        self.uncertain = 0
+        self.sample_ms = 0.0
+        self.price_ms = 0.0
+        self.stats_ms = 0.0
+
+    def summary(self):
+        return "{} samples (seed {}), {} uncertain materials: sample {:.0f} ms, " \
+               "price {:.0f} ms, stats {:.0f} ms".format(
+                   self.n, self.seed, self.uncertain, self.sample_ms, self.price_ms, self.stats_ms)
+
+
+class PriceRisk(object):
+    """Samples material prices and prices the model through a ``RecipeBook``."""
+
+    def __init__(self, recipe_book, ranges):
+        self.book = recipe_book
+        self.matrix = recipe_book.matrix
+        self.ranges = ranges
+        self.base = self.matrix.price_vector(recipe_book.prices)
+        self.uncertain = [i for i, m in enumerate(self.matrix.materials) if m in ranges]
+
+    def sample_prices(self, n, seed=None):
+        """Return a materials x ``n`` price matrix (a list of rows without NumPy)."""
+        mats = self.matrix.materials
+        if np is None:
+            rnd = random.Random(seed)
+            rows = [[p] * n for p in self.base]
+            for i in self.uncertain:
+                low, mode, high, sigma = self.ranges[mats[i]]
+                if sigma is None:
+                    rows[i] = [_triangular_ppf(rnd.random(), low, mode, high) for _ in range(n)]
+                else:
+                    rows[i] = [max(0.0, rnd.gauss(mode, sigma)) for _ in range(n)]
+            return rows
+
+        rng = np.random.RandomState(seed)
+        out = np.repeat(self.base[:, None], n, axis=1)
+        tri = [i for i in self.uncertain if self.ranges[mats[i]][3] is None]
+        nrm = [i for i in self.uncertain if self.ranges[mats[i]][3] is not None]
+        if tri:
+            low, mode, high = (np.array([self.ranges[mats[i]][k] for i in tri])[:, None] for k in range(3))
+            span = high - low
+            safe = np.where(span > 0, span, 1.0)
+            u = rng.random_sample((len(tri), n))
+            left = low + np.sqrt(u * span * (mode - low))
+            right = high - np.sqrt((1.0 - u) * span * (high - mode))
+            vals = np.where(u < (mode - low) / safe, left, right)
+            out[tri] = np.where(span > 0, vals, mode)
+        if nrm:
+            mean = np.array([self.ranges[mats[i]][1] for i in nrm])[:, None]
+            sigma = np.array([self.ranges[mats[i]][3] for i in nrm])[:, None]
+            out[nrm] = np.maximum(0.0, mean + sigma * rng.standard_normal((len(nrm), n)))
+        return out
+
+    def type_rates(self, prices):
+        """Return composite rates for a sampled price matrix, types x N."""
+        if np is not None:
+            return self.matrix.multiply(prices)
+        cols = list(zip(*prices))
+        per_sample = [self.matrix.multiply(list(col)) for col in cols]
+        return [list(row) for row in zip(*per_sample)]
+
+    def run(self, quantities, n=DEFAULT_SAMPLES, seed=None):
+        """Simulate ``n`` price scenarios for the model.
+
+        ``quantities`` yields ``(type name, BOQ section, quantity, fixed rate)``
+        per element. Types without a priced recipe stay at ``fixed rate``
+        (the ``Cost`` currently on the type).
+        """
+        result = RiskResult(n, seed)
+        result.uncertain = len(self.uncertain)
+
+        t0 = time.time()
+        prices = self.sample_prices(n, seed)
+        result.sample_ms = (time.time() - t0) * 1000.0
+
+        t0 = time.time()
+        rates = self.type_rates(prices)
+        row_of = dict((t, i) for i, t in enumerate(self.matrix.types))
+        type_qty, type_fixed, section_qty = {}, {}, {}
+        for tname, section, qty, fixed in quantities:
+            type_qty[tname] = type_qty.get(tname, 0.0) + qty
+            key = (section, tname)
+            section_qty[key] = section_qty.get(key, 0.0) + qty
+            if tname not in self.book.rates:
+                type_fixed[tname] = fixed
+
+        def row(tname):
+            if tname in type_fixed:
+                return np.full(n, type_fixed[tname]) if np is not None else [type_fixed[tname]] * n
+            return rates[row_of[tname]]
+
+        type_rows = dict((t, row(t)) for t in type_qty)
+        type_costs = {}
+        for tname, qty in type_qty.items():
+            r = type_rows[tname]
+            type_costs[tname] = r * qty if np is not None else [v * qty for v in r]
+        section_costs = {}
+        for (section, tname), qty in section_qty.items():
+            r = type_rows[tname]
+            acc = section_costs.get(section)
+            if np is not None:
+                section_costs[section] = r * qty if acc is None else acc + r * qty
+            else:
+                add = [v * qty for v in r]
+                section_costs[section] = add if acc is None else [a + b for a, b in zip(acc, add)]
+        if np is not None:
+            total = np.zeros(n)
+            for costs in section_costs.values():
+                total += costs
+        else:
+            total = [0.0] * n
+            for costs in section_costs.values():
+                total = [a + b for a, b in zip(total, costs)]
+        result.price_ms = (time.time() - t0) * 1000.0
+
+        t0 = time.time()
+        result.types = dict((t, summarise(c)) for t, c in type_costs.items())
+        result.sections = dict((s, summarise(c)) for s, c in section_costs.items())
+        result.total = summarise(total)
+        result.stats_ms = (time.time() - t0) * 1000.0
+        return result
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""One-pass, column-oriented snapshot of the elements a BOQ prices.
+
+``take_snapshot`` runs a single ``FilteredElementCollector`` over every
+category the BOQ sections use and reads each instance once into parallel
+columns (id, category, type id, level, type name, function, rate, type
+comments, area, volume, length, structural material). Type attributes
+come from a ``TypeCache``. Sections then aggregate rows from the
+snapshot instead of collecting and reading the model again.
+
+Measures are stored in m², m³ and m; NaN means the parameter is missing
+or has no value. Only the measures a category's ``boq`` rules in
+``measurement.csv`` use are read, from the parameters they list, through
+a ``QuantityCache`` so unchanged elements are not read again.
+``ElementSnapshot.headless`` copies the rows into a ``BoqSnapshot`` that
+``boqengine`` prices outside Revit; ``LiveSource`` serves the same rows
+to it as a ``sources.QuantitySource``.
+"""
+import os
+import time
+from array import array
+
+from pyrevit import DB
+from pyrevit.framework import List
+
+from costestimates.measurement import MEASURES, PARAM_MEASURES, MeasurementRules, material_text
+from costestimates.typecache import TypeCache, type_cost
+from costestimates.quantities import QuantityCache, spec_key, specs_of
+from costestimates.boqsnapshot import BoqSnapshot, PhaseTimings
+from costestimates.sources import SnapshotSource
+from costestimates.painting import PaintStats, gather_wall_painting
+from costestimates.earthworks import EarthworksExtractor
+
+BIC = DB.BuiltInCategory
+BIP = DB.BuiltInParameter
+
+
+def _bics(*names):
+    """BuiltInCategory members by name, skipping ones this Revit lacks."""
+    return [getattr(BIC, n) for n in names if hasattr(BIC, n)]
+
+
+SNAPSHOT_CATEGORY_NAMES = (
+    "OST_Floors", "OST_Walls", "OST_Stairs",
+    "OST_StructuralFoundation", "OST_StructuralColumns", "OST_StructuralFraming", "OST_Rebar",
+    "OST_Roofs", "OST_Ceilings", "OST_Windows", "OST_Doors",
+    "OST_Conduit", "OST_LightingFixtures", "OST_LightingDevices",
+    "OST_ElectricalFixtures", "OST_ElectricalEquipment",
+    "OST_PlumbingFixtures", "OST_PipeCurves", "OST_PipeFitting", "OST_PipeAccessory",
+    "OST_GenericModel", "OST_Furniture", "OST_FurnitureSystems",
+    "OST_Parking", "OST_ParkingComponents", "OST_Site", "OST_SpecialityEquipment", "OST_Planting",
+)
+SNAPSHOT_CATEGORIES = _bics(*SNAPSHOT_CATEGORY_NAMES)
+# category id -> BuiltInCategory name, as headless snapshots store it
+CATEGORY_NAMES = dict((int(getattr(BIC, n)), n) for n in SNAPSHOT_CATEGORY_NAMES if hasattr(BIC, n))
+CATEGORY_IDS = dict((n, i) for i, n in CATEGORY_NAMES.items())
+
+FUNCTION_CATEGORIES = set(int(c) for c in (BIC.OST_Floors, BIC.OST_Walls, BIC.OST_Stairs))
+DEFAULT_NAMES = {
+    int(BIC.OST_Floors): "Floor",
+    int(BIC.OST_Walls): "Wall",
+    int(BIC.OST_Stairs): "Stair",
+}
+
+
+def _measure_specs(params):
+    """``(cache key, specs, factor)`` of each of ``PARAM_MEASURES``."""
+    out = []
+    for m in PARAM_MEASURES:
+        specs = specs_of(params.get(m, ()))
+        out.append((spec_key(specs), specs, MEASURES[m][1]))
+    return tuple(out)
+
+
+# Measures are read as the "boq" rows of measurement.csv say
+BOQ_RULES = MeasurementRules("boq")
+MEASURE_SPECS = dict((int(getattr(BIC, cat)), _measure_specs(params))
+                     for cat, params in BOQ_RULES.params.items() if hasattr(BIC, cat))
+# categories whose measure depends on the structural material
+MATERIAL_CATEGORIES = set(int(getattr(BIC, c)) for c in BOQ_RULES.material_categories() if hasattr(BIC, c))
+NO_MEASURES = ((None, None, 1.0),) * 3
+
+
+def _type_name(el, info, cat_int):
+    if info.name:
+        return info.name
+    p_ft = el.get_Parameter(BIP.ELEM_FAMILY_AND_TYPE_PARAM)
+    if p_ft and p_ft.HasValue and p_ft.AsValueString():
+        return p_ft.AsValueString()
+    return getattr(el, "Name", None) or DEFAULT_NAMES.get(cat_int) or \
+        (el.Category.Name if el.Category else "Item")
+
+
+def _structural_material(doc, el, params):
+    mat_prm = params.get(el, "structural_material")
+    return material_text(doc.GetElement(mat_prm.AsElementId()) if mat_prm else None)
+
+
+class ElementSnapshot(object):
+    """Instances of the BOQ categories as parallel columns, one row each."""
+
+    def __init__(self, types, quantities=None):
+        self.types = types
+        self.quantities = quantities if quantities is not None else QuantityCache()
+        self.elements = []
+        self.ids = []
+        self.cats = []
+        self.type_ids = []
+        self.levels = []
+        self.names = []
+        self.functions = []
+        self.rates = array("d")
+        self.comments = []
+        self.areas = array("d")
+        self.volumes = array("d")
+        self.lengths = array("d")
+        self.materials = []
+        self.by_cat = {}
+        self.skipped = 0
+        self.timings = PhaseTimings()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self, *bics):
+        """Yield row indices of the given categories, in category order."""
+        for bic in bics:
+            for i in self.by_cat.get(int(bic), ()):
+                yield i
+
+    def elements_of(self, *bics):
+        return [self.elements[i] for i in self.rows(*bics)]
+
+    def headless(self, title, address):
+        """Copy the rows into a ``BoqSnapshot``, with categories by name."""
+        out = BoqSnapshot(title, address)
+        out.skipped = self.skipped
+        for i in range(len(self.ids)):
+            row = [column[i] for column in self._columns()]
+            row[1] = CATEGORY_NAMES.get(row[1], str(row[1]))
+            out.add(row)
+        return out
+
+    def _append(self, doc, el):
+        cat_int = el.Category.Id.IntegerValue
+        type_id = el.GetTypeId()
+        info = self.types.get(type_id)
+        level = getattr(el, "LevelId", None)
+        (ak, aspec, af), (vk, vspec, vf), (lk, lspec, lf) = MEASURE_SPECS.get(cat_int, NO_MEASURES)
+        q = self.quantities
+        # Read everything before appending so a failing element leaves
+        # the columns aligned.
+        values = (
+            el.Id.IntegerValue,
+            cat_int,
+            type_id.IntegerValue if type_id else -1,
+            level.IntegerValue if level else -1,
+            _type_name(el, info, cat_int),
+            info.function if cat_int in FUNCTION_CATEGORIES else "",
+            info.cost or type_cost(el, self.types.params),
+            info.comments,
+            q.value(el, ak, aspec, af),
+            q.value(el, vk, vspec, vf),
+            q.value(el, lk, lspec, lf),
+            _structural_material(doc, el, self.types.params) if cat_int in MATERIAL_CATEGORIES else "",
+        )
+        self.by_cat.setdefault(cat_int, []).append(len(self.ids))
+        self.elements.append(el)
+        for column, value in zip(self._columns(), values):
+            column.append(value)
+
+    def _columns(self):
+        return (self.ids, self.cats, self.type_ids, self.levels, self.names, self.functions,
+                self.rates, self.comments, self.areas, self.volumes, self.lengths, self.materials)
+
+
+def take_snapshot(doc, categories=None, types=None, quantities=None):
+    """Read every instance of ``categories`` (default: all BOQ ones) once.
+
+    Type attributes come from ``types``, a shared ``TypeCache`` (a new one
+    when not given), so each type is read once however many instances use
+    it. Measures go through ``quantities`` (a memory-only cache when not given).
+    """
+    snap = ElementSnapshot(types or TypeCache(doc), quantities)
+    t0 = time.time()
+    cat_filter = DB.ElementMulticategoryFilter(List[DB.BuiltInCategory](categories or SNAPSHOT_CATEGORIES))
+    elements = DB.FilteredElementCollector(doc) \
+        .WherePasses(cat_filter) \
+        .WhereElementIsNotElementType() \
+        .ToElements()
+    snap.timings.add("collect", t0)
+
+    t0 = time.time()
+    for el in elements:
+        try:
+            if el.Category:
+                snap._append(doc, el)
+        except:
+            snap.skipped += 1
+    snap.timings.add("extract", t0)
+    return snap
+
+
+def project_title(doc):
+    pi = doc.ProjectInformation
+    pname = None
+    p = pi.get_Parameter(BIP.PROJECT_NAME) if pi else None
+    if p and p.HasValue:
+        pname = p.AsString()
+    if not pname:
+        try:
+            pname = os.path.splitext(doc.Title)[0]
+        except Exception:
+            pname = "PROJECT"
+    return pname
+
+
+def project_address(doc):
+    pi = doc.ProjectInformation
+    addr = None
+    p = pi.get_Parameter(BIP.PROJECT_ADDRESS) if pi else None
+    if p and p.HasValue:
+        addr = p.AsString()
+    if not addr:
+        addr = "PROJECT ADDRESS"
+    return addr
+
+
+class LiveSource(SnapshotSource):
+    """The open document as a ``QuantitySource``.
+
+    Instances are read in one pass when the source is made; painted wall
+    areas (through ``paint_cache``) and cut/fill volumes on first use.
+    """
+
+    def __init__(self, doc, types=None, quantities=None, paint_cache=None, paint_stats=None):
+        SnapshotSource.__init__(self, take_snapshot(doc, types=types, quantities=quantities))
+        self.doc = doc
+        self.title = project_title(doc)
+        self.address = project_address(doc)
+        self.paint_cache = paint_cache
+        self.paint_stats = paint_stats if paint_stats is not None else PaintStats()
+        self.earthworks_result = None
+        self._painting = None
+
+    def _rows(self, category):
+        return self.table.by_cat.get(CATEGORY_IDS.get(category), ())
+
+    def painting(self):
+        if self._painting is None:
+            self._painting = gather_wall_painting(self.doc, self.table.elements_of(BIC.OST_Walls),
+                                                  self.paint_cache, self.paint_stats)
+            if self.paint_cache is not None:
+                self.paint_cache.save()
+        return self._painting
+
+    def earthworks(self):
+        if self.earthworks_result is None:
+            self.earthworks_result = EarthworksExtractor(self.doc).extract()
+        result = self.earthworks_result
+        return {
+            "cut": result.cut,
+            "fill": result.fill,
+            "pad_excavation": result.pad_excavation,
+            "summary": result.summary(),
+        }
+
+    def headless(self):
+        """Everything read so far (painting and cut/fill included) as a ``BoqSnapshot``."""
+        out = self.table.headless(self.title, self.address)
+        out.painting.update(self.painting())
+        out.earthworks = self.earthworks()
+        return out
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Where the BOQ engine reads quantities from.
+
+A ``QuantitySource`` answers four questions, always by snapshot row
+index and ``BuiltInCategory`` name, so the engine never touches Revit:
+
+- ``instances(*categories)``: row indices of those categories, in order;
+- ``type_info(i)``: ``(type name, rate, type comments, function)``, and
+  ``level(i)``, the level id (-1 when none);
+- ``measures(i)``: ``(area m², volume m³, length m)``, NaN when missing,
+  and ``material(i)``, the structural material in lower case;
+- ``painting()`` and ``earthworks()``: the grouped paint items and the
+  cut/fill volumes (a dict, or None when not measured).
+
+``SnapshotSource`` reads a ``boqsnapshot.BoqSnapshot``: a saved one, or
+one built in memory as a fake for tests and load tests.
+``snapshot.LiveSource`` reads the open document.
+"""
+from costestimates.boqsnapshot import read_snapshot
+
+
+class QuantitySource(object):
+    """Interface of a BOQ quantity source; see the module docstring."""
+
+    title = "PROJECT"
+    address = "PROJECT ADDRESS"
+    skipped = 0
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def instances(self, *categories):
+        raise NotImplementedError
+
+    def type_info(self, i):
+        raise NotImplementedError
+
+    def level(self, i):
+        raise NotImplementedError
+
+    def measures(self, i):
+        raise NotImplementedError
+
+    def material(self, i):
+        raise NotImplementedError
+
+    def painting(self):
+        raise NotImplementedError
+
+    def earthworks(self):
+        raise NotImplementedError
+
+
+class SnapshotSource(QuantitySource):
+    """Rows of a column table with ``BoqSnapshot``'s columns.
+
+    Subclasses reading another table only need to map category names to
+    its rows in ``_rows``.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.title = getattr(table, "title", QuantitySource.title)
+        self.address = getattr(table, "address", QuantitySource.address)
+
+    @classmethod
+    def load(cls, path):
+        return cls(read_snapshot(path))
+
+    @property
+    def skipped(self):
+        return self.table.skipped
+
+    def __len__(self):
+        return len(self.table)
+
+    def _rows(self, category):
+        return self.table.by_cat.get(category, ())
+
+    def instances(self, *categories):
+        for category in categories:
+            for i in self._rows(category):
+                yield i
+
+    def type_info(self, i):
+        t = self.table
+        return t.names[i], t.rates[i], t.comments[i], t.functions[i]
+
+    def level(self, i):
+        return self.table.levels[i]
+
+    def measures(self, i):
+        t = self.table
+        return t.areas[i], t.volumes[i], t.lengths[i]
+
+    def material(self, i):
+        return self.table.materials[i]
+
+    def painting(self):
+        return self.table.painting
+
+    def earthworks(self):
+        return self.table.earthworks
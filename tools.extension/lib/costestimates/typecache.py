@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Per-type memo of the type attributes every pushbutton reads.
+
+Thousands of instances share a handful of types, yet each instance used
+to fetch its type and read the same name, ``Cost``, ``Type Comments``
+and ``Function`` again. ``TypeCache`` resolves each type id once per run
+and counts hits, so a 50k-instance model costs one read set per type.
+Parameters are read through the document's ``ParameterResolver``.
+"""
+import time
+
+from pyrevit import DB
+
+from costestimates.params import resolver_for
+
+
+def type_cost(o, params):
+    """Return ``o``'s ``Cost`` as a float, 0.0 when missing."""
+    if not o:
+        return 0.0
+    try:
+        cp = params.get(o, "cost")
+        if cp and cp.HasValue:
+            return float(cp.AsDouble())
+    except:
+        pass
+    return 0.0
+
+
+def function_string(el_type, params):
+    """Return the type's ``Function`` value lower-cased, or ""."""
+    if not el_type:
+        return ""
+    try:
+        func_param = params.get(el_type, "function")
+    except:
+        func_param = None
+    if not (func_param and func_param.HasValue):
+        return ""
+
+    for read in (func_param.AsString, func_param.AsValueString):
+        try:
+            val = read()
+            if val:
+                return val.strip().lower()
+        except:
+            pass
+    return ""
+
+
+class TypeInfo(object):
+    """What the pushbuttons need from one element type.
+
+    ``cost`` is None when the type has no ``Cost`` parameter at all, so
+    callers that must write ``Cost`` can tell "missing" from "zero".
+    """
+    __slots__ = ("element", "name", "label", "cost", "comments", "function")
+
+    def __init__(self, element=None, name=None, label="", cost=None, comments="", function=""):
+        self.element = element
+        self.name = name
+        self.label = label
+        self.cost = cost
+        self.comments = comments
+        self.function = function
+
+
+def _read_type(el_type, params):
+    if not el_type:
+        return TypeInfo()
+    name = None
+    p_name = el_type.get_Parameter(DB.BuiltInParameter.SYMBOL_NAME_PARAM)
+    if p_name and p_name.HasValue:
+        name = p_name.AsString()
+
+    try:
+        fam = getattr(el_type, "Family", None)
+        label = u"{} : {}".format(fam.Name if fam else "", el_type.Name or "").strip() if fam \
+            else (el_type.Name or "")
+    except Exception:
+        label = ""
+
+    cost = None
+    cp = params.get(el_type, "cost")
+    if cp:
+        cost = float(cp.AsDouble()) if cp.HasValue else 0.0
+
+    comments = ""
+    tc = params.get(el_type, "type_comments")
+    if tc and tc.HasValue:
+        comments = tc.AsString() or ""
+
+    return TypeInfo(el_type, name, label, cost, comments, function_string(el_type, params))
+
+
+class TypeCache(object):
+    """``TypeInfo`` per type id, resolved on first use."""
+
+    def __init__(self, doc, params=None):
+        self.doc = doc
+        self.params = params or resolver_for(doc)
+        self._types = {}
+        self.hits = 0
+        self.misses = 0
+        self.resolve_ms = 0.0
+
+    def __len__(self):
+        return len(self._types)
+
+    def get(self, type_id):
+        key = type_id.IntegerValue if type_id else -1
+        info = self._types.get(key)
+        if info is not None:
+            self.hits += 1
+            return info
+        self.misses += 1
+        t0 = time.time()
+        el_type = self.doc.GetElement(type_id) if key != -1 else None
+        info = _read_type(el_type, self.params)
+        self._types[key] = info
+        self.resolve_ms += (time.time() - t0) * 1000.0
+        return info
+
+    def of(self, el):
+        """Return the ``TypeInfo`` of instance ``el``."""
+        return self.get(el.GetTypeId())
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def summary(self):
+        return "type cache: {} type(s) for {} lookup(s), {:.1%} hits, {:.0f} ms resolving".format(
+            len(self._types), self.hits + self.misses, self.hit_rate(), self.resolve_ms)
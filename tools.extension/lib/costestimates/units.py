@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""Revit internal units (feet) to the metric units estimates are priced in.
+
+Kept apart from the Revit-side modules so that code importable without
+Revit (painting's aggregation, the benchmarks) shares the same factors.
+"""
+FT3_TO_M3 = 0.028316846592
+FT2_TO_M2 = 0.09290304
+FT_TO_M = 0.3048